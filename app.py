@@ -5,33 +5,105 @@ This module provides the application factory pattern for creating Flask app inst
 Routes are organized in separate blueprint modules in the routes package.
 """
 
+import os
+from typing import Dict, Optional
+
 from flask import Flask
-from database import init_database, add_sample_data
+import database
+import metrics
+import profiling
+import query_stats
+from database import (
+    init_database, add_sample_data, set_db_profile, check_schema_version, SchemaVersionError,
+    configure_query_stats, set_database
+)
 from routes import register_blueprints
+from routes.http_cache import BUILD_ID
+from commands import register_commands
 
 
-def create_app():
+def create_app(config: Optional[Dict] = None):
     """
     Application factory function to create and configure Flask app.
     
+    Startup does not create tables or sample data; that is done once with
+    `flask --app app migrate [--seed]`. Booting only reads the schema version.
+    
+    Args:
+        config: Optional overrides for app.config (e.g. {'DB_PROFILE': 'throughput'}).
+                DATABASE: database file, SQLite URI or ':memory:' (default from
+                LIBRARY_DATABASE, else library.db).
+                AUTO_MIGRATE: run pending migrations at startup (default from
+                LIBRARY_AUTO_MIGRATE). REQUIRE_CURRENT_SCHEMA: refuse to start on an
+                unmigrated database instead of logging a warning.
+                QUERY_STATS: time every SQL statement, aggregate per request and
+                log slow queries (default from LIBRARY_QUERY_STATS).
+                METRICS: record request metrics and serve GET /metrics
+                (default on; LIBRARY_METRICS=0 turns it off).
+                ADMIN_TOKEN: bearer token for /admin endpoints and the X-Profile
+                header (default from LIBRARY_ADMIN_TOKEN; unset disables both).
+                PROFILE_SAMPLE_RATE / PROFILE_MODE / PROFILE_DIR / PROFILE_KEEP:
+                request profiling, see profiling.py.
+                BUILD_ID: deploy identifier in ETags (default from LIBRARY_BUILD_ID,
+                else a hash of the sources and templates).
+    
     Returns:
         Flask: Configured Flask application instance
     """
     app = Flask(__name__)
     app.secret_key = "super secret key"
     
-    # Initialize the database
-    init_database()
+    # SQLite database and performance profile (LIBRARY_DATABASE / LIBRARY_DB_PROFILE)
+    app.config['DATABASE'] = database.DATABASE
+    app.config['DB_PROFILE'] = database.DB_PROFILE
+    app.config['AUTO_MIGRATE'] = os.environ.get('LIBRARY_AUTO_MIGRATE', '0') == '1'
+    app.config['REQUIRE_CURRENT_SCHEMA'] = False
+    app.config['QUERY_STATS'] = query_stats.ENABLED
+    app.config['METRICS'] = os.environ.get('LIBRARY_METRICS', '1') != '0'
+    app.config['ADMIN_TOKEN'] = profiling.ADMIN_TOKEN
+    app.config['PROFILE_SAMPLE_RATE'] = profiling.PROFILE_SAMPLE_RATE
+    app.config['PROFILE_MODE'] = profiling.PROFILE_MODE
+    app.config['PROFILE_DIR'] = profiling.PROFILE_DIR
+    app.config['PROFILE_KEEP'] = profiling.PROFILE_KEEP
+    app.config['BUILD_ID'] = BUILD_ID
+    if config:
+        app.config.update(config)
+    if app.config['DATABASE'] != database.DATABASE:
+        set_database(app.config['DATABASE'])
+    if app.config['DB_PROFILE'] != database.DB_PROFILE:
+        set_db_profile(app.config['DB_PROFILE'])
+    if app.config['QUERY_STATS']:
+        configure_query_stats(enabled=True)
+        query_stats.register_query_stats(app)
+    if app.config['METRICS']:
+        metrics.register_metrics(app)
+    if app.config['ADMIN_TOKEN'] or app.config['PROFILE_SAMPLE_RATE']:
+        profiling.register_profiling(app)
     
-    # Add sample data for testing and demonstration
-    add_sample_data()
+    # Fast boot: only check the schema version (CLI commands such as
+    # `migrate` must still load on an unmigrated database, hence the warning)
+    if app.config['AUTO_MIGRATE']:
+        init_database()
+    else:
+        try:
+            check_schema_version()
+        except SchemaVersionError as e:
+            if app.config['REQUIRE_CURRENT_SCHEMA']:
+                raise
+            app.logger.warning(str(e))
     
     # Register all route blueprints
     register_blueprints(app)
     
+    # Register CLI commands (flask --app app <command>)
+    register_commands(app)
+    
     return app
 
 
 if __name__ == '__main__':
+    # Development server: set up the schema and demo data first
+    init_database()
+    add_sample_data()
     app = create_app()
     app.run(debug=True, host='0.0.0.0', port=5000)
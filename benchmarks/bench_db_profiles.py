@@ -0,0 +1,110 @@
+"""
+Benchmark: catalog reads concurrent with borrow/return writes per SQLite profile.
+
+Reader threads hit GET /catalog while writer threads loop POST /borrow and
+POST /return through the Flask test client. The same workload runs against
+the old rollback-journal setup ("legacy") and each preset in
+database.DB_PROFILES, and the requests/second of both sides are reported.
+
+Usage:
+    python benchmarks/bench_db_profiles.py [--seconds 5] [--readers 4] [--writers 2] [--books 500]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from app import create_app
+
+# Pre-change behaviour: SQLite defaults, rollback journal
+LEGACY_PROFILE = {
+    'journal_mode': 'DELETE',
+    'synchronous': 'FULL',
+    'busy_timeout': 5000,
+}
+
+
+def seed_books(count: int):
+    """Insert `count` books with plenty of copies."""
+    conn = database.get_db_connection()
+    conn.executemany('''
+        INSERT INTO books (title, author, isbn, total_copies, available_copies)
+        VALUES (?, ?, ?, 1000, 1000)
+    ''', [(f'Bench Title {i:06d}', f'Bench Author {i % 97}', f'{9000000000000 + i}') for i in range(count)])
+    conn.commit()
+    conn.close()
+
+
+def run_workload(app, seconds: float, readers: int, writers: int, books: int):
+    """Run readers and writers for `seconds` and return (reads, writes) completed."""
+    stop = threading.Event()
+    counts = {'reads': 0, 'writes': 0}
+    lock = threading.Lock()
+
+    def reader():
+        client = app.test_client()
+        done = 0
+        while not stop.is_set():
+            client.get('/catalog')
+            done += 1
+        with lock:
+            counts['reads'] += done
+
+    def writer(index):
+        client = app.test_client()
+        patron_id = f'{800000 + index:06d}'
+        book_id = 4 + (index % books)  # Skip the three sample books
+        done = 0
+        while not stop.is_set():
+            client.post('/borrow', data={'patron_id': patron_id, 'book_id': book_id})
+            client.post('/return', data={'patron_id': patron_id, 'book_id': book_id})
+            done += 2
+        with lock:
+            counts['writes'] += done
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    threads += [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    return counts['reads'], counts['writes']
+
+
+def bench_profile(name, profile, args):
+    with tempfile.TemporaryDirectory() as tmp:
+        database.set_database(os.path.join(tmp, 'bench.db'))
+        database.set_db_profile(profile)
+        # create_app() only checks the schema version; build it like `flask migrate --seed`
+        database.init_database()
+        database.add_sample_data()
+        app = create_app()
+        seed_books(args.books)
+        reads, writes = run_workload(app, args.seconds, args.readers, args.writers, args.books)
+        database.close_pool()
+    print(f'{name:<12} catalog GET/s: {reads / args.seconds:9.1f}   borrow+return POST/s: {writes / args.seconds:9.1f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--books', type=int, default=500)
+    args = parser.parse_args()
+
+    bench_profile('legacy', LEGACY_PROFILE, args)
+    for name, profile in database.DB_PROFILES.items():
+        bench_profile(name, profile, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Benchmark: import and boot time of a worker.
+
+Measures, on an already migrated database in a temporary directory:
+
+- import: `import app` in a fresh interpreter (what each worker pays without preload)
+- worker: `from wsgi import app` in a fresh interpreter (import + create_app)
+- legacy boot: init_database() + add_sample_data() + create_app(), the old
+  startup path, in-process with a fresh connection pool each time
+- fast boot: create_app() alone (schema version check only)
+
+Usage:
+    python benchmarks/bench_startup.py [--runs 10]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+
+def time_subprocess(code: str, workdir: str, runs: int) -> float:
+    """Median wall time in ms of running `code` in a fresh interpreter."""
+    env = dict(os.environ, PYTHONPATH=REPO)
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code], cwd=workdir, env=env, check=True)
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def time_in_process(boot, runs: int) -> float:
+    """Median time in ms of boot(), each run starting from an empty connection pool."""
+    import database
+    samples = []
+    for _ in range(runs):
+        database.close_pool()
+        started = time.perf_counter()
+        boot()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        import database
+        from app import create_app
+        database.init_database()
+        database.add_sample_data()
+
+        def legacy_boot():
+            database.init_database()
+            database.add_sample_data()
+            create_app()
+
+        results = [
+            ('python -c "pass"', time_subprocess('pass', workdir, args.runs)),
+            ('import app', time_subprocess('import app', workdir, args.runs)),
+            ('from wsgi import app', time_subprocess('from wsgi import app', workdir, args.runs)),
+            ('legacy boot (in-process)', time_in_process(legacy_boot, args.runs)),
+            ('fast boot (in-process)', time_in_process(create_app, args.runs)),
+        ]
+        database.close_pool()
+        os.chdir(REPO)
+
+    print(f"median of {args.runs} runs")
+    for label, ms in results:
+        print(f"{label:<28} {ms:>8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,307 @@
+"""
+Benchmark suite: service-layer functions and Flask routes at several catalog sizes.
+
+For every scale a synthetic catalog and loan history is generated from a
+fixed random seed (books with 1-5 copies, closed loans, open loans of which
+some are overdue). The catalog is built once into a template database under
+--data-dir and copied for every run, so runs at the same scale and seed
+measure the same data.
+
+Timed per scale (each operation --iterations times):
+
+- services: add_book_to_catalog, borrow_book_by_patron, return_book_by_patron,
+  search_books_in_catalog (title / author / isbn), get_patron_status_report
+- routes (Flask test client): GET /catalog, GET /catalog?after=..., GET /search,
+  GET /api/search, GET /api/late_fee/<patron>/<book>, POST /borrow, POST /return
+
+Results (mean / p50 / p95 / max in ms and ops/s) are written as JSON.
+Passing --compare with an earlier results file prints the p50 change per
+operation and exits with status 1 if any operation got slower than
+--threshold.
+
+Usage:
+    python benchmarks/bench_suite.py [--scales 1k,100k,1M] [--iterations 200]
+                                     [--output bench-results.json] [--compare baseline.json]
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+import database
+from app import create_app
+from routes.catalog_routes import row_cache, encode_cursor
+from services.library_service import (
+    add_book_to_catalog, borrow_book_by_patron, return_book_by_patron,
+    search_books_in_catalog, get_patron_status_report
+)
+
+ADJECTIVES = ['Silent', 'Golden', 'Hidden', 'Broken', 'Endless', 'Crimson', 'Distant', 'Forgotten',
+              'Quiet', 'Burning', 'Frozen', 'Wild', 'Last', 'Secret', 'Lost', 'Bright']
+NOUNS = ['River', 'Garden', 'Empire', 'Winter', 'Machine', 'Harbor', 'Kingdom', 'Promise',
+         'Shadow', 'Voyage', 'Letter', 'Mountain', 'Orchard', 'Signal', 'Island', 'Library']
+FIRST_NAMES = ['Ada', 'Boris', 'Chloe', 'Dmitri', 'Elena', 'Farid', 'Grace', 'Hiro',
+               'Ines', 'Jonas', 'Kemi', 'Liam', 'Mira', 'Noor', 'Oskar', 'Priya']
+LAST_NAMES = ['Okafor', 'Lindqvist', 'Moreau', 'Tanaka', 'Alvarez', 'Novak', 'Haddad', 'Brennan',
+              'Kowalski', 'Nakamura', 'Rossi', 'Singh', 'Fischer', 'Costa', 'Ivanova', 'Walsh']
+
+FIRST_PATRON = 100000
+
+
+def parse_scale(text: str) -> int:
+    """Parse '1k', '100k', '1M' or a plain number."""
+    text = text.strip().lower()
+    factor = {'k': 1_000, 'm': 1_000_000}.get(text[-1:], 1)
+    return int(float(text[:-1] if factor > 1 else text) * factor)
+
+
+def patron_count(books: int) -> int:
+    return max(100, books // 10)
+
+
+def build_template(path: str, books: int, seed: int):
+    """Create a migrated database with a synthetic catalog and loan history."""
+    rng = random.Random(seed)
+    database.DATABASE = path
+    database.init_database()
+    conn = sqlite3.connect(path)
+    now = datetime.now()
+    patrons = patron_count(books)
+
+    copies = [rng.randint(1, 5) for _ in range(books)]
+    conn.executemany('''
+        INSERT INTO books (id, title, author, isbn, total_copies, available_copies)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', (
+        (i + 1,
+         f"The {rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {i}",
+         f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+         f"{9780000000000 + i}", copies[i], copies[i])
+        for i in range(books)
+    ))
+
+    def loan_dates(days_ago):
+        borrowed = now - timedelta(days=days_ago, seconds=rng.randint(0, 86399))
+        return borrowed.isoformat(), (borrowed + timedelta(days=14)).isoformat()
+
+    # Closed history: one past loan per book on average
+    closed = []
+    for _ in range(books):
+        borrow_date, due_date = loan_dates(rng.randint(20, 720))
+        returned = datetime.fromisoformat(due_date) + timedelta(days=rng.randint(-10, 5))
+        closed.append((f"{FIRST_PATRON + rng.randrange(patrons)}", rng.randint(1, books),
+                       borrow_date, due_date, returned.isoformat()))
+    conn.executemany('''
+        INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date, return_date)
+        VALUES (?, ?, ?, ?, ?)
+    ''', closed)
+
+    # Open loans on distinct books, spread over patrons; about a third overdue
+    open_loans = []
+    for i, book_id in enumerate(rng.sample(range(1, books + 1), books // 20)):
+        borrow_date, due_date = loan_dates(rng.randint(0, 30))
+        open_loans.append((f"{FIRST_PATRON + i % patrons}", book_id, borrow_date, due_date))
+    conn.executemany('''
+        INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
+        VALUES (?, ?, ?, ?)
+    ''', open_loans)
+    conn.execute('''
+        UPDATE books SET available_copies = available_copies - 1
+        WHERE id IN (SELECT book_id FROM borrow_records WHERE return_date IS NULL)
+    ''')
+    conn.commit()
+    conn.execute('ANALYZE')
+    conn.close()
+    database.close_pool()
+
+
+def summarize(samples):
+    """Turn per-call durations (seconds) into summary statistics in ms."""
+    ms = sorted(s * 1000 for s in samples)
+    return {
+        'calls': len(ms),
+        'mean_ms': round(statistics.fmean(ms), 4),
+        'p50_ms': round(ms[len(ms) // 2], 4),
+        'p95_ms': round(ms[min(len(ms) - 1, int(len(ms) * 0.95))], 4),
+        'max_ms': round(ms[-1], 4),
+        'ops_per_s': round(len(ms) / sum(ms) * 1000, 1) if sum(ms) else None,
+    }
+
+
+def timed(calls):
+    """Run each zero-argument callable once and return the durations."""
+    samples = []
+    for call in calls:
+        started = time.perf_counter()
+        call()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def run_scale(books: int, iterations: int, seed: int, data_dir: str) -> dict:
+    template = os.path.join(data_dir, f'bench-{books}-seed{seed}-v{database.SCHEMA_VERSION}.db')
+    if not os.path.exists(template):
+        started = time.perf_counter()
+        build_template(template + '.tmp', books, seed)
+        os.replace(template + '.tmp', template)
+        print(f'  built {template} in {time.perf_counter() - started:.1f}s', file=sys.stderr)
+
+    rng = random.Random(seed + 1)
+    patrons = patron_count(books)
+    results = {}
+
+    with tempfile.TemporaryDirectory() as workdir:
+        database.DATABASE = os.path.join(workdir, 'library.db')
+        shutil.copyfile(template, database.DATABASE)
+        database.close_pool()
+        database.book_cache.clear()
+        row_cache.clear()
+        app = create_app({'TESTING': True})
+        client = app.test_client()
+
+        # Patrons 9xxxxx never appear in the generated history
+        new_isbns = [f"{9790000000000 + i}" for i in range(iterations)]
+        results['add_book_to_catalog'] = summarize(timed(
+            (lambda isbn=isbn: add_book_to_catalog("Benchmark Book", "Bench Author", isbn, 2))
+            for isbn in new_isbns
+        ))
+
+        loans = [(f"{900000 + i}", rng.randint(1, books)) for i in range(iterations)]
+        results['borrow_book_by_patron'] = summarize(timed(
+            (lambda p=p, b=b: borrow_book_by_patron(p, b)) for p, b in loans
+        ))
+        results['return_book_by_patron'] = summarize(timed(
+            (lambda p=p, b=b: return_book_by_patron(p, b)) for p, b in loans
+        ))
+
+        terms = {
+            'title': [rng.choice(NOUNS).lower() for _ in range(iterations)],
+            'author': [rng.choice(LAST_NAMES) for _ in range(iterations)],
+            'isbn': [f"{9780000000000 + rng.randrange(books)}" for _ in range(iterations)],
+        }
+        for field, values in terms.items():
+            results[f'search_books_in_catalog[{field}]'] = summarize(timed(
+                (lambda t=t, f=field: search_books_in_catalog(t, f)) for t in values
+            ))
+
+        report_patrons = [f"{FIRST_PATRON + rng.randrange(patrons)}" for _ in range(iterations)]
+        results['get_patron_status_report'] = summarize(timed(
+            (lambda p=p: get_patron_status_report(p)) for p in report_patrons
+        ))
+
+        middle = database.get_all_books(1, after=("The M", 0))[0]
+        cursor = encode_cursor((middle['title'], middle['id']))
+        late_fee_loan = database.get_db_connection().execute(
+            'SELECT patron_id, book_id FROM borrow_records WHERE return_date IS NULL LIMIT 1'
+        ).fetchone()
+        routes = {
+            'GET /catalog': lambda: client.get('/catalog'),
+            'GET /catalog?after': lambda: client.get(f'/catalog?after={cursor}'),
+            'GET /search': lambda: client.get(f'/search?q={rng.choice(NOUNS)}&type=title'),
+            'GET /api/search': lambda: client.get(f'/api/search?q={rng.choice(LAST_NAMES)}&type=author'),
+            'GET /api/late_fee': lambda: client.get(f'/api/late_fee/{late_fee_loan[0]}/{late_fee_loan[1]}'),
+        }
+        for name, call in routes.items():
+            results[name] = summarize(timed([call] * iterations))
+
+        route_loans = [(f"{910000 + i}", rng.randint(1, books)) for i in range(iterations)]
+        results['POST /borrow'] = summarize(timed(
+            (lambda p=p, b=b: client.post('/borrow', data={'patron_id': p, 'book_id': b}))
+            for p, b in route_loans
+        ))
+        results['POST /return'] = summarize(timed(
+            (lambda p=p, b=b: client.post('/return', data={'patron_id': p, 'book_id': b}))
+            for p, b in route_loans
+        ))
+        database.close_pool()
+    return results
+
+
+def metadata(args) -> dict:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'git_commit': commit,
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'db_profile': database.DB_PROFILE,
+        'schema_version': database.SCHEMA_VERSION,
+        'seed': args.seed,
+        'iterations': args.iterations,
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> bool:
+    """Print p50 changes against a baseline; return True if nothing regressed."""
+    ok = True
+    print(f"\n{'scale':>9} {'operation':<36} {'base p50':>10} {'p50':>10} {'change':>8}")
+    for scale, operations in results['results'].items():
+        base_ops = baseline.get('results', {}).get(scale, {})
+        for name, stats in operations.items():
+            base = base_ops.get(name)
+            if not base or not base['p50_ms']:
+                continue
+            change = stats['p50_ms'] / base['p50_ms'] - 1
+            flag = ''
+            if change > threshold:
+                flag, ok = '  REGRESSION', False
+            print(f"{scale:>9} {name:<36} {base['p50_ms']:>10.3f} {stats['p50_ms']:>10.3f} {change:>+8.0%}{flag}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', default='1k,100k,1M', help='Comma-separated catalog sizes')
+    parser.add_argument('--iterations', type=int, default=200, help='Calls per operation')
+    parser.add_argument('--seed', type=int, default=327)
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'library-bench'),
+                        help='Where generated template databases are kept between runs')
+    parser.add_argument('--output', default='bench-results.json')
+    parser.add_argument('--compare', help='Earlier results file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.20,
+                        help='Relative p50 slowdown reported as a regression')
+    args = parser.parse_args()
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    output = {'meta': metadata(args), 'results': {}}
+    for scale in args.scales.split(','):
+        books = parse_scale(scale)
+        print(f'scale {books:,} books', file=sys.stderr)
+        results = run_scale(books, args.iterations, args.seed, args.data_dir)
+        output['results'][str(books)] = results
+        for name, stats in results.items():
+            print(f"  {name:<36} p50 {stats['p50_ms']:>9.3f} ms  p95 {stats['p95_ms']:>9.3f} ms  "
+                  f"{stats['ops_per_s'] or 0:>10,.0f} ops/s", file=sys.stderr)
+
+    with open(args.output, 'w') as handle:
+        json.dump(output, handle, indent=2)
+    print(f'wrote {args.output}', file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare) as handle:
+            baseline = json.load(handle)
+        if not compare(output, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""
+Benchmark: Flask development server vs. the gunicorn pre-fork setup.
+
+Starts each server as a subprocess on a fresh database in a temporary
+directory, then drives it with concurrent HTTP clients for a fixed time:
+
+- dev:      app.run(debug=True), what `python app.py` used to serve
+- gunicorn: gunicorn -c gunicorn.conf.py wsgi:app with --workers / --threads
+
+Client threads loop GET /catalog and GET /api/search (without
+If-None-Match, so every request renders). Reported per server: requests/s,
+p50/p99 latency and error count.
+
+Usage:
+    python benchmarks/bench_wsgi.py [--seconds 10] [--clients 16] [--workers 4] [--threads 4]
+"""
+
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PATHS = ['/catalog', '/api/search?q=the&type=title']
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(kind: str, port: int, workdir: str, workers: int, threads: int) -> subprocess.Popen:
+    env = dict(os.environ, PYTHONPATH=REPO, LIBRARY_WORKERS=str(workers), LIBRARY_THREADS=str(threads),
+               LIBRARY_ACCESS_LOG='')
+    subprocess.run([sys.executable, '-m', 'flask', '--app', 'app', 'migrate', '--seed'],
+                   cwd=workdir, env=env, check=True, stdout=subprocess.DEVNULL)
+    if kind == 'dev':
+        code = ("from app import create_app; "
+                f"create_app().run(debug=True, host='127.0.0.1', port={port}, use_reloader=False)")
+        cmd = [sys.executable, '-c', code]
+    else:
+        cmd = [sys.executable, '-m', 'gunicorn', '-c', os.path.join(REPO, 'gunicorn.conf.py'),
+               '--bind', f'127.0.0.1:{port}', 'wsgi:app']
+    process = subprocess.Popen(cmd, cwd=workdir, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f'http://127.0.0.1:{port}'
+    for _ in range(200):
+        try:
+            requests.get(base_url + '/catalog', timeout=1)
+            return process
+        except requests.ConnectionError:
+            time.sleep(0.05)
+    process.kill()
+    raise RuntimeError(f'{kind} server did not start')
+
+
+def run_load(base_url: str, seconds: float, clients: int):
+    """Run `clients` threads for `seconds`; returns (latencies, errors)."""
+    stop = threading.Event()
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+
+    def client(index):
+        session = requests.Session()
+        mine, failed, i = [], 0, index
+        while not stop.is_set():
+            started = time.perf_counter()
+            try:
+                response = session.get(base_url + PATHS[i % len(PATHS)], timeout=10)
+                if response.status_code != 200:
+                    failed += 1
+            except requests.RequestException:
+                failed += 1
+            mine.append(time.perf_counter() - started)
+            i += 1
+        with lock:
+            latencies.extend(mine)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    return sorted(latencies), errors[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--clients', type=int, default=16, help='Concurrent client threads')
+    parser.add_argument('--workers', type=int, default=4, help='gunicorn worker processes')
+    parser.add_argument('--threads', type=int, default=4, help='gunicorn threads per worker')
+    args = parser.parse_args()
+
+    print(f"{args.clients} clients, {args.seconds:.0f}s per server, {os.cpu_count()} CPU(s)")
+    print(f"{'server':<28} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for kind in ('dev', 'gunicorn'):
+        with tempfile.TemporaryDirectory() as workdir:
+            port = free_port()
+            process = start_server(kind, port, workdir, args.workers, args.threads)
+            try:
+                run_load(f'http://127.0.0.1:{port}', 1.0, args.clients)  # Warm up
+                latencies, errors = run_load(f'http://127.0.0.1:{port}', args.seconds, args.clients)
+            finally:
+                process.terminate()
+                process.wait()
+        label = kind if kind == 'dev' else f'gunicorn {args.workers}w x {args.threads}t'
+        p50 = latencies[len(latencies) // 2] * 1000 if latencies else 0.0
+        p99 = latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0.0
+        print(f"{label:<28} {len(latencies) / args.seconds:>8.0f} {p50:>8.1f} {p99:>8.1f} {errors:>7}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""
+CLI Commands - Maintenance commands for the Library Management System
+
+Registered on the Flask app, so they run as e.g.:
+    flask --app app migrate --seed
+    flask --app app import-books feed.csv
+    flask --app app reconcile-payments --succeeded 12 --transaction-id txn_123456_001
+"""
+
+import click
+
+from database import (
+    init_database, add_sample_data, get_schema_version, get_payments_to_reconcile, resolve_payment,
+    PAYMENT_SUCCEEDED, PAYMENT_FAILED
+)
+from services.catalog_import import import_books, IMPORT_CHUNK_SIZE
+from services.fine_collection import collect_fines, COLLECTION_WORKERS, COLLECTION_RATE_LIMIT
+
+
+@click.command('import-books')
+@click.argument('csv_file', type=click.Path(exists=True, dir_okay=False))
+@click.option('--chunk-size', default=IMPORT_CHUNK_SIZE, show_default=True,
+              help='Rows validated and inserted per transaction.')
+@click.option('--max-errors', default=20, show_default=True,
+              help='Number of rejected rows to print.')
+def import_books_command(csv_file, chunk_size, max_errors):
+    """Bulk import books from CSV_FILE (columns: title, author, isbn, total_copies)."""
+    report = import_books(csv_file, chunk_size)
+    
+    for error in report['errors'][:max_errors]:
+        click.echo(f"line {error['line']} ({error['isbn'] or 'no ISBN'}): {error['message']}", err=True)
+    if len(report['errors']) > max_errors:
+        click.echo(f"... {len(report['errors']) - max_errors} more rejected rows", err=True)
+    
+    rate = report['rows'] / report['seconds'] if report['seconds'] else report['rows']
+    click.echo(
+        f"{report['rows']} rows: {report['inserted']} inserted, "
+        f"{report['duplicates']} duplicates, {report['invalid']} invalid "
+        f"in {report['seconds']:.2f}s ({rate:.0f} rows/s)"
+    )
+
+
+@click.command('migrate')
+@click.option('--seed', is_flag=True, help='Also add the demo books and loans to an empty catalog.')
+def migrate_command(seed):
+    """Create the tables and apply pending schema migrations (run once per deploy)."""
+    before = get_schema_version()
+    init_database()
+    after = get_schema_version()
+    if after == before:
+        click.echo(f"Database already at schema version {after}")
+    else:
+        click.echo(f"Migrated database from schema version {before} to {after}")
+    if seed:
+        add_sample_data()
+        click.echo("Sample data added (if the catalog was empty)")
+
+
+@click.command('collect-fines')
+@click.option('--run-id', default=None,
+              help='Run to start or resume (default: one run per day, fines-YYYY-MM-DD).')
+@click.option('--workers', default=COLLECTION_WORKERS, show_default=True,
+              help='Charges submitted concurrently.')
+@click.option('--rate', default=COLLECTION_RATE_LIMIT, show_default=True,
+              help='Maximum charges per second (0 for no limit).')
+@click.option('--retry-failed', is_flag=True,
+              help='When resuming, also retry patrons whose charge failed.')
+@click.option('--gateway-url', default=None,
+              help='Payment provider API root; uses the HTTP client instead of the simulated gateway.')
+def collect_fines_command(run_id, workers, rate, retry_failed, gateway_url):
+    """Charge every patron with outstanding late fees."""
+    gateway = None
+    if gateway_url:
+        from services.async_payment_gateway import AsyncPaymentGateway
+        gateway = AsyncPaymentGateway(base_url=gateway_url, max_concurrency=workers)
+    try:
+        report = collect_fines(gateway, run_id=run_id, workers=workers, rate_limit=rate or None,
+                               retry_failed=retry_failed)
+    finally:
+        if gateway is not None:
+            gateway.close()
+    
+    action = 'Resumed' if report['resumed'] else 'Started'
+    click.echo(
+        f"{action} run {report['run_id']}: {report['patrons']} patrons ({report['loans']} loans), "
+        f"{report['succeeded']} charged, {report['failed']} failed, "
+        f"${report['amount_collected']:.2f} collected "
+        f"in {report['seconds']:.2f}s ({report['charges_per_second']:.1f} charges/s)"
+    )
+    if report['unknown'] or report['in_flight']:
+        click.echo(
+            f"{report['unknown']} charges with unknown outcome and {report['in_flight']} loans left in flight "
+            f"by an earlier attempt; check them with reconcile-payments",
+            err=True
+        )
+
+
+@click.command('reconcile-payments')
+@click.option('--succeeded', 'succeeded_id', type=int, default=None,
+              help='Ledger entry the provider confirmed as charged.')
+@click.option('--failed', 'failed_id', type=int, default=None,
+              help='Ledger entry the provider has no record of; it may then be retried.')
+@click.option('--transaction-id', default=None,
+              help='Provider transaction of the entry marked with --succeeded.')
+def reconcile_payments_command(succeeded_id, failed_id, transaction_id):
+    """List payments whose outcome is unknown, or settle one after checking with the provider."""
+    if succeeded_id is not None and failed_id is not None:
+        raise click.UsageError("Use only one of --succeeded and --failed.")
+    if succeeded_id is not None or failed_id is not None:
+        status = PAYMENT_SUCCEEDED if succeeded_id is not None else PAYMENT_FAILED
+        payment_id = succeeded_id if succeeded_id is not None else failed_id
+        if not resolve_payment(payment_id, status, transaction_id, "Resolved by reconciliation"):
+            raise click.ClickException(f"Payment {payment_id} is not awaiting reconciliation.")
+        click.echo(f"Payment {payment_id} marked {status}")
+        return
+    
+    payments = get_payments_to_reconcile()
+    for payment in payments:
+        click.echo(
+            f"{payment['id']}\t{payment['kind']}\t{payment['patron_id']}\t${payment['amount']:.2f}\t"
+            f"{payment['updated_at']}\t{payment['idempotency_key'] or payment['run_id']}\t"
+            f"{payment['message'] or ''}"
+        )
+    click.echo(f"{len(payments)} payments awaiting reconciliation", err=True)
+
+
+def register_commands(app):
+    """Register all CLI commands with the Flask app."""
+    app.cli.add_command(migrate_command)
+    app.cli.add_command(import_books_command)
+    app.cli.add_command(collect_fines_command)
+    app.cli.add_command(reconcile_payments_command)
@@ -3,18 +3,428 @@ Database module for Library Management System
 Handles all database operations and connections
 """
 
+import atexit
+import json
+import os
 import sqlite3
+import threading
+from contextlib import contextmanager
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import unquote, urlsplit
+
+import query_stats
+from cache import LRUCache
+from services.fee_engine import late_fee_sql
+
+# Database configuration: a file path or a SQLite URI (LIBRARY_DATABASE).
+# MEMORY_DATABASE (or ':memory:') selects a shared-cache in-memory database:
+# every pooled connection of the process sees the same data, which lives
+# until the process exits or release_memory_database() is called. It is
+# meant for tests and tools; it is not shared with forked workers.
+MEMORY_DATABASE = 'file:library?mode=memory&cache=shared'
+
+def _normalize_database(database: str) -> str:
+    return MEMORY_DATABASE if database == ':memory:' else database
+
+DATABASE = _normalize_database(os.environ.get('LIBRARY_DATABASE', 'library.db'))
+
+# Connection pool configuration (overridable through the environment)
+POOL_SIZE = int(os.environ.get('LIBRARY_DB_POOL_SIZE', '5'))
+
+# SQLite performance profiles, applied to every new connection.
+#
+# durable:    WAL journal with synchronous=FULL. Readers no longer block
+#             behind writers, and every commit is fsynced, so a committed
+#             borrow/return survives a power loss.
+# throughput: WAL with synchronous=NORMAL, a larger page cache, memory-mapped
+#             reads and in-memory temp tables. Commits are atomic and the
+#             database cannot be corrupted, but the last transactions before
+#             a power loss (not an application crash) may be rolled back.
+DB_PROFILES: Dict[str, Dict[str, object]] = {
+    'durable': {
+        'journal_mode': 'WAL',
+        'synchronous': 'FULL',
+        'cache_size': -16000,  # negative = KiB, i.e. ~16 MB
+        'mmap_size': 0,
+        'temp_store': 'DEFAULT',
+        'busy_timeout': 5000,  # ms
+    },
+    'throughput': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -64000,
+        'mmap_size': 268435456,  # 256 MB
+        'temp_store': 'MEMORY',
+        'busy_timeout': 5000,
+    },
+}
+
+DB_PROFILE = os.environ.get('LIBRARY_DB_PROFILE', 'durable')
+
+def _resolve_profile(profile) -> Dict[str, object]:
+    if isinstance(profile, dict):
+        return profile
+    if profile not in DB_PROFILES:
+        raise ValueError(f"Unknown database profile '{profile}'. Choose one of: {', '.join(DB_PROFILES)}")
+    return DB_PROFILES[profile]
+
+def apply_db_profile(conn: sqlite3.Connection, profile=None):
+    """Apply the PRAGMAs of a performance profile (default: DB_PROFILE) to a connection."""
+    for pragma, value in _resolve_profile(profile if profile is not None else DB_PROFILE).items():
+        conn.execute(f'PRAGMA {pragma} = {value}')
+
+
+class PooledConnection(sqlite3.Connection):
+    """
+    sqlite3 connection handed out by the ConnectionPool.
+
+    close() returns the connection to its pool instead of closing it, so
+    existing code written as get_db_connection() ... conn.close() keeps
+    working unchanged while reusing the underlying SQLite handle.
+    """
+
+    _pool = None
+
+    def close(self):
+        """Release the connection back to its pool (or close it if unpooled)."""
+        if self._pool is not None:
+            self._pool.release(self)
+        else:
+            super().close()
+
+    def close_for_real(self):
+        """Close the underlying SQLite handle."""
+        super().close()
+
+
+class InstrumentedConnection(PooledConnection):
+    """
+    PooledConnection whose cursors are timed by query_stats.
+
+    Only used while query statistics are enabled, so the normal query path
+    carries no instrumentation at all.
+    """
+
+    def cursor(self, factory=query_stats.TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+class ConnectionPool:
+    """
+    Thread-aware pool of SQLite connections.
+
+    A thread that asks for a connection while it already holds one gets the
+    same connection back (nested helpers share one handle); otherwise an idle
+    connection is reused after a health check, or a new one is opened.
+    At most `size` idle connections are kept; extra connections opened under
+    load are closed when released.
+    """
+
+    def __init__(self, database: str, size: int = POOL_SIZE):
+        self.database = database
+        self.size = max(size, 0)
+        # Process that opened the connections; they must not be used after fork
+        self.pid = os.getpid()
+        self._idle = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._closed = False
+        self.hits = 0
+        self.misses = 0
+        self.health_check_failures = 0
+        self.discarded = 0
+        self.in_use = 0
+
+    def _connect(self) -> PooledConnection:
+        factory = InstrumentedConnection if query_stats.ENABLED else PooledConnection
+        conn = _connect(self.database, factory)
+        conn.row_factory = sqlite3.Row  # This enables column access by name
+        apply_db_profile(conn)
+        conn._pool = self
+        return conn
+
+    @staticmethod
+    def _is_healthy(conn: PooledConnection) -> bool:
+        try:
+            conn.execute('SELECT 1').fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def acquire(self) -> PooledConnection:
+        """Get a connection for the calling thread."""
+        held = getattr(self._local, 'conn', None)
+        if held is not None:
+            self._local.depth += 1
+            return held
+
+        conn = None
+        while conn is None:
+            with self._lock:
+                candidate = self._idle.pop() if self._idle else None
+            if candidate is None:
+                break
+            if self._is_healthy(candidate):
+                conn = candidate
+            else:
+                with self._lock:
+                    self.health_check_failures += 1
+                    self.discarded += 1
+                candidate._pool = None
+                candidate.close_for_real()
+
+        with self._lock:
+            if conn is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+            self.in_use += 1
+        if conn is None:
+            conn = self._connect()
+
+        self._local.conn = conn
+        self._local.depth = 1
+        return conn
+
+    def release(self, conn: PooledConnection):
+        """Return a connection obtained from acquire()."""
+        if getattr(self._local, 'conn', None) is conn:
+            self._local.depth -= 1
+            if self._local.depth > 0:
+                return
+            self._local.conn = None
+
+        # Discard any work the caller neither committed nor rolled back,
+        # matching what closing a plain sqlite3 connection would do.
+        if conn.in_transaction:
+            conn.rollback()
+        conn.row_factory = sqlite3.Row
+
+        with self._lock:
+            self.in_use -= 1
+            if not self._closed and len(self._idle) < self.size:
+                self._idle.append(conn)
+                return
+            self.discarded += 1
+        conn._pool = None
+        conn.close_for_real()
+
+    def close_all(self):
+        """Close every idle connection and stop pooling new releases."""
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn._pool = None
+            conn.close_for_real()
+
+    def stats(self) -> Dict:
+        """Return pool counters for monitoring."""
+        with self._lock:
+            return {
+                'database': self.database,
+                'size': self.size,
+                'idle': len(self._idle),
+                'in_use': self.in_use,
+                'hits': self.hits,
+                'misses': self.misses,
+                'health_check_failures': self.health_check_failures,
+                'discarded': self.discarded,
+            }
+
+
+def is_memory_database(database: str) -> bool:
+    """Whether `database` names an in-memory database."""
+    return database == ':memory:' or (database.startswith('file:') and 'mode=memory' in database)
+
+
+def database_path(database: str) -> Optional[str]:
+    """File path of a database file or SQLite file: URI (None for in-memory databases)."""
+    if is_memory_database(database):
+        return None
+    if database.startswith('file:'):
+        return unquote(urlsplit(database).path)
+    return database
+
+
+def _connect(database: str, factory=sqlite3.Connection) -> sqlite3.Connection:
+    return sqlite3.connect(database, factory=factory, check_same_thread=False,
+                           uri=database.startswith('file:'))
+
+
+# One idle connection per shared in-memory database keeps its data alive
+# while the pool opens and closes connections
+_memory_databases: Dict[str, sqlite3.Connection] = {}
+_memory_lock = threading.Lock()
+
+
+def _keep_alive(database: str) -> Optional[sqlite3.Connection]:
+    if not is_memory_database(database):
+        return None
+    with _memory_lock:
+        if database not in _memory_databases:
+            _memory_databases[database] = _connect(database)
+        return _memory_databases[database]
+
+
+def release_memory_database(database: str):
+    """Drop a shared in-memory database once no pooled connection uses it."""
+    with _memory_lock:
+        conn = _memory_databases.pop(database, None)
+    if conn is not None:
+        conn.close()
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+_inherited_pools: List[ConnectionPool] = []
+
+
+def _abandon_inherited_pool():
+    """
+    Forget a pool created by the parent of a forked worker.
+    
+    SQLite connections must not cross fork(): the child neither uses nor
+    closes them (closing could checkpoint or remove the parent's WAL), it
+    simply opens its own.
+    """
+    global _pool, _pool_lock
+    if _pool is not None and _pool.pid != os.getpid():
+        # Keep a reference so garbage collection never closes them either
+        _inherited_pools.append(_pool)
+        _pool = None
+        _pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """Get the connection pool for the current DATABASE, creating it if needed."""
+    global _pool
+    pool = _pool
+    if pool is not None and pool.pid != os.getpid():
+        _abandon_inherited_pool()
+        pool = None
+    if pool is None or pool.database != DATABASE:
+        with _pool_lock:
+            if _pool is None or _pool.database != DATABASE:
+                if _pool is not None:
+                    _pool.close_all()
+                    if _pool.database != DATABASE:
+                        book_cache.clear()  # Rows cached from another database
+                _keep_alive(DATABASE)
+                _pool = ConnectionPool(DATABASE, POOL_SIZE)
+            pool = _pool
+    return pool
+
+
+def set_database(database: str):
+    """
+    Switch to another database file, SQLite URI or ':memory:'.
+    
+    Pooled connections to the previous database are closed.
+    """
+    global DATABASE
+    DATABASE = _normalize_database(database)
+    _keep_alive(DATABASE)
+    close_pool()
+    book_cache.clear()
+    bump_catalog_version()
+
+
+def copy_database(source: str, target: Optional[str] = None):
+    """
+    Replace the contents of `target` (default: DATABASE) with those of `source`.
+    
+    Uses SQLite's online backup API, so copying a small database takes
+    microseconds and works between files and in-memory databases alike.
+    Pooled connections are closed first; none may be in use.
+    
+    Args:
+        source: File path or URI of the database to copy
+        target: File path or URI to overwrite
+    """
+    target = _normalize_database(target or DATABASE)
+    close_pool()
+    src = _connect(_normalize_database(source))
+    keeper = _keep_alive(target)
+    dst = keeper or _connect(target)
+    try:
+        src.backup(dst)
+    finally:
+        src.close()
+        if dst is not keeper:
+            dst.close()
+    if target == DATABASE:
+        book_cache.clear()
+        bump_catalog_version()
+
+
+def configure_pool(size: int):
+    """Resize the connection pool; idle connections beyond the new size are closed."""
+    global POOL_SIZE
+    POOL_SIZE = size
+    close_pool()
+
+
+def set_db_profile(profile):
+    """
+    Select the SQLite performance profile for new connections.
+    
+    Args:
+        profile: Name of a DB_PROFILES preset, or a dict of PRAGMA values
+    """
+    global DB_PROFILE
+    _resolve_profile(profile)  # Validate before switching
+    DB_PROFILE = profile
+    close_pool()
+
+
+def configure_query_stats(enabled: Optional[bool] = None, slow_query_ms: Optional[float] = None,
+                          explain: Optional[bool] = None):
+    """
+    Change query statistics settings (see query_stats).
+    
+    Args:
+        enabled: Time every statement on connections opened from now on
+        slow_query_ms: Threshold for the slow-query log
+        explain: Add EXPLAIN QUERY PLAN output to slow-query log entries
+    """
+    if slow_query_ms is not None:
+        query_stats.SLOW_QUERY_MS = slow_query_ms
+    if explain is not None:
+        query_stats.SLOW_QUERY_EXPLAIN = explain
+    if enabled is not None and enabled != query_stats.ENABLED:
+        query_stats.ENABLED = enabled
+        close_pool()  # Reopen connections with the matching factory
+
+
+def close_pool():
+    """Close all pooled connections. The next get_db_connection() starts a new pool."""
+    global _pool
+    _abandon_inherited_pool()
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close_all()
+            _pool = None
+
+
+def get_pool_stats() -> Dict:
+    """Get hit/miss counters of the connection pool."""
+    return get_pool().stats()
+
+
+atexit.register(close_pool)
 
-# Database configuration
-DATABASE = 'library.db'
 
 def get_db_connection():
-    """Get a database connection."""
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row  # This enables column access by name
-    return conn
+    """Get a pooled database connection. Call close() to give it back."""
+    return get_pool().acquire()
 
 def init_database():
     """Initialize the database with required tables."""
@@ -47,6 +457,170 @@ def init_database():
     
     conn.commit()
     conn.close()
+    
+    # Bring existing databases up to the current schema version
+    run_migrations()
+
+# Schema migrations
+#
+# Each entry is (version, description, statements). Migrations run in order
+# for every version above the database's PRAGMA user_version, each in its
+# own transaction together with the version bump. Append new migrations to
+# the end; never edit one that has already shipped.
+MIGRATIONS: List[Tuple[int, str, List[str]]] = [
+    (1, 'Index open loans and (book_id, patron_id) lookups on borrow_records', [
+        '''
+        CREATE INDEX IF NOT EXISTS idx_borrow_records_open_patron
+        ON borrow_records (patron_id, book_id)
+        WHERE return_date IS NULL
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_borrow_records_book_patron
+        ON borrow_records (book_id, patron_id)
+        ''',
+    ]),
+    (2, 'Full-text index on book title and author', [
+        # External-content FTS5 table over books. The trigram tokenizer
+        # matches case-insensitive substrings, same as the old Python scan.
+        '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5(
+            title, author,
+            content='books', content_rowid='id',
+            tokenize='trigram'
+        )
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS books_fts_insert AFTER INSERT ON books BEGIN
+            INSERT INTO books_fts (rowid, title, author) VALUES (new.id, new.title, new.author);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS books_fts_delete AFTER DELETE ON books BEGIN
+            INSERT INTO books_fts (books_fts, rowid, title, author) VALUES ('delete', old.id, old.title, old.author);
+        END
+        ''',
+        # Only title/author changes touch the index, not availability updates
+        '''
+        CREATE TRIGGER IF NOT EXISTS books_fts_update AFTER UPDATE OF title, author ON books BEGIN
+            INSERT INTO books_fts (books_fts, rowid, title, author) VALUES ('delete', old.id, old.title, old.author);
+            INSERT INTO books_fts (rowid, title, author) VALUES (new.id, new.title, new.author);
+        END
+        ''',
+        "INSERT INTO books_fts (books_fts) VALUES ('rebuild')",
+    ]),
+    (3, 'Index books by title for ordered catalog pages', [
+        # The rowid (id) is implicitly part of the key, so this serves
+        # ORDER BY title, id and (title, id) keyset seeks
+        'CREATE INDEX IF NOT EXISTS idx_books_title ON books (title)',
+    ]),
+    (4, 'Payments ledger and overdue loan index', [
+        # One row per loan and charge attempt. status: pending | succeeded | failed
+        '''
+        CREATE TABLE IF NOT EXISTS payments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            patron_id TEXT NOT NULL,
+            book_id INTEGER,
+            borrow_record_id INTEGER,
+            amount REAL NOT NULL,
+            status TEXT NOT NULL,
+            transaction_id TEXT,
+            message TEXT,
+            run_id TEXT,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL,
+            FOREIGN KEY (book_id) REFERENCES books (id),
+            FOREIGN KEY (borrow_record_id) REFERENCES borrow_records (id)
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_payments_run ON payments (run_id, status)',
+        'CREATE INDEX IF NOT EXISTS idx_payments_borrow_record ON payments (borrow_record_id, status)',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_borrow_records_open_due
+        ON borrow_records (due_date)
+        WHERE return_date IS NULL
+        ''',
+    ]),
+    (5, 'Idempotency keys and reconciliation index for payments', [
+        "ALTER TABLE payments ADD COLUMN kind TEXT NOT NULL DEFAULT 'charge'",
+        'ALTER TABLE payments ADD COLUMN idempotency_key TEXT',
+        '''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_payments_idempotency_key
+        ON payments (idempotency_key)
+        WHERE idempotency_key IS NOT NULL
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_payments_created ON payments (created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_payments_transaction ON payments (transaction_id)',
+    ]),
+    (6, 'Index for payments awaiting reconciliation', [
+        '''
+        CREATE INDEX IF NOT EXISTS idx_payments_unresolved
+        ON payments (status, updated_at)
+        WHERE status IN ('pending', 'unknown')
+        ''',
+    ]),
+    (7, 'Case-insensitive title and author indexes for prefix search', [
+        'CREATE INDEX IF NOT EXISTS idx_books_title_lower ON books (lower(title))',
+        'CREATE INDEX IF NOT EXISTS idx_books_author_lower ON books (lower(author))',
+    ]),
+    (8, 'Index for planned payments of abandoned collection runs', [
+        "CREATE INDEX IF NOT EXISTS idx_payments_planned ON payments (updated_at) WHERE status = 'planned'",
+    ]),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def get_schema_version() -> int:
+    """Get the schema version recorded in the database."""
+    conn = get_db_connection()
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    conn.close()
+    return version
+
+def run_migrations() -> List[int]:
+    """
+    Apply every pending migration to the database.
+    
+    Returns:
+        list: Versions that were applied (empty if already up to date)
+    """
+    applied = []
+    for version, description, statements in MIGRATIONS:
+        with transaction() as conn:
+            # Re-read inside the write lock so concurrent starters don't race
+            current = conn.execute('PRAGMA user_version').fetchone()[0]
+            if version <= current:
+                continue
+            for statement in statements:
+                conn.execute(statement)
+            conn.execute(f'PRAGMA user_version = {int(version)}')
+        applied.append(version)
+    return applied
+
+class SchemaVersionError(RuntimeError):
+    """The database has not been migrated to the schema this code expects."""
+
+
+def check_schema_version() -> int:
+    """
+    Verify that the database is migrated, without changing anything.
+    
+    This is the startup check: one PRAGMA read instead of running the
+    schema setup. Databases newer than SCHEMA_VERSION are accepted, since
+    migrations only add to the schema.
+    
+    Returns:
+        int: The database's schema version
+        
+    Raises:
+        SchemaVersionError: The database is behind SCHEMA_VERSION
+    """
+    version = get_schema_version()
+    if version < SCHEMA_VERSION:
+        raise SchemaVersionError(
+            f"Database {DATABASE} is at schema version {version}, expected {SCHEMA_VERSION}. "
+            "Run `flask --app app migrate` first."
+        )
+    return version
 
 def add_sample_data():
     """Add sample data to the database if it's empty."""
@@ -111,26 +685,291 @@ def add_sample_data():
 
 # Helper Functions for Database Operations
 
-def get_all_books() -> List[Dict]:
-    """Get all books from the database."""
+def get_all_books(limit: Optional[int] = None, after: Optional[Tuple[str, int]] = None,
+                  before: Optional[Tuple[str, int]] = None) -> List[Dict]:
+    """
+    Get books from the database ordered by (title, id).
+    
+    Without arguments every book is returned. With a limit, `after` / `before`
+    are keyset cursors: the (title, id) of the last / first row of the page
+    the caller already has. Seeking on idx_books_title keeps the cost of a
+    page independent of how deep into the catalog it is.
+    
+    Args:
+        limit: Maximum number of books to return (None for all)
+        after: Return books sorting after this (title, id)
+        before: Return books sorting before this (title, id)
+        
+    Returns:
+        list: Book dictionaries in (title, id) order
+    """
     conn = get_db_connection()
-    books = conn.execute('SELECT * FROM books ORDER BY title').fetchall()
+    if before is not None:
+        books = conn.execute('''
+            SELECT * FROM books WHERE (title, id) < (?, ?)
+            ORDER BY title DESC, id DESC LIMIT ?
+        ''', (before[0], before[1], -1 if limit is None else limit)).fetchall()
+        books.reverse()
+    elif after is not None:
+        books = conn.execute('''
+            SELECT * FROM books WHERE (title, id) > (?, ?)
+            ORDER BY title, id LIMIT ?
+        ''', (after[0], after[1], -1 if limit is None else limit)).fetchall()
+    else:
+        books = conn.execute('SELECT * FROM books ORDER BY title, id LIMIT ?',
+                             (-1 if limit is None else limit,)).fetchall()
     conn.close()
     return [dict(book) for book in books]
 
+def iter_book_batches(batch_size: int = 1000) -> Iterator[List[Dict]]:
+    """
+    Stream every book in id order, `batch_size` rows at a time.
+    
+    Rows are pulled from a single SQLite cursor with fetchmany, so memory
+    stays proportional to one batch regardless of catalog size. The pooled
+    connection is held until the generator is exhausted or closed.
+    
+    Args:
+        batch_size: Rows fetched per round trip
+        
+    Yields:
+        list: Book dictionaries
+    """
+    conn = get_db_connection()
+    try:
+        cursor = conn.execute('SELECT * FROM books ORDER BY id')
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield [dict(row) for row in rows]
+    finally:
+        conn.close()
+
+def get_books_page(page_size: int, after: Optional[Tuple[str, int]] = None,
+                   before: Optional[Tuple[str, int]] = None) -> Dict:
+    """
+    Get one page of the catalog with cursors for the neighbouring pages.
+    
+    Args:
+        page_size: Number of books per page
+        after: Cursor from a previous page's 'next_cursor'
+        before: Cursor from a previous page's 'prev_cursor'
+        
+    Returns:
+        dict: 'books' plus 'next_cursor' / 'prev_cursor' ((title, id) or None)
+    """
+    # Fetch one extra row to learn whether another page exists
+    books = get_all_books(page_size + 1, after=after, before=before)
+    more = len(books) > page_size
+    if before is not None:
+        books = books[1:] if more else books
+        has_prev, has_next = more, True
+    else:
+        books = books[:page_size]
+        has_prev, has_next = after is not None, more
+    
+    return {
+        'books': books,
+        'prev_cursor': (books[0]['title'], books[0]['id']) if books and has_prev else None,
+        'next_cursor': (books[-1]['title'], books[-1]['id']) if books and has_next else None,
+    }
+
+# Read-through cache of book rows, keyed by ('id', id) and ('isbn', isbn).
+# Writes made through this module invalidate the affected book; the TTL
+# bounds staleness from writes by other processes or raw SQL.
+book_cache = LRUCache(
+    max_size=int(os.environ.get('LIBRARY_BOOK_CACHE_SIZE', '1024')),
+    ttl=float(os.environ.get('LIBRARY_BOOK_CACHE_TTL', '30')),
+    enabled=os.environ.get('LIBRARY_BOOK_CACHE', '1') != '0'
+)
+
+def configure_book_cache(enabled: Optional[bool] = None, max_size: Optional[int] = None,
+                         ttl: Optional[float] = None):
+    """Change book cache settings (e.g. enabled=False in tests). Clears the cache."""
+    if enabled is not None:
+        book_cache.enabled = enabled
+    if max_size is not None:
+        book_cache.max_size = max_size
+    if ttl is not None:
+        book_cache.ttl = ttl
+    book_cache.clear()
+
+def get_book_cache_stats() -> Dict:
+    """Get hit/miss/eviction counters of the book cache."""
+    return book_cache.stats()
+
+def invalidate_book(book_id: Optional[int] = None, isbn: Optional[str] = None):
+    """Drop a book from the cache under both of its keys and bump the catalog version."""
+    keys = []
+    if book_id is not None:
+        keys.append(('id', book_id))
+    if isbn is not None:
+        keys.append(('isbn', isbn))
+    for key in keys:
+        cached = book_cache.pop(key)
+        if cached:
+            book_cache.pop(('id', cached['id']))
+            book_cache.pop(('isbn', cached['isbn']))
+    bump_catalog_version()
+
+# Catalog version, used as the ETag of catalog and search pages. Every write
+# to books made through this module stores a fresh token in a sidecar file
+# next to the database (<database>-catalog-version), which all worker
+# processes read; the size and modification time of the database and WAL
+# files are added to catch writes made by other programs. An in-memory
+# database has no files; there an in-process counter stands in.
+_catalog_version = 0
+_catalog_version_lock = threading.Lock()
+
+def _catalog_version_file(path: str) -> str:
+    return path + '-catalog-version'
+
+def bump_catalog_version():
+    """Record that the books table changed."""
+    global _catalog_version
+    with _catalog_version_lock:
+        _catalog_version += 1
+        version = _catalog_version
+    path = database_path(DATABASE)
+    if path is None:
+        return
+    token_file = _catalog_version_file(path)
+    tmp_file = f"{token_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_file, 'w') as handle:
+            handle.write(f"{os.getpid():x}.{version:x}.{os.urandom(4).hex()}")
+        os.replace(tmp_file, token_file)  # Readers see the old or the new token, never a partial one
+    except OSError:
+        pass  # Read-only location: the file stat()s below still apply
+
+def get_catalog_version() -> str:
+    """
+    Get a token that changes whenever the catalog may have changed.
+    
+    Runs no query: it reads the version file and stat()s the database and
+    WAL files, so all processes using the same database file get the same
+    token.
+    """
+    path = database_path(DATABASE)
+    if path is None:
+        return f"m{_catalog_version}"
+    try:
+        with open(_catalog_version_file(path)) as handle:
+            parts = [handle.read()]
+    except OSError:
+        parts = ['-']
+    for file in (path, path + '-wal'):
+        try:
+            stat = os.stat(file)
+            parts.append(f"{stat.st_mtime_ns:x}.{stat.st_size:x}")
+        except OSError:
+            parts.append('-')
+    return '-'.join(parts)
+
+def _get_cached_book(key: Tuple[str, object], sql: str) -> Optional[Dict]:
+    book = book_cache.get(key)
+    if book is None:
+        conn = get_db_connection()
+        book = conn.execute(sql, (key[1],)).fetchone()
+        conn.close()
+        if not book:
+            return None
+        book = dict(book)
+        book_cache.set(('id', book['id']), book)
+        book_cache.set(('isbn', book['isbn']), book)
+    # Hand out a copy so callers can't modify the cached row
+    return dict(book)
+
 def get_book_by_id(book_id: int) -> Optional[Dict]:
     """Get a specific book by ID."""
-    conn = get_db_connection()
-    book = conn.execute('SELECT * FROM books WHERE id = ?', (book_id,)).fetchone()
-    conn.close()
-    return dict(book) if book else None
+    return _get_cached_book(('id', book_id), 'SELECT * FROM books WHERE id = ?')
 
 def get_book_by_isbn(isbn: str) -> Optional[Dict]:
     """Get a specific book by ISBN."""
+    return _get_cached_book(('isbn', isbn), 'SELECT * FROM books WHERE isbn = ?')
+
+# Substring matches considered for ranking per search. Values starting with
+# the term are always ranked in full (they are found with an index seek);
+# for very common terms only the first SEARCH_CANDIDATES other matches are
+# ranked, which keeps latency flat on large catalogs.
+SEARCH_CANDIDATES = 1000
+
+def search_books(term: str, field: str, limit: Optional[int] = None) -> List[Dict]:
+    """
+    Search books by title or author substring, or by exact ISBN.
+    
+    Title/author searches go through the books_fts trigram index. Results
+    are ranked with values starting with the term first, then shorter
+    (closer) matches, then alphabetically. The values starting with the
+    term are looked up separately on idx_books_title_lower /
+    idx_books_author_lower, so every one that belongs in the first `limit`
+    results is returned however common the term is. Terms shorter than three
+    characters are below the trigram size and fall back to a LIKE scan.
+    
+    Args:
+        term: Text to search for
+        field: 'title', 'author' or 'isbn'
+        limit: Maximum number of results (None for all)
+        
+    Returns:
+        list: Matching book dictionaries
+    """
+    if limit is None:
+        limit = candidates = -1  # SQLite treats a negative LIMIT as unlimited
+    else:
+        candidates = max(limit, SEARCH_CANDIDATES)
+    
     conn = get_db_connection()
-    book = conn.execute('SELECT * FROM books WHERE isbn = ?', (isbn,)).fetchone()
+    if field == 'isbn':
+        books = conn.execute('SELECT * FROM books WHERE isbn = ? LIMIT ?', (term, limit)).fetchall()
+    elif field in ('title', 'author'):
+        if len(term) >= 3:
+            matches = '''
+                SELECT rowid AS id FROM books_fts
+                WHERE books_fts MATCH :query
+                LIMIT :candidates
+            '''
+        else:
+            matches = f'''
+                SELECT id FROM books
+                WHERE {field} LIKE :pattern ESCAPE '\\'
+                LIMIT :candidates
+            '''
+        if limit >= 0:
+            # Prefix matches no longer than the limit-th shortest one: a
+            # superset of the prefix matches among the first `limit` results
+            prefix = f'''
+                lower({field}) >= lower(:term) AND lower({field}) < lower(:term) || char(1114111)
+            '''
+            matches = f'''
+                SELECT id FROM ({matches})
+                UNION
+                SELECT id FROM books
+                WHERE {prefix} AND length(lower({field})) <= COALESCE((
+                    SELECT length(lower({field})) FROM books WHERE {prefix}
+                    ORDER BY 1 LIMIT 1 OFFSET :offset
+                ), length(lower({field})))
+            '''
+        pattern = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        books = conn.execute(f'''
+            SELECT b.* FROM ({matches}) m
+            JOIN books b ON b.id = m.id
+            ORDER BY substr(lower(b.{field}), 1, length(:term)) = lower(:term) DESC,
+                     length(b.{field}), b.title
+            LIMIT :limit
+        ''', {
+            'query': '{%s} : "%s"' % (field, term.replace('"', '""')),
+            'pattern': f'%{pattern}%',
+            'term': term,
+            'candidates': candidates,
+            'offset': max(limit - 1, 0),
+            'limit': limit,
+        }).fetchall()
+    else:
+        books = []
     conn.close()
-    return dict(book) if book else None
+    return [dict(book) for book in books]
 
 def get_patron_borrowed_books(patron_id: str) -> List[Dict]:
     """Get currently borrowed books for a patron."""
@@ -157,6 +996,49 @@ def get_patron_borrowed_books(patron_id: str) -> List[Dict]:
     
     return borrowed_books
 
+def get_patron_loan_summary(patron_id: str, as_of: datetime) -> List[Dict]:
+    """
+    Get a patron's open loans with overdue days, fees and totals in one query.
+    
+    Every row carries the per-loan values plus the patron-wide aggregates
+    total_fines, total_books_borrowed and total_overdue (window functions),
+    so callers never loop over loans to compute them.
+    
+    Args:
+        patron_id: 6-digit library card ID
+        as_of: Time to assess overdue status and fees at
+        
+    Returns:
+        list: One dict per open loan, ordered by borrow date
+    """
+    # Whole days overdue; SQLite date math is millisecond-precise
+    days = 'CAST(ROUND((julianday(:as_of) - julianday(br.due_date)) * 86400000) AS INTEGER) / 86400000'
+    conn = get_db_connection()
+    records = conn.execute(f'''
+        WITH loans AS (
+            SELECT br.book_id, b.title, b.author,
+                   substr(br.borrow_date, 1, 10) AS borrow_date,
+                   substr(br.due_date, 1, 10) AS due_date,
+                   br.due_date < :as_of AS is_overdue,
+                   CASE WHEN br.due_date < :as_of THEN {days} ELSE 0 END AS days_overdue,
+                   br.borrow_date AS borrowed_at
+            FROM borrow_records br
+            JOIN books b ON br.book_id = b.id
+            WHERE br.patron_id = :patron_id AND br.return_date IS NULL
+        ), fees AS (
+            SELECT *, {late_fee_sql('days_overdue')} AS late_fee FROM loans
+        )
+        SELECT book_id, title, author, borrow_date, due_date, is_overdue,
+               days_overdue, late_fee,
+               ROUND(SUM(late_fee) OVER (), 2) AS total_fines,
+               COUNT(*) OVER () AS total_books_borrowed,
+               SUM(is_overdue) OVER () AS total_overdue
+        FROM fees
+        ORDER BY borrowed_at
+    ''', {'patron_id': patron_id, 'as_of': as_of.isoformat()}).fetchall()
+    conn.close()
+    return [dict(record) for record in records]
+
 def get_patron_borrow_count(patron_id: str) -> int:
     """Get the number of books currently borrowed by a patron."""
     conn = get_db_connection()
@@ -177,11 +1059,44 @@ def insert_book(title: str, author: str, isbn: str, total_copies: int, available
         ''', (title, author, isbn, total_copies, available_copies))
         conn.commit()
         conn.close()
+        invalidate_book(isbn=isbn)
         return True
     except Exception as e:
         conn.close()
         return False
 
+def insert_books_bulk(books: List[Tuple[str, str, str, int, int]]) -> Tuple[int, List[str]]:
+    """
+    Insert many books in one transaction, skipping ISBNs already in the catalog.
+    
+    Existing ISBNs are found with a single set-based query for the whole
+    batch, and the remaining rows are written with executemany.
+    
+    Args:
+        books: (title, author, isbn, total_copies, available_copies) tuples
+               with unique ISBNs
+        
+    Returns:
+        tuple: (inserted count, ISBNs that already existed)
+    """
+    if not books:
+        return 0, []
+    
+    with transaction() as conn:
+        existing = {
+            row['isbn'] for row in conn.execute(
+                'SELECT isbn FROM books WHERE isbn IN (SELECT value FROM json_each(?))',
+                (json.dumps([book[2] for book in books]),)
+            )
+        }
+        new_books = [book for book in books if book[2] not in existing]
+        conn.executemany('''
+            INSERT INTO books (title, author, isbn, total_copies, available_copies)
+            VALUES (?, ?, ?, ?, ?)
+        ''', new_books)
+    bump_catalog_version()
+    return len(new_books), sorted(existing)
+
 def insert_borrow_record(patron_id: str, book_id: int, borrow_date: datetime, due_date: datetime) -> bool:
     """Insert a new borrow record into the database."""
     conn = get_db_connection()
@@ -206,6 +1121,7 @@ def update_book_availability(book_id: int, change: int) -> bool:
         ''', (change, book_id))
         conn.commit()
         conn.close()
+        invalidate_book(book_id)
         return True
     except Exception as e:
         conn.close()
@@ -226,3 +1142,480 @@ def update_borrow_record_return_date(patron_id: str, book_id: int, return_date:
     except Exception as e:
         conn.close()
         return False
+
+# Transactional unit-of-work helpers
+
+# Outcomes of borrow_book_atomic
+BORROW_OK = 'ok'
+BORROW_BOOK_NOT_FOUND = 'book_not_found'
+BORROW_UNAVAILABLE = 'unavailable'
+BORROW_ALREADY_BORROWED = 'already_borrowed'
+BORROW_LIMIT_REACHED = 'limit_reached'
+
+
+@contextmanager
+def transaction():
+    """
+    Run a block of statements as one BEGIN IMMEDIATE transaction.
+
+    The write lock is taken up front so check-then-write sequences cannot
+    interleave with another writer, and everything is committed once at
+    the end (or rolled back if the block raises). A transaction opened
+    while the thread is already inside one joins the outer transaction.
+
+    Yields:
+        sqlite3.Connection: Connection to run the statements on
+    """
+    conn = get_db_connection()
+    if conn.in_transaction:
+        try:
+            yield conn
+        finally:
+            conn.close()
+        return
+
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        yield conn
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def borrow_book_atomic(patron_id: str, book_id: int, borrow_date: datetime,
+                       due_date: datetime, max_borrowed: int = 5) -> Tuple[str, Optional[Dict]]:
+    """
+    Check availability, decrement it and record the loan in one transaction.
+
+    Args:
+        patron_id: 6-digit library card ID
+        book_id: ID of the book to borrow
+        borrow_date: Loan start
+        due_date: Loan due date
+        max_borrowed: Maximum number of open loans per patron
+
+    Returns:
+        tuple: (outcome: one of the BORROW_* constants, book: dict or None)
+    """
+    try:
+        with transaction() as conn:
+            book = conn.execute('SELECT * FROM books WHERE id = ?', (book_id,)).fetchone()
+            if not book:
+                return BORROW_BOOK_NOT_FOUND, None
+            book = dict(book)
+
+            if book['available_copies'] <= 0:
+                return BORROW_UNAVAILABLE, book
+
+            open_loans = conn.execute('''
+                SELECT COUNT(*) AS count, COALESCE(SUM(book_id = ?), 0) AS same_book
+                FROM borrow_records
+                WHERE patron_id = ? AND return_date IS NULL
+            ''', (book_id, patron_id)).fetchone()
+            if open_loans['same_book']:
+                return BORROW_ALREADY_BORROWED, book
+            if open_loans['count'] >= max_borrowed:
+                return BORROW_LIMIT_REACHED, book
+
+            # Conditional decrement: never lets available_copies go below zero
+            updated = conn.execute('''
+                UPDATE books SET available_copies = available_copies - 1
+                WHERE id = ? AND available_copies > 0
+            ''', (book_id,)).rowcount
+            if not updated:
+                return BORROW_UNAVAILABLE, book
+
+            conn.execute('''
+                INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
+                VALUES (?, ?, ?, ?)
+            ''', (patron_id, book_id, borrow_date.isoformat(), due_date.isoformat()))
+            book['available_copies'] -= 1
+            return BORROW_OK, book
+    finally:
+        # Drop the cached row once the transaction has finished
+        invalidate_book(book_id)
+
+
+def return_book_atomic(patron_id: str, book_id: int, return_date: datetime) -> Optional[datetime]:
+    """
+    Close the patron's open loan for a book and restore availability in one transaction.
+
+    Args:
+        patron_id: 6-digit library card ID
+        book_id: ID of the book being returned
+        return_date: Time of the return
+
+    Returns:
+        datetime: Due date of the closed loan, or None if there was no open loan
+    """
+    try:
+        with transaction() as conn:
+            record = conn.execute('''
+                SELECT id, due_date FROM borrow_records
+                WHERE patron_id = ? AND book_id = ? AND return_date IS NULL
+                ORDER BY borrow_date
+                LIMIT 1
+            ''', (patron_id, book_id)).fetchone()
+            if not record:
+                return None
+
+            conn.execute('UPDATE borrow_records SET return_date = ? WHERE id = ?',
+                         (return_date.isoformat(), record['id']))
+            conn.execute('UPDATE books SET available_copies = available_copies + 1 WHERE id = ?',
+                         (book_id,))
+            return datetime.fromisoformat(record['due_date'])
+    finally:
+        # Drop the cached row once the transaction has finished
+        invalidate_book(book_id)
+
+# Payments ledger
+
+# Recorded by a fine collection run but not submitted yet
+PAYMENT_PLANNED = 'planned'
+# A planned row whose run was abandoned; never charged, no longer counted
+PAYMENT_RELEASED = 'released'
+PAYMENT_PENDING = 'pending'
+PAYMENT_SUCCEEDED = 'succeeded'
+PAYMENT_FAILED = 'failed'
+# The call may have reached the provider but no answer arrived (timeout,
+# transport error, crash). Such a row keeps its idempotency key until it is
+# settled with resolve_payment(), so the charge is never submitted twice.
+PAYMENT_UNKNOWN = 'unknown'
+
+# A pending row not updated for this many seconds is assumed to belong to a
+# call whose outcome was never recorded, and is handed to reconciliation
+PAYMENT_PENDING_TIMEOUT = float(os.environ.get('LIBRARY_PAYMENT_PENDING_TIMEOUT', '900'))
+
+# A planned row not charged within this many seconds belongs to an abandoned
+# collection run; its fee is released so that later runs and pay_late_fees
+# can collect it
+PAYMENT_PLAN_TIMEOUT = float(os.environ.get('LIBRARY_PAYMENT_PLAN_TIMEOUT', '43200'))
+
+# Ledger entry kinds
+PAYMENT_CHARGE = 'charge'
+PAYMENT_REFUND = 'refund'
+
+def _release_abandoned_plans(conn: sqlite3.Connection):
+    """Release planned rows older than PAYMENT_PLAN_TIMEOUT (call inside a transaction)."""
+    now = datetime.now()
+    conn.execute('''
+        UPDATE payments SET status = ?, message = ?, updated_at = ?
+        WHERE status = ? AND updated_at < ?
+    ''', (PAYMENT_RELEASED, "Collection run abandoned before charging", now.isoformat(),
+          PAYMENT_PLANNED, (now - timedelta(seconds=PAYMENT_PLAN_TIMEOUT)).isoformat()))
+
+def get_outstanding_overdue_fees(as_of: datetime) -> List[Dict]:
+    """
+    Get every overdue open loan whose late fee is not yet fully collected.
+    
+    The fee owed so far is reduced by ledger amounts that were already
+    collected, are being or will be collected, or may have been collected
+    (succeeded, planned, pending or unknown).
+    
+    Args:
+        as_of: Time to assess fees at
+        
+    Returns:
+        list: Dicts with borrow_record_id, patron_id, book_id, title, days_overdue,
+              late_fee and outstanding, ordered by patron
+    """
+    days = 'CAST(ROUND((julianday(:as_of) - julianday(br.due_date)) * 86400000) AS INTEGER) / 86400000'
+    conn = get_db_connection()
+    records = conn.execute(f'''
+        WITH overdue AS (
+            SELECT br.id AS borrow_record_id, br.patron_id, br.book_id, b.title,
+                   {days} AS days_overdue
+            FROM borrow_records br
+            JOIN books b ON b.id = br.book_id
+            WHERE br.return_date IS NULL AND br.due_date < :as_of
+        ), fees AS (
+            SELECT *, {late_fee_sql('days_overdue')} AS late_fee FROM overdue
+        ), collected AS (
+            SELECT borrow_record_id, SUM(amount) AS amount
+            FROM payments
+            WHERE borrow_record_id IN (SELECT borrow_record_id FROM fees)
+              AND kind = '{PAYMENT_CHARGE}'
+              AND status IN ('{PAYMENT_PLANNED}', '{PAYMENT_PENDING}', '{PAYMENT_SUCCEEDED}',
+                             '{PAYMENT_UNKNOWN}')
+            GROUP BY borrow_record_id
+        )
+        SELECT fees.*, ROUND(fees.late_fee - COALESCE(collected.amount, 0), 2) AS outstanding
+        FROM fees
+        LEFT JOIN collected USING (borrow_record_id)
+        WHERE fees.late_fee - COALESCE(collected.amount, 0) > 0.005
+        ORDER BY fees.patron_id, fees.borrow_record_id
+    ''', {'as_of': as_of.isoformat()}).fetchall()
+    conn.close()
+    return [dict(record) for record in records]
+
+def plan_collection_run(run_id: str, as_of: datetime) -> bool:
+    """
+    Record a planned ledger entry for each loan with outstanding fees, once per run.
+    
+    The check for an existing run and the inserts share one transaction, so
+    two processes starting the same run cannot both plan it. Planned rows of
+    runs abandoned for longer than PAYMENT_PLAN_TIMEOUT are released first.
+    
+    Args:
+        run_id: Identifier of the collection run
+        as_of: Time to assess fees at
+        
+    Returns:
+        bool: False if the run had already been planned (it is being resumed)
+    """
+    with transaction() as conn:
+        _release_abandoned_plans(conn)
+        if conn.execute('SELECT 1 FROM payments WHERE run_id = ? LIMIT 1', (run_id,)).fetchone():
+            return False
+        now = datetime.now().isoformat()
+        conn.executemany('''
+            INSERT INTO payments (patron_id, book_id, borrow_record_id, amount, status,
+                                  run_id, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [
+            (loan['patron_id'], loan['book_id'], loan['borrow_record_id'], loan['outstanding'],
+             PAYMENT_PLANNED, run_id, now, now)
+            for loan in get_outstanding_overdue_fees(as_of)
+        ])
+    return True
+
+def get_run_payments(run_id: str, statuses: Tuple[str, ...] = (PAYMENT_PLANNED,)) -> List[Dict]:
+    """Get the ledger rows of a collection run that are in one of `statuses`."""
+    conn = get_db_connection()
+    records = conn.execute(f'''
+        SELECT * FROM payments
+        WHERE run_id = ? AND status IN ({', '.join('?' * len(statuses))})
+        ORDER BY patron_id, id
+    ''', (run_id, *statuses)).fetchall()
+    conn.close()
+    return [dict(record) for record in records]
+
+def claim_run_payments(payment_ids: List[int], statuses: Tuple[str, ...] = (PAYMENT_PLANNED,)) -> List[Dict]:
+    """
+    Mark the given run rows pending just before they are charged.
+    
+    Only rows still in one of `statuses` are taken, so rows another process
+    has already submitted are left alone.
+    
+    Returns:
+        list: The rows now pending for the caller to charge
+    """
+    if not payment_ids:
+        return []
+    placeholders = ', '.join('?' * len(payment_ids))
+    with transaction() as conn:
+        records = conn.execute(f'''
+            SELECT * FROM payments
+            WHERE id IN ({placeholders}) AND status IN ({', '.join('?' * len(statuses))})
+            ORDER BY id
+        ''', (*payment_ids, *statuses)).fetchall()
+        conn.executemany('''
+            UPDATE payments SET status = ?, transaction_id = NULL, message = NULL, updated_at = ?
+            WHERE id = ?
+        ''', [(PAYMENT_PENDING, datetime.now().isoformat(), record['id']) for record in records])
+    return [dict(record, status=PAYMENT_PENDING) for record in records]
+
+def update_payment_status(payment_ids: List[int], status: str, transaction_id: Optional[str] = None,
+                          message: Optional[str] = None):
+    """Set the outcome of one charge on all the ledger rows it covered."""
+    with transaction() as conn:
+        conn.executemany('''
+            UPDATE payments SET status = ?, transaction_id = ?, message = ?, updated_at = ?
+            WHERE id = ?
+        ''', [(status, transaction_id, message, datetime.now().isoformat(), payment_id)
+              for payment_id in payment_ids])
+
+def late_fee_idempotency_key(patron_id: str, book_id: int, borrow_record_id: Optional[int],
+                             days_overdue: int) -> str:
+    """
+    Build the idempotency key of a late fee charge.
+    
+    The fee period is the open loan plus the number of days overdue, so
+    repeated submissions on the same day share a key while a fee that has
+    grown since the last payment gets a new one.
+    """
+    loan = borrow_record_id if borrow_record_id is not None else '-'
+    return f"late-fee:{patron_id}:{book_id}:{loan}:{days_overdue}"
+
+STALE_PAYMENT_MESSAGE = "No outcome recorded; reconcile with the provider"
+
+def _expire_if_stale(conn: sqlite3.Connection, payment: sqlite3.Row) -> Dict:
+    """Hand a pending row whose outcome was never recorded over to reconciliation."""
+    cutoff = (datetime.now() - timedelta(seconds=PAYMENT_PENDING_TIMEOUT)).isoformat()
+    if payment['status'] == PAYMENT_PENDING and payment['updated_at'] < cutoff:
+        conn.execute('''
+            UPDATE payments SET status = ?, message = ?, updated_at = ? WHERE id = ?
+        ''', (PAYMENT_UNKNOWN, STALE_PAYMENT_MESSAGE, datetime.now().isoformat(), payment['id']))
+        payment = conn.execute('SELECT * FROM payments WHERE id = ?', (payment['id'],)).fetchone()
+    return dict(payment)
+
+def _claim_payment(conn: sqlite3.Connection, existing: Optional[sqlite3.Row], idempotency_key: str,
+                   kind: str, patron_id: str, book_id: Optional[int], borrow_record_id: Optional[int],
+                   amount: float) -> Dict:
+    """Insert a pending ledger row for a key, or reset the failed row that holds it."""
+    now = datetime.now().isoformat()
+    if existing is not None:
+        conn.execute('''
+            UPDATE payments SET status = ?, amount = ?, transaction_id = NULL, message = NULL,
+                                updated_at = ?
+            WHERE id = ?
+        ''', (PAYMENT_PENDING, amount, now, existing['id']))
+        payment_id = existing['id']
+    else:
+        payment_id = conn.execute('''
+            INSERT INTO payments (patron_id, book_id, borrow_record_id, amount, status, kind,
+                                  idempotency_key, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (patron_id, book_id, borrow_record_id, amount, PAYMENT_PENDING, kind,
+              idempotency_key, now, now)).lastrowid
+    return dict(conn.execute('SELECT * FROM payments WHERE id = ?', (payment_id,)).fetchone())
+
+def claim_late_fee_payment(patron_id: str, book_id: int, days_overdue: int,
+                           fee_amount: float) -> Tuple[Optional[Dict], bool]:
+    """
+    Reserve the ledger entry for a late fee charge before calling the gateway.
+    
+    Runs in one transaction: finds the open loan, derives the idempotency key
+    and either returns the entry already recorded under that key or records a
+    pending charge for the part of the fee not yet claimed by earlier payments.
+    An entry is only claimed again once it has failed: a pending or unknown
+    one may already have been charged.
+    
+    Args:
+        patron_id: 6-digit library card ID
+        book_id: ID of the book with late fees
+        days_overdue: Days overdue the fee was assessed for
+        fee_amount: Late fee owed for the loan
+        
+    Returns:
+        tuple: (payment dict or None if nothing is left to charge (a planned
+                run entry if a collection run will charge it),
+                created: True if the caller must submit the charge)
+    """
+    with transaction() as conn:
+        _release_abandoned_plans(conn)
+        loan = conn.execute('''
+            SELECT id FROM borrow_records
+            WHERE patron_id = ? AND book_id = ? AND return_date IS NULL
+            ORDER BY borrow_date
+            LIMIT 1
+        ''', (patron_id, book_id)).fetchone()
+        borrow_record_id = loan['id'] if loan else None
+        key = late_fee_idempotency_key(patron_id, book_id, borrow_record_id, days_overdue)
+        
+        existing = conn.execute('SELECT * FROM payments WHERE idempotency_key = ?', (key,)).fetchone()
+        if existing is not None and existing['status'] != PAYMENT_FAILED:
+            return _expire_if_stale(conn, existing), False
+        
+        claimed = 0.0
+        if borrow_record_id is not None:
+            claimed = conn.execute('''
+                SELECT COALESCE(SUM(amount), 0) FROM payments
+                WHERE borrow_record_id = ? AND kind = ? AND status IN (?, ?, ?, ?)
+            ''', (borrow_record_id, PAYMENT_CHARGE, PAYMENT_PLANNED, PAYMENT_PENDING,
+                  PAYMENT_SUCCEEDED, PAYMENT_UNKNOWN)).fetchone()[0]
+        amount = round(fee_amount - claimed, 2)
+        if amount <= 0:
+            # The fee may be covered by a collection run that has yet to charge it
+            planned = conn.execute('''
+                SELECT * FROM payments WHERE borrow_record_id = ? AND status = ?
+                ORDER BY id LIMIT 1
+            ''', (borrow_record_id, PAYMENT_PLANNED)).fetchone()
+            return (dict(planned) if planned else None), False
+        
+        return _claim_payment(conn, existing, key, PAYMENT_CHARGE, patron_id, book_id,
+                              borrow_record_id, amount), True
+
+def claim_refund(transaction_id: str, amount: float) -> Tuple[Dict, bool]:
+    """
+    Reserve the ledger entry for refunding a charge (one refund per transaction).
+    
+    The key holds no amount: a repeat with another amount gets the recorded
+    entry back, and the caller must reject it.
+    
+    Returns:
+        tuple: (payment dict, created: True if the caller must submit the refund)
+    """
+    key = f"refund:{transaction_id}"
+    with transaction() as conn:
+        existing = conn.execute('SELECT * FROM payments WHERE idempotency_key = ?', (key,)).fetchone()
+        if existing is not None and existing['status'] != PAYMENT_FAILED:
+            return _expire_if_stale(conn, existing), False
+        
+        charge = conn.execute('''
+            SELECT patron_id, book_id, borrow_record_id FROM payments
+            WHERE transaction_id = ? AND kind = ?
+        ''', (transaction_id, PAYMENT_CHARGE)).fetchone()
+        patron_id, book_id, borrow_record_id = tuple(charge) if charge else ('', None, None)
+        return _claim_payment(conn, existing, key, PAYMENT_REFUND, patron_id, book_id,
+                              borrow_record_id, amount), True
+
+def get_payments_to_reconcile() -> List[Dict]:
+    """
+    Get the ledger entries whose outcome must be checked with the provider.
+    
+    Pending entries older than PAYMENT_PENDING_TIMEOUT (left behind by a
+    crash between the gateway call and recording its result) are marked
+    unknown first.
+    
+    Returns:
+        list: Ledger rows in status unknown, oldest first
+    """
+    now = datetime.now()
+    cutoff = (now - timedelta(seconds=PAYMENT_PENDING_TIMEOUT)).isoformat()
+    with transaction() as conn:
+        conn.execute('''
+            UPDATE payments SET status = ?, message = ?, updated_at = ?
+            WHERE status = ? AND updated_at < ?
+        ''', (PAYMENT_UNKNOWN, STALE_PAYMENT_MESSAGE, now.isoformat(), PAYMENT_PENDING, cutoff))
+        records = conn.execute('''
+            SELECT * FROM payments WHERE status = ? ORDER BY updated_at, id
+        ''', (PAYMENT_UNKNOWN,)).fetchall()
+    return [dict(record) for record in records]
+
+def resolve_payment(payment_id: int, status: str, transaction_id: Optional[str] = None,
+                    message: Optional[str] = None) -> bool:
+    """
+    Record the outcome of an unknown ledger entry once checked with the provider.
+    
+    Args:
+        payment_id: ID of the ledger entry
+        status: PAYMENT_SUCCEEDED or PAYMENT_FAILED
+        transaction_id: Provider transaction of a succeeded charge
+        message: Note kept with the entry
+        
+    Returns:
+        bool: False if the entry does not exist or is not unknown
+    """
+    if status not in (PAYMENT_SUCCEEDED, PAYMENT_FAILED):
+        raise ValueError(f"A payment can only be resolved as '{PAYMENT_SUCCEEDED}' or '{PAYMENT_FAILED}'")
+    with transaction() as conn:
+        cursor = conn.execute('''
+            UPDATE payments SET status = ?, transaction_id = COALESCE(?, transaction_id),
+                                message = ?, updated_at = ?
+            WHERE id = ? AND status = ?
+        ''', (status, transaction_id, message, datetime.now().isoformat(), payment_id, PAYMENT_UNKNOWN))
+    return cursor.rowcount == 1
+
+def get_payments_for_reconciliation(since: datetime, until: Optional[datetime] = None) -> List[Dict]:
+    """
+    Get every ledger entry recorded in a time window, oldest first.
+    
+    Args:
+        since: Start of the window (inclusive)
+        until: End of the window (exclusive, default open-ended)
+        
+    Returns:
+        list: Ledger rows (charges and refunds, any status)
+    """
+    conn = get_db_connection()
+    records = conn.execute('''
+        SELECT * FROM payments
+        WHERE created_at >= ? AND created_at < COALESCE(?, '9999')
+        ORDER BY created_at, id
+    ''', (since.isoformat(), until.isoformat() if until else None)).fetchall()
+    conn.close()
+    return [dict(record) for record in records]
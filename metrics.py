@@ -0,0 +1,363 @@
+"""
+Metrics Module for Library Management System
+Prometheus text exposition of request, database, payment gateway and cache metrics
+
+Every process keeps its own counters and histograms. With
+LIBRARY_METRICS_DIR set (needed when serving with several gunicorn
+workers), each process also writes a snapshot of its metrics to
+<dir>/metrics-<pid>.json, about once per LIBRARY_METRICS_FLUSH_INTERVAL
+seconds while it is busy and again at exit. GET /metrics on any worker
+adds up the snapshots of all processes, so no central collector is
+needed. So that counters never go backwards, an exiting gunicorn worker
+folds its metrics, and the snapshots of workers that died without doing
+so, into <dir>/metrics-exited.json (retire_snapshot). The gunicorn master
+clears the directory when it starts.
+"""
+
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: no pre-forked workers sharing METRICS_DIR
+    fcntl = None
+
+import database
+from routes.catalog_routes import row_cache
+from services.library_service import payment_breaker
+from services.resilient_gateway import LatencyHistogram
+
+METRICS_DIR = os.environ.get('LIBRARY_METRICS_DIR') or None
+FLUSH_INTERVAL = float(os.environ.get('LIBRARY_METRICS_FLUSH_INTERVAL', '1.0'))
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Summed metrics of exited processes, next to the per-process snapshots
+EXITED_SNAPSHOT = 'metrics-exited.json'
+
+REQUEST_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+
+# name -> (type, help), in exposition order
+FAMILIES: Dict[str, Tuple[str, str]] = {
+    'library_http_requests_total':
+        ('counter', 'HTTP requests by blueprint, endpoint, method and status.'),
+    'library_http_request_duration_seconds':
+        ('histogram', 'Time to handle an HTTP request.'),
+    'library_db_queries_per_request':
+        ('histogram', 'SQL statements run per HTTP request (recorded while LIBRARY_QUERY_STATS=1).'),
+    'library_payment_gateway_call_duration_seconds':
+        ('histogram', 'Duration of payment provider calls, including failed ones.'),
+    'library_payment_gateway_errors_total':
+        ('counter', 'Payment provider calls that raised or timed out.'),
+    'library_payment_gateway_rejected_total':
+        ('counter', 'Payment provider calls rejected because the circuit was open.'),
+    'library_payment_gateway_circuit_opened_total':
+        ('counter', 'Times the payment provider circuit breaker opened.'),
+    'library_cache_hits_total':
+        ('counter', 'Cache lookups answered from the cache.'),
+    'library_cache_misses_total':
+        ('counter', 'Cache lookups that missed (absent or expired).'),
+    'library_cache_evictions_total':
+        ('counter', 'Entries evicted to make room.'),
+}
+
+_lock = threading.Lock()
+_requests: Dict[Tuple[str, str, str, int], int] = {}
+_request_latency: Dict[Tuple[str, str], LatencyHistogram] = {}
+_db_queries: Dict[Tuple[str, str], LatencyHistogram] = {}
+_observations = 0
+
+
+def observe_request(blueprint: str, endpoint: str, method: str, status: int, seconds: float,
+                    queries: Optional[int] = None):
+    """Record one handled request (queries: statements it ran, if counted)."""
+    global _observations
+    key = (blueprint, endpoint)
+    with _lock:
+        request_key = (blueprint, endpoint, method, status)
+        _requests[request_key] = _requests.get(request_key, 0) + 1
+        latency = _request_latency.get(key)
+        if latency is None:
+            latency = _request_latency[key] = LatencyHistogram(REQUEST_LATENCY_BUCKETS)
+        if queries is not None:
+            query_counts = _db_queries.get(key)
+            if query_counts is None:
+                query_counts = _db_queries[key] = LatencyHistogram(QUERY_COUNT_BUCKETS)
+        _observations += 1
+    latency.observe(seconds)
+    if queries is not None:
+        query_counts.observe(queries)
+    _ensure_flusher()
+
+
+def reset():
+    """Forget this process's request metrics."""
+    with _lock:
+        _requests.clear()
+        _request_latency.clear()
+        _db_queries.clear()
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels) -> str:
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def _add_histogram(samples: Dict[str, float], family: str, snapshot: Dict, **labels):
+    for bound, count in snapshot['buckets'].items():
+        samples[f'{family}_bucket{_labels(**labels, le=bound)}'] = count
+    samples[f'{family}_sum{_labels(**labels)}'] = snapshot['sum']
+    samples[f'{family}_count{_labels(**labels)}'] = snapshot['count']
+
+
+def collect() -> Dict[str, Dict[str, float]]:
+    """
+    Snapshot this process's metrics.
+
+    Returns:
+        dict: family name -> {sample line without value: value}
+    """
+    metrics = {family: {} for family in FAMILIES}
+    with _lock:
+        requests = list(_requests.items())
+        latencies = list(_request_latency.items())
+        query_counts = list(_db_queries.items())
+
+    samples = metrics['library_http_requests_total']
+    for (blueprint, endpoint, method, status), count in requests:
+        samples['library_http_requests_total' + _labels(
+            blueprint=blueprint, endpoint=endpoint, method=method, status=status)] = count
+    for (blueprint, endpoint), histogram in latencies:
+        _add_histogram(metrics['library_http_request_duration_seconds'], 'library_http_request_duration_seconds',
+                       histogram.snapshot(), blueprint=blueprint, endpoint=endpoint)
+    for (blueprint, endpoint), histogram in query_counts:
+        _add_histogram(metrics['library_db_queries_per_request'], 'library_db_queries_per_request',
+                       histogram.snapshot(), blueprint=blueprint, endpoint=endpoint)
+
+    gateway = payment_breaker.stats()
+    for method, snapshot in gateway['latency'].items():
+        _add_histogram(metrics['library_payment_gateway_call_duration_seconds'],
+                       'library_payment_gateway_call_duration_seconds', snapshot, method=method)
+    for method, count in gateway['errors'].items():
+        metrics['library_payment_gateway_errors_total'][
+            'library_payment_gateway_errors_total' + _labels(method=method)] = count
+    metrics['library_payment_gateway_rejected_total']['library_payment_gateway_rejected_total'] = gateway['rejected']
+    metrics['library_payment_gateway_circuit_opened_total'][
+        'library_payment_gateway_circuit_opened_total'] = gateway['times_opened']
+
+    for cache, stats in (('books', database.get_book_cache_stats()), ('catalog_rows', row_cache.stats())):
+        for counter in ('hits', 'misses', 'evictions'):
+            family = f'library_cache_{counter}_total'
+            metrics[family][family + _labels(cache=cache)] = stats[counter]
+    return metrics
+
+
+def _merge(snapshots: List[Dict[str, Dict[str, float]]]) -> Dict[str, Dict[str, float]]:
+    merged: Dict[str, Dict[str, float]] = {}
+    for snapshot in snapshots:
+        for family, samples in snapshot.items():
+            target = merged.setdefault(family, {})
+            for sample, value in samples.items():
+                target[sample] = target.get(sample, 0) + value
+    return merged
+
+
+def render(snapshots: List[Dict[str, Dict[str, float]]]) -> str:
+    """Sum snapshots (of one or more processes) into the text exposition format."""
+    merged = _merge(snapshots)
+
+    lines = []
+    for family, (kind, description) in FAMILIES.items():
+        lines.append(f'# HELP {family} {description}')
+        lines.append(f'# TYPE {family} {kind}')
+        for sample, value in merged.get(family, {}).items():
+            lines.append(f'{sample} {round(value, 6) if isinstance(value, float) else value}')
+    return '\n'.join(lines) + '\n'
+
+
+def _snapshot_path(pid: Optional[int] = None) -> str:
+    return os.path.join(METRICS_DIR, f'metrics-{pid or os.getpid()}.json')
+
+
+def _write_json(path: str, data):
+    tmp_path = f'{path}.{threading.get_ident()}.tmp'
+    with open(tmp_path, 'w') as handle:
+        json.dump(data, handle)
+    os.replace(tmp_path, path)
+
+
+def _load_snapshot(path: str) -> Optional[Dict[str, Dict[str, float]]]:
+    try:
+        with open(path) as handle:
+            return json.load(handle)
+    except (OSError, ValueError):
+        return None  # Removed or unreadable; skip it
+
+
+@contextmanager
+def _dir_lock(exclusive: bool = False) -> Iterator[None]:
+    """Keep readers of METRICS_DIR from seeing a snapshot both folded and not yet removed."""
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    fd = os.open(METRICS_DIR, os.O_RDONLY)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        yield
+    finally:
+        os.close(fd)
+
+
+_snapshot_lock = threading.Lock()
+_retired = False
+
+
+def write_snapshot():
+    """Write this process's snapshot to METRICS_DIR (atomically replacing the last one)."""
+    if not METRICS_DIR:
+        return
+    with _snapshot_lock:
+        if not _retired:
+            _write_json(_snapshot_path(), collect())
+
+
+def read_snapshots() -> List[Dict[str, Dict[str, float]]]:
+    """Load the snapshots of every process that wrote one to METRICS_DIR, and of exited ones."""
+    with _dir_lock():
+        snapshots = [_load_snapshot(path) for path in sorted(glob.glob(os.path.join(METRICS_DIR, 'metrics-*.json')))]
+    return [snapshot for snapshot in snapshots if snapshot is not None]
+
+
+def _is_running(pid: int) -> bool:
+    if os.name != 'posix':
+        return True  # os.kill(pid, 0) is no liveness check on Windows
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass  # e.g. EPERM: alive, owned by someone else
+    return True
+
+
+def retire_snapshot():
+    """
+    Fold this process's metrics into METRICS_DIR/metrics-exited.json and
+    stop writing its own snapshot; call it as a worker exits. Snapshots of
+    processes that are no longer running (e.g. workers killed on timeout)
+    are folded in too, so the directory holds one file per live worker
+    plus the total of all exited ones.
+    """
+    global _retired
+    if not METRICS_DIR:
+        return
+    with _snapshot_lock:
+        _retired = True
+    own_path = _snapshot_path()
+    snapshots, folded = [collect()], [own_path]
+    with _dir_lock(exclusive=True):
+        for path in glob.glob(os.path.join(METRICS_DIR, 'metrics-*.json')):
+            pid = os.path.basename(path)[len('metrics-'):-len('.json')]
+            if path != own_path and pid.isdigit() and not _is_running(int(pid)):
+                snapshots.append(_load_snapshot(path) or {})
+                folded.append(path)
+        exited_path = os.path.join(METRICS_DIR, EXITED_SNAPSHOT)
+        snapshots.append(_load_snapshot(exited_path) or {})
+        _write_json(exited_path, _merge(snapshots))
+        for path in folded:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def clear_metrics_dir():
+    """Remove all snapshots, e.g. when the server (re)starts."""
+    if not METRICS_DIR:
+        return
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    for path in glob.glob(os.path.join(METRICS_DIR, 'metrics-*.json*')):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def render_metrics() -> str:
+    """Exposition for GET /metrics: all processes with METRICS_DIR, else this one."""
+    if not METRICS_DIR:
+        return render([collect()])
+    write_snapshot()
+    return render(read_snapshots())
+
+
+_flusher_pid = None
+_flusher_lock = threading.Lock()
+
+
+def _flush_periodically():
+    written = None
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        if _observations != written:
+            written = _observations
+            try:
+                write_snapshot()
+            except OSError:
+                pass
+
+
+def _ensure_flusher():
+    """Start this process's snapshot writer thread (once per process, also after fork)."""
+    global _flusher_pid
+    if not METRICS_DIR or _flusher_pid == os.getpid():
+        return
+    with _flusher_lock:
+        if _flusher_pid != os.getpid():
+            _flusher_pid = os.getpid()
+            os.makedirs(METRICS_DIR, exist_ok=True)
+            threading.Thread(target=_flush_periodically, name='metrics-flush', daemon=True).start()
+
+
+@atexit.register
+def _write_final_snapshot():
+    if METRICS_DIR and _flusher_pid == os.getpid():
+        try:
+            write_snapshot()
+        except OSError:
+            pass
+
+
+def register_metrics(app):
+    """Record every request handled by `app` and serve GET /metrics."""
+    from flask import Response, g, request
+
+    @app.before_request
+    def _start_request_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _observe_request(response):
+        started = g.pop('metrics_started', None)
+        if started is not None:
+            stats = g.get('query_stats')
+            observe_request(request.blueprint or 'app', request.endpoint or 'unmatched', request.method,
+                            response.status_code, time.perf_counter() - started,
+                            stats.queries if stats is not None else None)
+        return response
+
+    def metrics_view():
+        return Response(render_metrics(), content_type=CONTENT_TYPE)
+
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
@@ -0,0 +1,240 @@
+"""
+Profiling Module for Library Management System
+Opt-in profiling of single requests, saved as pstats or collapsed stacks
+
+A request is profiled when it carries `X-Profile: <admin token>` (with an
+optional `X-Profile-Mode: cprofile|sample`), or at random with probability
+PROFILE_SAMPLE_RATE. Two profilers are available:
+
+- cprofile: deterministic, every call is timed (cProfile); saved as a
+  .pstats file for `python -m pstats`, snakeviz or gprof2dot. Slows the
+  profiled request down noticeably.
+- sample: a helper thread records the request thread's stack every
+  PROFILE_INTERVAL seconds; saved as collapsed stacks (.collapsed), the
+  input format of flamegraph.pl and speedscope. Cheap enough for random
+  sampling in production.
+
+Each profile is stored in PROFILE_DIR next to a JSON file with its request
+metadata; only the newest PROFILE_KEEP are kept. Admins list and download
+them from /admin/profiles (see routes/admin_routes.py).
+
+Nothing is installed on the app unless an admin token or a sample rate is
+configured.
+"""
+
+import cProfile
+import hmac
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional
+
+ADMIN_TOKEN = os.environ.get('LIBRARY_ADMIN_TOKEN') or None
+PROFILE_SAMPLE_RATE = float(os.environ.get('LIBRARY_PROFILE_SAMPLE_RATE', '0'))
+PROFILE_MODE = os.environ.get('LIBRARY_PROFILE_MODE', 'sample')
+PROFILE_DIR = os.environ.get('LIBRARY_PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'library-profiles'))
+PROFILE_KEEP = int(os.environ.get('LIBRARY_PROFILE_KEEP', '100'))
+PROFILE_INTERVAL = float(os.environ.get('LIBRARY_PROFILE_INTERVAL', '0.005'))
+
+PROFILE_MODES = {'cprofile': 'pstats', 'sample': 'collapsed'}
+
+_PROFILE_ID = re.compile(r'^[0-9]{8}T[0-9]{6}-[0-9a-f]{8}$')
+
+
+def is_admin_token(token: Optional[str], admin_token: Optional[str]) -> bool:
+    """Compare a presented token with the configured admin token (none configured: never)."""
+    if not admin_token or not token:
+        return False
+    return hmac.compare_digest(token.encode(), admin_token.encode())
+
+
+def is_profile_id(profile_id: str) -> bool:
+    """Whether a string has the form of a profile id (safe to use in a path)."""
+    return bool(_PROFILE_ID.match(profile_id))
+
+
+class StackSampler:
+    """
+    Samples the stack of one thread at a fixed interval from a helper thread.
+
+    Stacks are kept root-first as 'function (file:line)' frames joined by
+    ';', counted per distinct stack.
+    """
+
+    def __init__(self, thread_id: int, interval: float = PROFILE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    @staticmethod
+    def _format(frame) -> str:
+        frames = []
+        while frame is not None:
+            code = frame.f_code
+            frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        return ';'.join(reversed(frames))
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[self._format(frame)] += 1
+            del frame
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+    def collapsed(self) -> str:
+        """The samples in collapsed-stack format ('stack count' per line)."""
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+class RequestProfiler:
+    """Profiles the calling thread between start() and stop() with the given mode."""
+
+    def __init__(self, mode: str):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode '{mode}'. Choose one of: {', '.join(PROFILE_MODES)}")
+        self.mode = mode
+        self._profiler = None
+
+    def start(self):
+        if self.mode == 'cprofile':
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        else:
+            self._profiler = StackSampler(threading.get_ident())
+            self._profiler.start()
+
+    def stop(self):
+        if self.mode == 'cprofile':
+            self._profiler.disable()
+        else:
+            self._profiler.stop()
+
+    def save(self, path: str):
+        if self.mode == 'cprofile':
+            self._profiler.dump_stats(path)
+        else:
+            with open(path, 'w') as handle:
+                handle.write(self._profiler.collapsed())
+
+
+def save_profile(profiler: RequestProfiler, profile_dir: str, metadata: Dict, keep: int = PROFILE_KEEP) -> str:
+    """
+    Write a finished profile and its metadata to profile_dir.
+
+    Returns:
+        str: The profile id
+    """
+    os.makedirs(profile_dir, exist_ok=True)
+    profile_id = f"{datetime.now().strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    filename = f'{profile_id}.{PROFILE_MODES[profiler.mode]}'
+    profiler.save(os.path.join(profile_dir, filename))
+    metadata = dict(metadata, id=profile_id, file=filename, mode=profiler.mode, pid=os.getpid(),
+                    created=datetime.now().isoformat(timespec='seconds'))
+    # Metadata last: a profile is listed only once its data file is complete
+    tmp_path = os.path.join(profile_dir, f'{profile_id}.json.tmp')
+    with open(tmp_path, 'w') as handle:
+        json.dump(metadata, handle)
+    os.replace(tmp_path, os.path.join(profile_dir, f'{profile_id}.json'))
+    _prune(profile_dir, keep)
+    return profile_id
+
+
+def list_profiles(profile_dir: str, limit: Optional[int] = None) -> List[Dict]:
+    """Metadata of the saved profiles, newest first."""
+    if not os.path.isdir(profile_dir):
+        return []
+    profiles = []
+    for name in sorted(os.listdir(profile_dir), reverse=True):
+        if not name.endswith('.json') or not is_profile_id(name[:-len('.json')]):
+            continue
+        try:
+            with open(os.path.join(profile_dir, name)) as handle:
+                profiles.append(json.load(handle))
+        except (OSError, ValueError):
+            continue  # Pruned by another worker meanwhile
+        if limit is not None and len(profiles) >= limit:
+            break
+    return profiles
+
+
+def _prune(profile_dir: str, keep: int):
+    for metadata in list_profiles(profile_dir)[keep:]:
+        for name in (metadata['file'], f"{metadata['id']}.json"):
+            try:
+                os.remove(os.path.join(profile_dir, name))
+            except OSError:
+                pass
+
+
+def register_profiling(app):
+    """
+    Profile requests of `app` on demand (header) or at the configured sample rate.
+
+    Reads ADMIN_TOKEN, PROFILE_SAMPLE_RATE, PROFILE_MODE, PROFILE_DIR and
+    PROFILE_KEEP from app.config. Profiled responses carry X-Profile-Id.
+    """
+    from flask import g, request
+
+    @app.before_request
+    def _start_profiling():
+        config = app.config
+        if is_admin_token(request.headers.get('X-Profile'), config['ADMIN_TOKEN']):
+            trigger = 'header'
+            mode = request.headers.get('X-Profile-Mode', config['PROFILE_MODE'])
+        elif config['PROFILE_SAMPLE_RATE'] and random.random() < config['PROFILE_SAMPLE_RATE']:
+            trigger = 'sample_rate'
+            mode = config['PROFILE_MODE']
+        else:
+            return
+        try:
+            profiler = RequestProfiler(mode)
+            profiler.start()
+        except ValueError as e:
+            # Unknown mode, or another profiler is already active (Python 3.12+)
+            app.logger.warning(f"Request not profiled: {e}")
+            return
+        g.profile = (profiler, trigger, time.perf_counter())
+
+    @app.after_request
+    def _save_profile(response):
+        profile = g.pop('profile', None)
+        if profile is None:
+            return response
+        profiler, trigger, started = profile
+        profiler.stop()
+        profile_id = save_profile(profiler, app.config['PROFILE_DIR'], {
+            'method': request.method,
+            'path': request.full_path.rstrip('?'),
+            'endpoint': request.endpoint,
+            'status': response.status_code,
+            'duration_ms': round((time.perf_counter() - started) * 1000, 3),
+            'trigger': trigger,
+        }, keep=app.config['PROFILE_KEEP'])
+        response.headers['X-Profile-Id'] = profile_id
+        return response
+
+    @app.teardown_request
+    def _discard_profile(exc):
+        # Only left over when the response was never finalized
+        profile = g.pop('profile', None)
+        if profile is not None:
+            profile[0].stop()
@@ -0,0 +1,276 @@
+"""
+Query Statistics Module for Library Management System
+Per-statement timing of SQLite queries, per-request aggregation and a slow-query log
+
+When enabled, pooled connections are opened as database.InstrumentedConnection,
+whose cursors time every statement from execute() until its rows have been
+fetched. Each finished statement is added to the collector of the current
+request (if any) and to process-wide totals keyed by its normalized SQL, and
+is written to the slow-query log when it took at least SLOW_QUERY_MS.
+
+When disabled, connections are plain PooledConnections and nothing here runs.
+"""
+
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+# Settings (overridable through the environment; change at runtime with
+# database.configure_query_stats so the connection pool is rebuilt)
+ENABLED = os.environ.get('LIBRARY_QUERY_STATS', '0') == '1'
+SLOW_QUERY_MS = float(os.environ.get('LIBRARY_SLOW_QUERY_MS', '100'))
+SLOW_QUERY_EXPLAIN = os.environ.get('LIBRARY_SLOW_QUERY_EXPLAIN', '0') == '1'
+
+# Statements slower than SLOW_QUERY_MS are logged here as warnings. Set
+# LIBRARY_SLOW_QUERY_LOG to a path to also write them to a file.
+slow_query_logger = logging.getLogger('library.slow_query')
+if os.environ.get('LIBRARY_SLOW_QUERY_LOG'):
+    _handler = logging.FileHandler(os.environ['LIBRARY_SLOW_QUERY_LOG'])
+    _handler.setFormatter(logging.Formatter('%(asctime)s %(process)d %(message)s'))
+    slow_query_logger.addHandler(_handler)
+
+# Per-request summaries are logged at DEBUG level
+request_logger = logging.getLogger('library.query_stats')
+
+# Upper bound on distinct statements kept in the process-wide totals
+MAX_STATEMENTS = 1000
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+
+
+@lru_cache(maxsize=1024)
+def normalize_sql(sql: str) -> str:
+    """
+    Reduce a statement to its shape: literals become ?, lists of
+    placeholders become (?...) and whitespace is collapsed.
+    """
+    sql = _STRING_LITERAL.sub('?', sql)
+    sql = _NUMBER_LITERAL.sub('?', sql)
+    sql = _PLACEHOLDER_LIST.sub('(?...)', sql)
+    return _WHITESPACE.sub(' ', sql).strip()
+
+
+class QueryStats:
+    """Aggregate of the statements run while collecting (one request)."""
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+        self.rows = 0
+        self.statements: Dict[str, List] = {}  # normalized sql -> [count, seconds, rows]
+
+    def add(self, sql: str, seconds: float, rows: int):
+        self.queries += 1
+        self.seconds += seconds
+        self.rows += rows
+        entry = self.statements.get(sql)
+        if entry is None:
+            self.statements[sql] = [1, seconds, rows]
+        else:
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] += rows
+
+    def summary(self, top: Optional[int] = None) -> Dict:
+        """Totals plus the statements ordered by time spent, slowest first."""
+        statements = sorted(self.statements.items(), key=lambda item: item[1][1], reverse=True)
+        return {
+            'queries': self.queries,
+            'ms': round(self.seconds * 1000, 3),
+            'rows': self.rows,
+            'statements': [
+                {'sql': sql, 'count': count, 'ms': round(seconds * 1000, 3), 'rows': rows}
+                for sql, (count, seconds, rows) in statements[:top]
+            ],
+        }
+
+
+_local = threading.local()
+_totals = QueryStats()
+_totals_lock = threading.Lock()
+
+
+def start_collecting() -> QueryStats:
+    """Start aggregating the calling thread's statements (e.g. for one request)."""
+    _local.stats = QueryStats()
+    return _local.stats
+
+
+def current_stats() -> Optional[QueryStats]:
+    """The calling thread's collector, or None when not collecting."""
+    return getattr(_local, 'stats', None)
+
+
+def stop_collecting() -> Optional[QueryStats]:
+    """Stop collecting on the calling thread and return what was collected."""
+    stats = getattr(_local, 'stats', None)
+    _local.stats = None
+    return stats
+
+
+def get_statement_totals(top: Optional[int] = 20) -> Dict:
+    """Process-wide totals per normalized statement since start (or the last reset)."""
+    with _totals_lock:
+        return _totals.summary(top)
+
+
+def reset_statement_totals():
+    global _totals
+    with _totals_lock:
+        _totals = QueryStats()
+
+
+def _explain(conn: sqlite3.Connection, sql: str, parameters) -> List[str]:
+    # Base-class execute: the EXPLAIN itself is not timed or logged
+    try:
+        rows = sqlite3.Connection.execute(conn, 'EXPLAIN QUERY PLAN ' + sql, parameters).fetchall()
+    except sqlite3.Error as e:
+        return [f'(no plan: {e})']
+    return [row[3] for row in rows]
+
+
+def record(conn: sqlite3.Connection, sql: str, parameters, seconds: float, rows: int):
+    """Account for one finished statement."""
+    normalized = normalize_sql(sql)
+    stats = getattr(_local, 'stats', None)
+    if stats is not None:
+        stats.add(normalized, seconds, rows)
+    with _totals_lock:
+        if normalized in _totals.statements or len(_totals.statements) < MAX_STATEMENTS:
+            _totals.add(normalized, seconds, rows)
+
+    if seconds * 1000 >= SLOW_QUERY_MS:
+        message = f'slow query {seconds * 1000:.1f} ms, {rows} rows: {normalized}'
+        if SLOW_QUERY_EXPLAIN and parameters is not None:
+            message += ''.join(f'\n    {line}' for line in _explain(conn, sql, parameters))
+        slow_query_logger.warning(message)
+
+
+class TimedCursor(sqlite3.Cursor):
+    """
+    Cursor that times a statement from execute() until its rows are consumed.
+
+    The statement is recorded once it is finished: all rows were fetched,
+    the cursor is reused or closed, or the cursor is garbage collected
+    (e.g. after conn.execute(...).fetchone()).
+    """
+
+    _sql = None
+
+    def _begin(self, sql: str, parameters, seconds: float):
+        self._sql = sql
+        self._parameters = parameters
+        self._seconds = seconds
+        self._rows = 0
+
+    def _finish(self):
+        sql, self._sql = self._sql, None
+        if sql is not None:
+            rows = self._rows + max(self.rowcount, 0)
+            record(self.connection, sql, self._parameters, self._seconds, rows)
+
+    def execute(self, sql, parameters=()):
+        self._finish()
+        started = time.perf_counter()
+        super().execute(sql, parameters)
+        self._begin(sql, parameters, time.perf_counter() - started)
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        self._finish()
+        started = time.perf_counter()
+        super().executemany(sql, seq_of_parameters)
+        self._begin(sql, None, time.perf_counter() - started)
+        return self
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        if self._sql is not None:
+            self._seconds += time.perf_counter() - started
+            if row is None:
+                self._finish()
+            else:
+                self._rows += 1
+        return row
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        started = time.perf_counter()
+        rows = super().fetchmany(size)
+        if self._sql is not None:
+            self._seconds += time.perf_counter() - started
+            self._rows += len(rows)
+            if len(rows) < size:
+                self._finish()
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        if self._sql is not None:
+            self._seconds += time.perf_counter() - started
+            self._rows += len(rows)
+            self._finish()
+        return rows
+
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            if self._sql is not None:
+                self._seconds += time.perf_counter() - started
+                self._finish()
+            raise
+        if self._sql is not None:
+            self._seconds += time.perf_counter() - started
+            self._rows += 1
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        try:
+            self._finish()
+        except Exception:
+            pass
+
+
+def register_query_stats(app):
+    """
+    Collect the statements of every request handled by `app`.
+
+    The request's totals are sent back in a Server-Timing header
+    (db;dur=<ms>;desc="<n> queries") and logged at DEBUG level on
+    'library.query_stats' with its most expensive statements.
+    """
+    from flask import g, request
+
+    @app.before_request
+    def _start_query_stats():
+        g.query_stats = start_collecting()
+
+    @app.after_request
+    def _report_query_stats(response):
+        stats = current_stats()
+        if stats is not None:
+            response.headers.add('Server-Timing',
+                                 f'db;dur={stats.seconds * 1000:.2f};desc="{stats.queries} queries"')
+            if request_logger.isEnabledFor(logging.DEBUG):
+                request_logger.debug('%s %s %s', request.method, request.path, stats.summary(top=5))
+        return response
+
+    @app.teardown_request
+    def _stop_query_stats(exc):
+        stop_collecting()
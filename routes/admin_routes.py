@@ -0,0 +1,91 @@
+"""
+Admin Routes - Operator endpoints (profiles, statistics), guarded by the admin token
+
+Disabled (404) unless ADMIN_TOKEN / LIBRARY_ADMIN_TOKEN is set; requests
+must send `Authorization: Bearer <token>`.
+"""
+
+import os
+from functools import wraps
+
+from flask import Blueprint, abort, current_app, jsonify, request, send_from_directory
+from database import get_book_cache_stats
+from profiling import is_admin_token, is_profile_id, list_profiles
+from query_stats import get_statement_totals
+from routes.catalog_routes import get_row_cache_stats
+from services.library_service import payment_breaker
+
+admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
+
+
+def admin_required(view):
+    """Decorator rejecting requests without the admin bearer token."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        admin_token = current_app.config.get('ADMIN_TOKEN')
+        if not admin_token:
+            abort(404)
+        scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+        if scheme.lower() != 'bearer' or not is_admin_token(token.strip(), admin_token):
+            return jsonify({'error': 'Admin token required'}), 401, {'WWW-Authenticate': 'Bearer'}
+        return view(*args, **kwargs)
+    return wrapper
+
+
+@admin_bp.route('/profiles')
+@admin_required
+def profiles():
+    """
+    List recently saved request profiles (newest first, ?limit=, default 50)
+    with the method, path, status and duration of the profiled request.
+    """
+    limit = request.args.get('limit', 50, type=int)
+    return jsonify({'profiles': list_profiles(current_app.config['PROFILE_DIR'], limit)})
+
+
+@admin_bp.route('/profiles/<profile_id>')
+@admin_required
+def download_profile(profile_id):
+    """Download the data file (.pstats or .collapsed) of one profile."""
+    if not is_profile_id(profile_id):
+        abort(404)
+    profile_dir = current_app.config['PROFILE_DIR']
+    for name in (f'{profile_id}.pstats', f'{profile_id}.collapsed'):
+        if os.path.exists(os.path.join(profile_dir, name)):
+            return send_from_directory(profile_dir, name, as_attachment=True)
+    abort(404)
+
+
+@admin_bp.route('/payments/gateway')
+@admin_required
+def payment_gateway_status():
+    """
+    Report the payment provider circuit breaker: state, counters and
+    per-method latency histograms of the default gateway.
+    """
+    return jsonify(payment_breaker.stats())
+
+
+@admin_bp.route('/cache/stats')
+@admin_required
+def cache_stats():
+    """
+    Report size and hit rate of the in-process caches: book rows and
+    rendered catalog rows.
+    """
+    return jsonify({
+        'books': get_book_cache_stats(),
+        'catalog_rows': get_row_cache_stats(),
+    })
+
+
+@admin_bp.route('/db/queries')
+@admin_required
+def db_query_stats():
+    """
+    Report the most expensive SQL statements of this process (normalized,
+    with call count, total time and rows). Empty unless query statistics
+    are enabled (LIBRARY_QUERY_STATS=1).
+    """
+    top = request.args.get('top', 20, type=int)
+    return jsonify(get_statement_totals(top))
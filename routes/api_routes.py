@@ -2,11 +2,18 @@
 API Routes - JSON API endpoints
 """
 
-from flask import Blueprint, jsonify, request
-from services.library_service import calculate_late_fee_for_book, search_books_in_catalog
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+from services.library_service import (
+    calculate_late_fee_for_book, search_books_in_catalog, SEARCH_RESULT_LIMIT
+)
+from services.catalog_export import iter_catalog_export, gzip_stream, EXPORT_CONTENT_TYPES
+from routes.http_cache import conditional_on_catalog
 
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
+# Upper bound for the ?limit= parameter of /api/search
+MAX_SEARCH_LIMIT = 1000
+
 @api_bp.route('/late_fee/<patron_id>/<int:book_id>')
 def get_late_fee(patron_id, book_id):
     """
@@ -17,6 +24,7 @@ def get_late_fee(patron_id, book_id):
     return jsonify(result), 501 if 'not implemented' in result.get('status', '') else 200
 
 @api_bp.route('/search')
+@conditional_on_catalog
 def search_books_api():
     """
     Search for books via API endpoint.
@@ -24,16 +32,43 @@ def search_books_api():
     """
     search_term = request.args.get('q', '').strip()
     search_type = request.args.get('type', 'title')
+    limit = request.args.get('limit', SEARCH_RESULT_LIMIT, type=int)
     
     if not search_term:
         return jsonify({'error': 'Search term is required'}), 400
     
-    # Use business logic function
-    books = search_books_in_catalog(search_term, search_type)
+    if limit <= 0 or limit > MAX_SEARCH_LIMIT:
+        return jsonify({'error': f'limit must be between 1 and {MAX_SEARCH_LIMIT}'}), 400
+    
+    # Use business logic function; one extra result tells whether more matched
+    books = search_books_in_catalog(search_term, search_type, limit + 1)
     
     return jsonify({
         'search_term': search_term,
         'search_type': search_type,
-        'results': books,
-        'count': len(books)
+        'results': books[:limit],
+        'count': len(books[:limit]),
+        'truncated': len(books) > limit
     })
+
+@api_bp.route('/catalog/export')
+def export_catalog():
+    """
+    Stream the whole catalog for downstream systems.
+    Query parameter `format` selects 'ndjson' (default) or 'csv'; the body is
+    gzip-compressed when the client sends Accept-Encoding: gzip.
+    """
+    export_format = request.args.get('format', 'ndjson').lower()
+    if export_format not in EXPORT_CONTENT_TYPES:
+        return jsonify({'error': f"format must be one of: {', '.join(EXPORT_CONTENT_TYPES)}"}), 400
+    
+    body = iter_catalog_export(export_format)
+    headers = {
+        'Content-Disposition': f'attachment; filename=catalog.{export_format}',
+        'Vary': 'Accept-Encoding',
+    }
+    if request.accept_encodings['gzip'] > 0:
+        body = gzip_stream(body)
+        headers['Content-Encoding'] = 'gzip'
+    
+    return Response(stream_with_context(body), content_type=EXPORT_CONTENT_TYPES[export_format], headers=headers)
@@ -2,25 +2,97 @@
 Catalog Routes - Book catalog related endpoints
 """
 
-from flask import Blueprint, render_template, request, redirect, url_for, flash
-from database import get_all_books
+import base64
+import json
+import os
+from typing import Dict, Optional, Tuple
+
+from flask import Blueprint, current_app, render_template, request, redirect, url_for, flash
+from markupsafe import Markup
+from cache import LRUCache
+from database import get_books_page
 from services.library_service import add_book_to_catalog
+from routes.http_cache import conditional_on_catalog
 
 catalog_bp = Blueprint('catalog', __name__)
 
+# Catalog page size (?per_page= may pick a value up to MAX_PAGE_SIZE)
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Rendered catalog rows keyed by (id, available_copies, total_copies); a
+# borrow or return changes the key, so only that row is rendered again.
+row_cache = LRUCache(
+    max_size=int(os.environ.get('LIBRARY_ROW_CACHE_SIZE', '4096')),
+    ttl=None,
+    enabled=os.environ.get('LIBRARY_ROW_CACHE', '1') != '0'
+)
+
+
+def encode_cursor(cursor: Optional[Tuple[str, int]]) -> Optional[str]:
+    """Encode a (title, id) keyset cursor as an opaque URL-safe token."""
+    if cursor is None:
+        return None
+    raw = json.dumps(list(cursor), separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token: Optional[str]) -> Optional[Tuple[str, int]]:
+    """Decode a token from encode_cursor; invalid tokens decode to None."""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        title, book_id = json.loads(raw)
+        if isinstance(title, str) and isinstance(book_id, int):
+            return title, book_id
+    except (ValueError, TypeError):
+        pass
+    return None
+
+def render_book_row(book: Dict) -> Markup:
+    """Render one catalog table row, reusing the cached fragment when the book is unchanged."""
+    key = (book['id'], book['available_copies'], book['total_copies'])
+    row = row_cache.get(key)
+    if row is None:
+        template = current_app.jinja_env.get_template('catalog_row.html')
+        row = Markup(template.render(book=book))
+        row_cache.set(key, row)
+    return row
+
+
+def get_row_cache_stats() -> Dict:
+    """Get hit/miss/eviction counters of the catalog row cache."""
+    return row_cache.stats()
+
 @catalog_bp.route('/')
 def index():
     """Home page redirects to catalog."""
     return redirect(url_for('catalog.catalog'))
 
 @catalog_bp.route('/catalog')
+@conditional_on_catalog
 def catalog():
     """
-    Display all books in the catalog.
+    Display the book catalog one page at a time.
     Implements R2: Book Catalog Display
     """
-    books = get_all_books()
-    return render_template('catalog.html', books=books)
+    per_page = request.args.get('per_page', DEFAULT_PAGE_SIZE, type=int)
+    per_page = min(max(per_page, 1), MAX_PAGE_SIZE)
+    
+    page = get_books_page(
+        per_page,
+        after=decode_cursor(request.args.get('after')),
+        before=decode_cursor(request.args.get('before'))
+    )
+    
+    return render_template(
+        'catalog.html',
+        rows=[render_book_row(book) for book in page['books']],
+        next_cursor=encode_cursor(page['next_cursor']),
+        prev_cursor=encode_cursor(page['prev_cursor']),
+        per_page=per_page
+    )
 
 @catalog_bp.route('/add_book', methods=['GET', 'POST'])
 def add_book():
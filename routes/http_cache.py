@@ -0,0 +1,69 @@
+"""
+HTTP Cache Helpers - Conditional GET for catalog-backed pages
+
+Pages whose content only depends on the request URL and the catalog get a
+weak ETag built from the build id (app.config['BUILD_ID']) and
+database.get_catalog_version(), both the same in every worker process
+serving one deploy. A request whose
+If-None-Match still matches is answered with 304 Not Modified before the
+view runs, so no query is made and no template is rendered.
+"""
+
+import hashlib
+import os
+from functools import wraps
+
+from flask import Response, current_app, make_response, request, session
+from database import get_catalog_version
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def source_fingerprint() -> str:
+    """Short hash of the application's Python sources and templates."""
+    digest = hashlib.sha1()
+    for folder in ('', 'routes', 'services', 'templates'):
+        directory = os.path.join(_ROOT, folder)
+        for name in sorted(os.listdir(directory)):
+            if name.endswith(('.py', '.html')):
+                digest.update(name.encode())
+                with open(os.path.join(directory, name), 'rb') as handle:
+                    digest.update(handle.read())
+    return digest.hexdigest()[:8]
+
+
+# Distinguishes ETags issued by different deploys (templates may differ
+# while the catalog version does not). Set LIBRARY_BUILD_ID (e.g. the
+# commit hash) to skip hashing the sources at startup.
+BUILD_ID = os.environ.get('LIBRARY_BUILD_ID') or source_fingerprint()
+
+
+def catalog_etag() -> str:
+    """ETag value for the current deploy and catalog version."""
+    return f"{current_app.config.get('BUILD_ID', BUILD_ID)}-{get_catalog_version()}"
+
+
+def conditional_on_catalog(view):
+    """
+    Decorator adding ETag / If-None-Match handling to a GET view.
+
+    Responses carrying flashed messages are neither tagged nor answered
+    with 304, since they differ from the page the client has cached.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.method not in ('GET', 'HEAD') or session.get('_flashes'):
+            return view(*args, **kwargs)
+
+        etag = catalog_etag()
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+        else:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200 or session.get('_flashes'):
+                return response
+        response.set_etag(etag, weak=True)
+        # Let clients keep the page but revalidate it on every use
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    return wrapper
@@ -3,11 +3,13 @@ Search Routes - Book search functionality
 """
 
 from flask import Blueprint, render_template, request, flash
-from services.library_service import search_books_in_catalog
+from services.library_service import search_books_in_catalog, SEARCH_RESULT_LIMIT
+from routes.http_cache import conditional_on_catalog
 
 search_bp = Blueprint('search', __name__)
 
 @search_bp.route('/search')
+@conditional_on_catalog
 def search_books():
     """
     Search for books in the catalog.
@@ -19,10 +21,13 @@ def search_books():
     if not search_term:
         return render_template('search.html', books=[], search_term='', search_type=search_type)
     
-    # Use business logic function
-    books = search_books_in_catalog(search_term, search_type)
+    # Use business logic function; one extra result tells whether more matched
+    books = search_books_in_catalog(search_term, search_type, SEARCH_RESULT_LIMIT + 1)
+    truncated = len(books) > SEARCH_RESULT_LIMIT
+    books = books[:SEARCH_RESULT_LIMIT]
     
     if not books:
         flash('Search functionality is not yet implemented.', 'error')
     
-    return render_template('search.html', books=books, search_term=search_term, search_type=search_type)
+    return render_template('search.html', books=books, search_term=search_term, search_type=search_type,
+                           truncated=truncated)
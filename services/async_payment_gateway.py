@@ -0,0 +1,310 @@
+"""
+Async Payment Gateway Module - asyncio/aiohttp client for the payment provider
+
+AsyncPaymentGateway implements the PaymentGateway interface on top of
+aiohttp sessions (pooled keep-alive connections). Every call has its own
+timeout and a semaphore bounds how many calls are in flight at once.
+
+Async callers await the *_async methods directly. Synchronous callers such
+as pay_late_fees use the regular interface methods; those submit the call
+to the gateway's background event loop and wait for the result.
+
+aiohttp sessions cannot be shared between event loops, so the gateway
+keeps one session, and one max_concurrency bound, per loop it is used
+from. close() closes the background loop's session; async callers close
+the session of their own loop with `await gateway.aclose()` (or `async
+with gateway:`) before that loop ends.
+
+Bulk status checks use the provider's POST /charges/lookup batch endpoint
+when it exists and otherwise fall back to one concurrent GET per transaction.
+"""
+
+import asyncio
+import queue
+import threading
+from typing import AsyncIterator, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import aiohttp
+
+from services.payment_gateway import PaymentGateway, PaymentGatewayError, PaymentGatewayTimeout
+
+DEFAULT_BASE_URL = "https://api.payment-gateway.example.com"
+
+# Transactions per request to the batch status endpoint
+LOOKUP_BATCH_SIZE = 100
+
+_DONE = object()
+
+
+class AsyncPaymentGateway(PaymentGateway):
+    """
+    Payment gateway client using asyncio and a pooled HTTP session.
+    """
+
+    def __init__(self, base_url: str = DEFAULT_BASE_URL, api_key: str = "test_key_12345",
+                 timeout: float = 5.0, max_concurrency: int = 20, max_connections: int = 50,
+                 lookup_batch_size: int = LOOKUP_BATCH_SIZE):
+        """
+        Args:
+            base_url: Payment provider API root
+            api_key: API key sent as a bearer token
+            timeout: Default per-call timeout in seconds
+            max_concurrency: Maximum calls in flight at once, per event loop
+            max_connections: Size of the HTTP keep-alive connection pool
+            lookup_batch_size: Transactions per batch status request (0 disables batching)
+        """
+        self.base_url = base_url.rstrip('/')
+        self.api_key = api_key
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.max_connections = max_connections
+        self.lookup_batch_size = lookup_batch_size
+        # Whether the provider serves the batch endpoint; None until first tried
+        self._batch_lookup: Optional[bool] = None
+        # Session and in-flight bound of each event loop the gateway is used from
+        self._sessions: Dict[asyncio.AbstractEventLoop, Tuple[aiohttp.ClientSession, asyncio.Semaphore]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    # Session and event loop management
+
+    async def _get_session(self) -> Tuple[aiohttp.ClientSession, asyncio.Semaphore]:
+        # A session belongs to the event loop it was created on
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            entry = self._sessions.get(loop)
+            if entry is None or entry[0].closed:
+                # Loops closed without aclose() can no longer close their sessions
+                for closed in [other for other in self._sessions if other.is_closed()]:
+                    del self._sessions[closed]
+                entry = self._sessions[loop] = (
+                    aiohttp.ClientSession(
+                        connector=aiohttp.TCPConnector(limit=self.max_connections),
+                        headers={"Authorization": f"Bearer {self.api_key}"},
+                    ),
+                    asyncio.Semaphore(self.max_concurrency),
+                )
+        return entry
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        """Start (once) the background event loop serving synchronous callers."""
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(
+                    target=self._loop.run_forever, name="payment-gateway-loop", daemon=True
+                )
+                self._thread.start()
+            return self._loop
+
+    def _run(self, coro):
+        loop = self._get_loop()
+        if threading.current_thread() is self._thread:
+            coro.close()
+            raise RuntimeError("Synchronous gateway methods cannot be called from the gateway's event loop")
+        return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+    async def aclose(self):
+        """Close the HTTP session of the running event loop (async callers)."""
+        with self._lock:
+            entry = self._sessions.pop(asyncio.get_running_loop(), None)
+        if entry is not None and not entry[0].closed:
+            await entry[0].close()
+
+    def close(self):
+        """Close the background loop's HTTP session and stop the loop."""
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop = self._thread = None
+        if loop is not None:
+            asyncio.run_coroutine_threadsafe(self.aclose(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    # HTTP
+
+    async def _request(self, method: str, path: str, timeout: Optional[float] = None,
+                       json: Optional[Dict] = None) -> Tuple[int, Dict]:
+        """
+        Send one API request.
+
+        Returns:
+            tuple: (HTTP status, decoded JSON body) for 2xx/4xx answers
+
+        Raises:
+            PaymentGatewayTimeout: No answer within the timeout
+            PaymentGatewayError: Connection failure or 5xx answer
+        """
+        session, in_flight = await self._get_session()
+        limit = self.timeout if timeout is None else timeout
+        async with in_flight:
+            try:
+                async with session.request(method, f"{self.base_url}{path}", json=json,
+                                           timeout=aiohttp.ClientTimeout(total=limit)) as response:
+                    if response.status >= 500:
+                        raise PaymentGatewayError(f"Payment provider error (HTTP {response.status})")
+                    try:
+                        body = await response.json(content_type=None)
+                    except ValueError:
+                        # e.g. a plain-text 404/405 from a route the provider doesn't have
+                        body = None
+                    return response.status, body or {}
+            except asyncio.TimeoutError:
+                raise PaymentGatewayTimeout(f"Payment provider did not answer within {limit:.1f}s")
+            except aiohttp.ClientError as e:
+                raise PaymentGatewayError(f"Payment provider unreachable: {e}")
+
+    # Async API
+
+    async def process_payment_async(self, patron_id: str, amount: float, description: str = "",
+                                    timeout: Optional[float] = None) -> Tuple[bool, str, str]:
+        """Async version of process_payment."""
+        status, body = await self._request("POST", "/charges", timeout, json={
+            "customer_id": patron_id,
+            "amount": amount,
+            "currency": "usd",
+            "description": description,
+        })
+        if status >= 400:
+            return False, "", body.get("error", f"Payment declined (HTTP {status})")
+        return True, body["id"], body.get("message", "")
+
+    async def refund_payment_async(self, transaction_id: str, amount: float,
+                                   timeout: Optional[float] = None) -> Tuple[bool, str]:
+        """Async version of refund_payment."""
+        status, body = await self._request("POST", "/refunds", timeout, json={
+            "transaction_id": transaction_id,
+            "amount": amount,
+        })
+        if status >= 400:
+            return False, body.get("error", f"Refund declined (HTTP {status})")
+        return True, body.get("message", "")
+
+    async def verify_payment_status_async(self, transaction_id: str,
+                                          timeout: Optional[float] = None) -> Dict:
+        """Async version of verify_payment_status."""
+        status, body = await self._request("GET", f"/charges/{transaction_id}", timeout)
+        if status == 404:
+            return {"status": "not_found", "message": "Transaction not found"}
+        return body
+
+    async def _verify_one(self, transaction_id: str, timeout: Optional[float]) -> Tuple[str, Dict]:
+        try:
+            return transaction_id, await self.verify_payment_status_async(transaction_id, timeout)
+        except PaymentGatewayError as e:
+            return transaction_id, {"status": "error", "message": str(e)}
+
+    async def _lookup_batch(self, transaction_ids: List[str],
+                            timeout: Optional[float]) -> Optional[List[Tuple[str, Dict]]]:
+        """Look up one batch of transactions; None if the provider has no batch endpoint."""
+        try:
+            status, body = await self._request("POST", "/charges/lookup", timeout,
+                                               json={"transaction_ids": transaction_ids})
+        except PaymentGatewayError as e:
+            return [(transaction_id, {"status": "error", "message": str(e)})
+                    for transaction_id in transaction_ids]
+        if status in (404, 405):
+            return None
+        charges = {charge.get("transaction_id"): charge for charge in body.get("charges", [])}
+        return [(transaction_id, charges.get(transaction_id)
+                 or {"status": "not_found", "message": "Transaction not found"})
+                for transaction_id in transaction_ids]
+
+    async def verify_payment_statuses_async(self, transaction_ids: Iterable[str],
+                                            max_concurrency: Optional[int] = None,
+                                            timeout: Optional[float] = None) -> AsyncIterator[Tuple[str, Dict]]:
+        """
+        Async version of verify_payment_statuses.
+
+        Yields:
+            tuple: (transaction_id, status dict) as each request completes
+        """
+        transaction_ids = list(transaction_ids)
+        size = self.lookup_batch_size
+        tasks = []
+        # Per-call bound on top of the gateway-wide max_concurrency
+        limit = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+
+        async def bounded(check, *args):
+            if limit is None:
+                return await check(*args)
+            async with limit:
+                return await check(*args)
+
+        try:
+            if size and self._batch_lookup is not False and transaction_ids:
+                # The first batch also tells whether the endpoint exists
+                first = await self._lookup_batch(transaction_ids[:size], timeout)
+                if first is not None:
+                    self._batch_lookup = True
+                    for result in first:
+                        yield result
+                    tasks = [asyncio.ensure_future(bounded(self._lookup_batch, transaction_ids[i:i + size], timeout))
+                             for i in range(size, len(transaction_ids), size)]
+                    for next_done in asyncio.as_completed(tasks):
+                        for result in await next_done:
+                            yield result
+                    return
+                self._batch_lookup = False
+
+            tasks = [asyncio.ensure_future(bounded(self._verify_one, transaction_id, timeout))
+                     for transaction_id in transaction_ids]
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    # PaymentGateway interface (blocking)
+
+    def process_payment(self, patron_id: str, amount: float, description: str = "") -> Tuple[bool, str, str]:
+        """Process a payment; blocks until the provider answers or the call times out."""
+        return self._run(self.process_payment_async(patron_id, amount, description))
+
+    def refund_payment(self, transaction_id: str, amount: float) -> Tuple[bool, str]:
+        """Refund a payment; blocks until the provider answers or the call times out."""
+        return self._run(self.refund_payment_async(transaction_id, amount))
+
+    def verify_payment_status(self, transaction_id: str) -> Dict:
+        """Check a transaction; blocks until the provider answers or the call times out."""
+        return self._run(self.verify_payment_status_async(transaction_id))
+
+    def verify_payment_statuses(self, transaction_ids: Iterable[str],
+                                max_concurrency: Optional[int] = None) -> Iterator[Tuple[str, Dict]]:
+        """Check many transactions; yields (transaction_id, status) as results arrive."""
+        results = queue.Queue()
+
+        async def produce():
+            try:
+                async for result in self.verify_payment_statuses_async(transaction_ids, max_concurrency):
+                    results.put(result)
+            finally:
+                results.put(_DONE)
+
+        loop = self._get_loop()
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("Synchronous gateway methods cannot be called from the gateway's event loop")
+        future = asyncio.run_coroutine_threadsafe(produce(), loop)
+        try:
+            while True:
+                result = results.get()
+                if result is _DONE:
+                    break
+                yield result
+            future.result()
+        finally:
+            future.cancel()
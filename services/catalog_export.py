@@ -0,0 +1,78 @@
+"""
+Catalog Export Module - Streaming catalog dumps
+
+Serializes the whole book catalog as NDJSON or CSV without building it in
+memory, for nightly exports to downstream systems.
+"""
+
+import csv
+import io
+import json
+import zlib
+from typing import Iterable, Iterator
+
+from database import iter_book_batches
+
+EXPORT_FIELDS = ['id', 'title', 'author', 'isbn', 'total_copies', 'available_copies']
+
+EXPORT_CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+
+def iter_catalog_export(export_format: str, batch_size: int = 1000) -> Iterator[str]:
+    """
+    Stream the catalog in the requested format.
+
+    Args:
+        export_format: 'ndjson' or 'csv'
+        batch_size: Books fetched from the database per chunk
+
+    Yields:
+        str: One chunk of output per batch of books
+    """
+    if export_format not in EXPORT_CONTENT_TYPES:
+        raise ValueError(f"Unsupported export format '{export_format}'")
+
+    if export_format == 'csv':
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        yield buffer.getvalue()
+        for books in iter_book_batches(batch_size):
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows(books)
+            yield buffer.getvalue()
+    else:
+        for books in iter_book_batches(batch_size):
+            yield ''.join(
+                json.dumps({field: book[field] for field in EXPORT_FIELDS}) + '\n'
+                for book in books
+            )
+
+
+def gzip_stream(chunks: Iterable[str], level: int = 6) -> Iterator[bytes]:
+    """
+    Gzip-compress a stream of text chunks on the fly.
+
+    Args:
+        chunks: UTF-8 text chunks
+        level: zlib compression level (1-9)
+
+    Yields:
+        bytes: Compressed output, ending with the gzip trailer
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+    try:
+        for chunk in chunks:
+            data = compressor.compress(chunk.encode('utf-8'))
+            if data:
+                yield data
+        yield compressor.flush()
+    finally:
+        # Release the underlying database cursor if the client disconnects
+        close = getattr(chunks, 'close', None)
+        if close:
+            close()
@@ -0,0 +1,93 @@
+"""
+Catalog Import Module - Bulk loading of book feeds
+
+Streams a CSV feed (columns: title, author, isbn, total_copies), validates
+it with the same R1 rules as add_book_to_catalog and inserts valid books in
+large batches. Bad rows are reported individually and never abort the load.
+"""
+
+import csv
+import time
+from typing import Dict, IO, Iterator, List, Tuple, Union
+
+from database import insert_books_bulk
+from services.library_service import validate_book_fields
+
+IMPORT_CHUNK_SIZE = 5000
+
+REQUIRED_COLUMNS = ('title', 'author', 'isbn', 'total_copies')
+
+
+def _chunks(reader: Iterator[Dict], size: int) -> Iterator[List[Tuple[int, Dict]]]:
+    """Group rows into lists of (line number, row) of at most `size` entries."""
+    chunk = []
+    for row in reader:
+        chunk.append((reader.line_num, row))
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def import_books(source: Union[str, IO[str]], chunk_size: int = IMPORT_CHUNK_SIZE) -> Dict:
+    """
+    Bulk import books from a CSV file.
+
+    Args:
+        source: Path to a CSV file or an open text file
+        chunk_size: Rows validated and inserted per transaction
+
+    Returns:
+        dict: 'inserted', 'duplicates', 'invalid', 'rows', 'seconds' and
+              'errors' (list of {'line', 'isbn', 'message'})
+    """
+    if isinstance(source, str):
+        with open(source, newline='', encoding='utf-8') as handle:
+            return import_books(handle, chunk_size)
+
+    started = time.perf_counter()
+    report = {'rows': 0, 'inserted': 0, 'duplicates': 0, 'invalid': 0, 'errors': []}
+
+    def reject(line, isbn, message, counter):
+        report[counter] += 1
+        report['errors'].append({'line': line, 'isbn': isbn, 'message': message})
+
+    reader = csv.DictReader(source)
+    missing = [column for column in REQUIRED_COLUMNS if column not in (reader.fieldnames or [])]
+    if missing:
+        raise ValueError(f"CSV is missing required columns: {', '.join(missing)}")
+
+    for chunk in _chunks(reader, chunk_size):
+        valid = []
+        lines_by_isbn = {}
+        for line, row in chunk:
+            report['rows'] += 1
+            title = (row.get('title') or '').strip()
+            author = (row.get('author') or '').strip()
+            isbn = (row.get('isbn') or '').strip()
+            try:
+                total_copies = int(row.get('total_copies') or '')
+            except ValueError:
+                reject(line, isbn, "Total copies must be a positive integer.", 'invalid')
+                continue
+
+            error = validate_book_fields(title, author, isbn, total_copies)
+            if error:
+                reject(line, isbn, error, 'invalid')
+                continue
+            if isbn in lines_by_isbn:
+                reject(line, isbn, f"Duplicate ISBN in feed (first seen on line {lines_by_isbn[isbn]}).", 'duplicates')
+                continue
+
+            lines_by_isbn[isbn] = line
+            valid.append((title, author, isbn, total_copies, total_copies))
+
+        inserted, existing = insert_books_bulk(valid)
+        report['inserted'] += inserted
+        for isbn in existing:
+            reject(lines_by_isbn[isbn], isbn, "A book with this ISBN already exists.", 'duplicates')
+
+    report['errors'].sort(key=lambda error: error['line'])
+    report['seconds'] = round(time.perf_counter() - started, 3)
+    return report
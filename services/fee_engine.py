@@ -0,0 +1,101 @@
+"""
+Fee Engine Module - Late fee rules
+
+Single home of the tiered late fee rule (R5): $0.50/day for the first
+7 days overdue, $1.00/day after that, capped at $15.00 per book.
+
+The scalar functions serve request-time lookups; assess_late_fees applies
+the same rule to whole arrays of loans in one vectorized NumPy pass for
+nightly fine assessment.
+"""
+
+from datetime import datetime
+from typing import Optional, Sequence, Tuple
+
+# Fee schedule
+FIRST_TIER_DAYS = 7
+FIRST_TIER_DAILY_FEE = 0.50
+SECOND_TIER_DAILY_FEE = 1.00
+MAX_LATE_FEE = 15.00
+
+
+def days_overdue(due_date: datetime, as_of: datetime) -> int:
+    """Get the number of whole days a loan is overdue (0 if not overdue)."""
+    if as_of <= due_date:
+        return 0
+    return (as_of - due_date).days
+
+
+def late_fee_for_days(days: int) -> float:
+    """Get the late fee for a loan that is `days` whole days overdue."""
+    if days <= 0:
+        return 0.0
+    if days <= FIRST_TIER_DAYS:
+        fee = days * FIRST_TIER_DAILY_FEE
+    else:
+        fee = FIRST_TIER_DAYS * FIRST_TIER_DAILY_FEE + (days - FIRST_TIER_DAYS) * SECOND_TIER_DAILY_FEE
+    return round(min(fee, MAX_LATE_FEE), 2)
+
+
+def late_fee(due_date: datetime, as_of: datetime) -> Tuple[int, float]:
+    """
+    Calculate days overdue and late fee for one loan.
+
+    Returns:
+        tuple: (days_overdue: int, fee: float)
+    """
+    days = days_overdue(due_date, as_of)
+    return days, late_fee_for_days(days)
+
+
+def late_fee_sql(days: str) -> str:
+    """
+    Build a SQL expression computing the late fee from a days-overdue expression.
+
+    Lets queries aggregate fees in SQLite while the schedule stays defined here.
+
+    Args:
+        days: SQL expression evaluating to whole days overdue
+
+    Returns:
+        str: SQL expression evaluating to the fee in dollars
+    """
+    return (
+        f'ROUND(CASE'
+        f' WHEN ({days}) <= 0 THEN 0.0'
+        f' WHEN ({days}) <= {FIRST_TIER_DAYS} THEN ({days}) * {FIRST_TIER_DAILY_FEE!r}'
+        f' ELSE MIN({FIRST_TIER_DAYS * FIRST_TIER_DAILY_FEE!r} + (({days}) - {FIRST_TIER_DAYS}) * {SECOND_TIER_DAILY_FEE!r},'
+        f' {MAX_LATE_FEE!r}) END, 2)'
+    )
+
+
+def assess_late_fees(due_dates: Sequence, as_of: Optional[datetime] = None):
+    """
+    Calculate days overdue and late fees for many loans in one vectorized pass.
+
+    Args:
+        due_dates: Due dates as datetimes, ISO-8601 strings or a numpy
+                   datetime64 array
+        as_of: Assessment time (default: now)
+
+    Returns:
+        tuple: (days_overdue: int64 array, fees: float64 array), aligned with due_dates
+    """
+    import numpy as np  # Only batch assessment needs NumPy
+
+    if as_of is None:
+        as_of = datetime.now()
+
+    due = np.asarray(due_dates, dtype='datetime64[us]')
+    elapsed = np.datetime64(as_of, 'us') - due
+
+    # Whole days, matching timedelta.days for positive deltas; not overdue -> 0
+    days = np.where(elapsed > np.timedelta64(0, 'us'), elapsed // np.timedelta64(1, 'D'), 0).astype(np.int64)
+
+    fees = np.where(
+        days <= FIRST_TIER_DAYS,
+        days * FIRST_TIER_DAILY_FEE,
+        FIRST_TIER_DAYS * FIRST_TIER_DAILY_FEE + (days - FIRST_TIER_DAYS) * SECOND_TIER_DAILY_FEE
+    )
+    fees = np.round(np.minimum(fees, MAX_LATE_FEE), 2)
+    return days, fees
@@ -0,0 +1,170 @@
+"""
+Fine Collection Module - Batch collection of late fees
+
+Collects the outstanding late fees of every overdue open loan in one run:
+the loans are selected with a single query, recorded as planned rows in the
+payments ledger, grouped into one charge per patron and submitted to the
+payment gateway by a pool of worker threads under a rate limit. Each
+patron's rows are marked pending just before the charge is sent.
+
+A run is identified by its run_id. Running the same run_id again resumes it:
+nothing is re-planned and only the patrons whose ledger rows are still
+planned (and, with retry_failed, failed) are charged. Rows left pending by
+an interrupted run may already have been charged; they are not submitted
+again but reported as in flight for reconciliation (reconcile-payments).
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from database import (
+    plan_collection_run, get_run_payments, claim_run_payments, update_payment_status,
+    PAYMENT_PLANNED, PAYMENT_PENDING, PAYMENT_SUCCEEDED, PAYMENT_FAILED, PAYMENT_UNKNOWN
+)
+from services.payment_gateway import PaymentNotSent
+from services.payment_service import PaymentGateway
+
+collection_logger = logging.getLogger('library.payments')
+
+COLLECTION_WORKERS = 8
+COLLECTION_RATE_LIMIT = 20.0
+
+
+class RateLimiter:
+    """
+    Token bucket shared by the collection workers.
+
+    Allows `rate` acquisitions per second on average with bursts of up to
+    `burst`. A rate of None or 0 disables limiting.
+    """
+
+    def __init__(self, rate: Optional[float], burst: int = 1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available and take it."""
+        if not self.rate:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def _group_by_patron(payments: List[Dict]) -> "OrderedDict[str, List[Dict]]":
+    patrons = OrderedDict()
+    for payment in payments:
+        patrons.setdefault(payment['patron_id'], []).append(payment)
+    return patrons
+
+
+def _charge_patron(gateway: PaymentGateway, limiter: RateLimiter, patron_id: str,
+                   payments: List[Dict], statuses: Tuple[str, ...]) -> Optional[Dict]:
+    """
+    Submit one charge covering all of a patron's ledger rows and record the outcome.
+
+    Returns None if another process took the rows first. The result's
+    'status' is PAYMENT_UNKNOWN when the charge may or may not have gone through.
+    """
+    # Wait for the rate limit first: rows are only marked pending right
+    # before the charge is sent, so a crash while waiting leaves them planned
+    limiter.acquire()
+    payments = claim_run_payments([payment['id'] for payment in payments], statuses)
+    if not payments:
+        return None
+    payment_ids = [payment['id'] for payment in payments]
+    amount = round(sum(payment['amount'] for payment in payments), 2)
+    description = f"Late fees for {len(payments)} overdue book(s)"
+    try:
+        success, transaction_id, message = gateway.process_payment(
+            patron_id=patron_id, amount=amount, description=description
+        )
+    except PaymentNotSent as e:
+        success, transaction_id, message = False, None, f"Payment processing error: {str(e)}"
+    except Exception as e:
+        update_payment_status(payment_ids, PAYMENT_UNKNOWN, None, f"Payment processing error: {str(e)}")
+        return {'patron_id': patron_id, 'amount': amount, 'status': PAYMENT_UNKNOWN}
+
+    status = PAYMENT_SUCCEEDED if success else PAYMENT_FAILED
+    try:
+        update_payment_status(payment_ids, status, transaction_id or None, message)
+    except sqlite3.Error:
+        if not success:
+            raise
+        # The patron was charged; the rows stay pending and go to reconciliation
+        collection_logger.exception(f"Charge {transaction_id} succeeded but could not be recorded "
+                                    f"(payments {payment_ids})")
+    return {'patron_id': patron_id, 'amount': amount, 'status': status}
+
+
+def collect_fines(payment_gateway: PaymentGateway = None, run_id: Optional[str] = None,
+                  workers: int = COLLECTION_WORKERS, rate_limit: Optional[float] = COLLECTION_RATE_LIMIT,
+                  as_of: Optional[datetime] = None, retry_failed: bool = False) -> Dict:
+    """
+    Charge every patron with outstanding late fees.
+
+    Args:
+        payment_gateway: Payment gateway instance (injectable for testing)
+        run_id: Identifier of the run; defaults to one run per day ("fines-YYYY-MM-DD")
+        workers: Number of charges submitted concurrently
+        rate_limit: Maximum charges per second (None for no limit)
+        as_of: Time to assess fees at (default now)
+        retry_failed: When resuming, also retry patrons whose charge failed
+
+    Returns:
+        dict: 'run_id', 'resumed', 'loans', 'patrons', 'succeeded', 'failed',
+              'unknown' (charges whose outcome must be reconciled),
+              'in_flight' (pending rows of an interrupted run, not resubmitted),
+              'amount_collected', 'seconds' and 'charges_per_second'
+    """
+    as_of = as_of or datetime.now()
+    run_id = run_id or f"fines-{as_of.date().isoformat()}"
+    if payment_gateway is None:
+        payment_gateway = PaymentGateway()
+
+    started = time.perf_counter()
+    resumed = not plan_collection_run(run_id, as_of)
+
+    statuses = (PAYMENT_PLANNED, PAYMENT_FAILED) if retry_failed else (PAYMENT_PLANNED,)
+    payments = get_run_payments(run_id, statuses)
+    patrons = _group_by_patron(payments)
+    in_flight = get_run_payments(run_id, (PAYMENT_PENDING, PAYMENT_UNKNOWN)) if resumed else []
+
+    limiter = RateLimiter(rate_limit, burst=workers)
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='fine-collection') as executor:
+        results = [result for result in executor.map(
+            lambda item: _charge_patron(payment_gateway, limiter, *item, statuses), patrons.items()
+        ) if result is not None]
+
+    seconds = time.perf_counter() - started
+    succeeded = [result for result in results if result['status'] == PAYMENT_SUCCEEDED]
+    unknown = [result for result in results if result['status'] == PAYMENT_UNKNOWN]
+    return {
+        'run_id': run_id,
+        'resumed': resumed,
+        'loans': len(payments),
+        'patrons': len(patrons),
+        'succeeded': len(succeeded),
+        'failed': len(results) - len(succeeded) - len(unknown),
+        'unknown': len(unknown),
+        'in_flight': len(in_flight),
+        'amount_collected': round(sum(result['amount'] for result in succeeded), 2),
+        'seconds': round(seconds, 3),
+        'charges_per_second': round(len(results) / seconds, 1) if seconds else 0.0,
+    }
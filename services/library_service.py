@@ -5,48 +5,86 @@ Contains all the core business logic for the Library Management System
 
 """
 
+import logging
+import sqlite3
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
 from database import (
-    get_book_by_id, get_book_by_isbn, get_patron_borrow_count,
-    insert_book, insert_borrow_record, update_book_availability,
-    update_borrow_record_return_date, get_all_books, get_patron_borrowed_books
+    get_book_by_id, get_book_by_isbn, insert_book, search_books,
+    get_patron_borrowed_books, get_patron_loan_summary, borrow_book_atomic, return_book_atomic,
+    BORROW_BOOK_NOT_FOUND, BORROW_UNAVAILABLE, BORROW_ALREADY_BORROWED,
+    BORROW_LIMIT_REACHED, claim_late_fee_payment, claim_refund, update_payment_status,
+    PAYMENT_PLANNED, PAYMENT_SUCCEEDED, PAYMENT_FAILED, PAYMENT_UNKNOWN
 )
+from services import fee_engine
+from services.payment_gateway import PaymentNotSent
 from services.payment_service import PaymentGateway
+from services.resilient_gateway import CircuitBreaker, ResilientPaymentGateway
 
+# Default maximum number of results returned by search_books_in_catalog
+SEARCH_RESULT_LIMIT = 50
 
-def add_book_to_catalog(title: str, author: str, isbn: str, total_copies: int) -> Tuple[bool, str]:
+payment_logger = logging.getLogger('library.payments')
+
+# Appended when a gateway call ended without a known outcome
+UNKNOWN_OUTCOME_NOTE = "It will be checked with the payment provider before it can be retried."
+
+# Circuit breaker shared by the default payment gateways, so breaker state
+# and latency histograms persist across requests
+payment_breaker = CircuitBreaker()
+
+
+def _default_payment_gateway() -> ResilientPaymentGateway:
+    """Payment gateway used when none is injected: deadlines and circuit breaker applied."""
+    return ResilientPaymentGateway(PaymentGateway(), breaker=payment_breaker)
+
+
+def validate_book_fields(title: str, author: str, isbn: str, total_copies: int) -> Optional[str]:
     """
-    Add a new book to the catalog.
-    Implements R1: Book Catalog Management
+    Validate the fields of a new book (R1 rules).
     
-    Args:
-        title: Book title (max 200 chars)
-        author: Book author (max 100 chars)
-        isbn: 13-digit ISBN
-        total_copies: Number of copies (positive integer)
-        
     Returns:
-        tuple: (success: bool, message: str)
+        str: Error message, or None if the book is valid
     """
-    # Input validation
     if not title or not title.strip():
-        return False, "Title is required."
+        return "Title is required."
     
     if len(title.strip()) > 200:
-        return False, "Title must be less than 200 characters."
+        return "Title must be less than 200 characters."
     
     if not author or not author.strip():
-        return False, "Author is required."
+        return "Author is required."
     
     if len(author.strip()) > 100:
-        return False, "Author must be less than 100 characters."
+        return "Author must be less than 100 characters."
     
     if len(isbn) != 13 or not isbn.isdigit():
-        return False, "ISBN must be exactly 13 digits."
+        return "ISBN must be exactly 13 digits."
     
     if not isinstance(total_copies, int) or total_copies <= 0:
-        return False, "Total copies must be a positive integer."
+        return "Total copies must be a positive integer."
+    
+    return None
+
+
+def add_book_to_catalog(title: str, author: str, isbn: str, total_copies: int) -> Tuple[bool, str]:
+    """
+    Add a new book to the catalog.
+    Implements R1: Book Catalog Management
+    
+    Args:
+        title: Book title (max 200 chars)
+        author: Book author (max 100 chars)
+        isbn: 13-digit ISBN
+        total_copies: Number of copies (positive integer)
+        
+    Returns:
+        tuple: (success: bool, message: str)
+    """
+    # Input validation
+    error = validate_book_fields(title, author, isbn, total_copies)
+    if error:
+        return False, error
     
     # Check for duplicate ISBN
     existing = get_book_by_isbn(isbn)
@@ -77,38 +115,27 @@ def borrow_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
     if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
         return False, "Invalid patron ID. Must be exactly 6 digits."
     
-    # Check if book exists and is available
-    book = get_book_by_id(book_id)
-    if not book:
-        return False, "Book not found."
-    
-    if book['available_copies'] <= 0:
-        return False, "This book is currently not available."
-    
-    # Check if patron already borrowed this book
-    borrowed_books = get_patron_borrowed_books(patron_id)
-    for borrowed in borrowed_books:
-        if borrowed['book_id'] == book_id:
-            return False, "You have already borrowed this book."
-    
-    # Check patron's current borrowed books count
-    current_borrowed = get_patron_borrow_count(patron_id)
-    
-    if current_borrowed >= 5:
-        return False, "You have reached the maximum borrowing limit of 5 books."
-    
     # Create borrow record
     borrow_date = datetime.now()
     due_date = borrow_date + timedelta(days=14)
     
-    # Insert borrow record and update availability
-    borrow_success = insert_borrow_record(patron_id, book_id, borrow_date, due_date)
-    if not borrow_success:
+    # Availability check, decrement and record insert run in one transaction
+    try:
+        outcome, book = borrow_book_atomic(patron_id, book_id, borrow_date, due_date, max_borrowed=5)
+    except sqlite3.Error:
         return False, "Database error occurred while creating borrow record."
     
-    availability_success = update_book_availability(book_id, -1)
-    if not availability_success:
-        return False, "Database error occurred while updating book availability."
+    if outcome == BORROW_BOOK_NOT_FOUND:
+        return False, "Book not found."
+    
+    if outcome == BORROW_UNAVAILABLE:
+        return False, "This book is currently not available."
+    
+    if outcome == BORROW_ALREADY_BORROWED:
+        return False, "You have already borrowed this book."
+    
+    if outcome == BORROW_LIMIT_REACHED:
+        return False, "You have reached the maximum borrowing limit of 5 books."
     
     return True, f'Successfully borrowed "{book["title"]}". Due date: {due_date.strftime("%Y-%m-%d")}.'
 
@@ -138,42 +165,18 @@ def return_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
     if not book:
         return False, "Book not found."
     
-    # Check if book is currently borrowed by this patron
-    borrowed_books = get_patron_borrowed_books(patron_id)
-    book_borrowed = None
-    for borrowed in borrowed_books:
-        if borrowed['book_id'] == book_id:
-            book_borrowed = borrowed
-            break
+    # Close the loan and restore availability in one transaction
+    return_date = datetime.now()
+    try:
+        due_date = return_book_atomic(patron_id, book_id, return_date)
+    except sqlite3.Error:
+        return False, "Database error occurred while processing return."
     
-    if not book_borrowed:
+    if due_date is None:
         return False, "This book is not borrowed by this patron."
     
     # Calculate late fee if overdue
-    return_date = datetime.now()
-    due_date = book_borrowed['due_date']
-    days_overdue = 0
-    late_fee = 0.0
-    
-    if return_date > due_date:
-        days_overdue = (return_date - due_date).days
-        # Calculate late fee: $0.50 per day for first 7 days, $1.00 per day after
-        if days_overdue <= 7:
-            late_fee = days_overdue * 0.50
-        else:
-            late_fee = (7 * 0.50) + ((days_overdue - 7) * 1.00)
-        # Maximum cap of $15.00
-        late_fee = min(late_fee, 15.00)
-    
-    # Update borrow record with return date
-    return_success = update_borrow_record_return_date(patron_id, book_id, return_date)
-    if not return_success:
-        return False, "Database error occurred while processing return."
-    
-    # Update book availability
-    availability_success = update_book_availability(book_id, 1)
-    if not availability_success:
-        return False, "Database error occurred while updating book availability."
+    days_overdue, late_fee = fee_engine.late_fee(due_date, return_date)
     
     # Build success message
     if late_fee > 0:
@@ -246,17 +249,7 @@ def calculate_late_fee_for_book(patron_id: str, book_id: int) -> Dict:
             'status': 'Not overdue'
         }
     
-    days_overdue = (current_date - due_date).days
-    
-    # Calculate late fee: $0.50 per day for first 7 days, $1.00 per day after
-    if days_overdue <= 7:
-        fee_amount = days_overdue * 0.50
-    else:
-        fee_amount = (7 * 0.50) + ((days_overdue - 7) * 1.00)
-    
-    # Maximum cap of $15.00
-    fee_amount = min(fee_amount, 15.00)
-    fee_amount = round(fee_amount, 2)
+    days_overdue, fee_amount = fee_engine.late_fee(due_date, current_date)
     
     return {
         'fee_amount': fee_amount,
@@ -265,7 +258,7 @@ def calculate_late_fee_for_book(patron_id: str, book_id: int) -> Dict:
     }
 
 
-def search_books_in_catalog(search_term: str, search_type: str) -> List[Dict]:
+def search_books_in_catalog(search_term: str, search_type: str, limit: Optional[int] = SEARCH_RESULT_LIMIT) -> List[Dict]:
     """
     Search for books in the catalog.
     Implements R6 as per requirements
@@ -273,6 +266,7 @@ def search_books_in_catalog(search_term: str, search_type: str) -> List[Dict]:
     Args:
         search_term: The term to search for
         search_type: Type of search ('title', 'author', or 'isbn')
+        limit: Maximum number of results, best matches first (None for all)
         
     Returns:
         list: List of book dictionaries matching the search criteria
@@ -281,27 +275,12 @@ def search_books_in_catalog(search_term: str, search_type: str) -> List[Dict]:
     if not search_term or not search_term.strip():
         return []
     
-    # Get all books
-    all_books = get_all_books()
-    
-    # Normalize search term
-    search_term_lower = search_term.strip().lower()
-    
-    # Filter based on search type
-    results = []
-    for book in all_books:
-        if search_type == 'title':
-            if search_term_lower in book.get('title', '').lower():
-                results.append(book)
-        elif search_type == 'author':
-            if search_term_lower in book.get('author', '').lower():
-                results.append(book)
-        elif search_type == 'isbn':
-            if book.get('isbn', '') == search_term.strip():
-                results.append(book)
-        # Invalid search type returns empty list
-    
-    return results
+    # Invalid search type returns empty list
+    if search_type not in ('title', 'author', 'isbn'):
+        return []
+    
+    # Title/author: case-insensitive partial match, ISBN: exact match
+    return search_books(search_term.strip(), search_type, limit)
 
 
 def get_patron_status_report(patron_id: str) -> Dict:
@@ -328,51 +307,37 @@ def get_patron_status_report(patron_id: str) -> Dict:
             'message': 'Invalid patron ID. Must be exactly 6 digits.'
         }
     
-    # Get all borrowed books for this patron
-    borrowed_books = get_patron_borrowed_books(patron_id)
+    # One query returns every open loan with its fee and the patron totals
+    loans = get_patron_loan_summary(patron_id, datetime.now())
     
     # Separate into current and overdue
     books_borrowed = []
     books_overdue = []
-    total_fines = 0.0
-    current_date = datetime.now()
     
-    for book in borrowed_books:
+    for loan in loans:
         book_info = {
-            'book_id': book['book_id'],
-            'title': book['title'],
-            'author': book['author'],
-            'borrow_date': book['borrow_date'].strftime('%Y-%m-%d'),
-            'due_date': book['due_date'].strftime('%Y-%m-%d')
+            'book_id': loan['book_id'],
+            'title': loan['title'],
+            'author': loan['author'],
+            'borrow_date': loan['borrow_date'],
+            'due_date': loan['due_date']
         }
         
-        if book['is_overdue']:
-            days_overdue = (current_date - book['due_date']).days
-            # Calculate late fee
-            if days_overdue <= 7:
-                late_fee = days_overdue * 0.50
-            else:
-                late_fee = (7 * 0.50) + ((days_overdue - 7) * 1.00)
-            late_fee = min(late_fee, 15.00)
-            late_fee = round(late_fee, 2)
-            
-            book_info['days_overdue'] = days_overdue
-            book_info['late_fee'] = late_fee
-            total_fines += late_fee
+        if loan['is_overdue']:
+            book_info['days_overdue'] = loan['days_overdue']
+            book_info['late_fee'] = loan['late_fee']
             books_overdue.append(book_info)
         else:
             books_borrowed.append(book_info)
     
-    total_fines = round(total_fines, 2)
-    
     return {
         'success': True,
         'patron_id': patron_id,
         'books_borrowed': books_borrowed,
         'books_overdue': books_overdue,
-        'total_fines': total_fines,
-        'total_books_borrowed': len(books_borrowed) + len(books_overdue),
-        'total_overdue': len(books_overdue)
+        'total_fines': loans[0]['total_fines'] if loans else 0.0,
+        'total_books_borrowed': loans[0]['total_books_borrowed'] if loans else 0,
+        'total_overdue': loans[0]['total_overdue'] if loans else 0
     }
 
 
@@ -418,27 +383,51 @@ def pay_late_fees(patron_id: str, book_id: int, payment_gateway: PaymentGateway
     if not book:
         return False, "Book not found.", None
     
+    # Record the charge in the ledger first; a repeated submission for the
+    # same fee period is answered from the ledger without calling the gateway
+    payment, created = claim_late_fee_payment(patron_id, book_id, fee_info.get('days_overdue', 0), fee_amount)
+    if payment is None:
+        return False, "No late fees to pay for this book.", None
+    if not created:
+        if payment['status'] == PAYMENT_PLANNED:
+            return False, f"These late fees are scheduled to be charged in collection run {payment['run_id']}.", None
+        if payment['status'] == PAYMENT_SUCCEEDED:
+            return True, f"Payment successful! {payment['message']}", payment['transaction_id']
+        if payment['status'] == PAYMENT_UNKNOWN:
+            return False, "A payment for these late fees is awaiting reconciliation with the payment provider.", None
+        return False, "A payment for these late fees is already being processed.", None
+    
     # Use provided gateway or create new one
     if payment_gateway is None:
-        payment_gateway = PaymentGateway()
+        payment_gateway = _default_payment_gateway()
     
     # Process payment through external gateway
     # THIS IS WHAT YOU SHOULD MOCK IN THEIR TESTS!
     try:
         success, transaction_id, message = payment_gateway.process_payment(
             patron_id=patron_id,
-            amount=fee_amount,
+            amount=payment['amount'],
             description=f"Late fees for '{book['title']}'"
         )
-        
-        if success:
-            return True, f"Payment successful! {message}", transaction_id
-        else:
-            return False, f"Payment failed: {message}", None
-            
-    except Exception as e:
-        # Handle payment gateway errors
+    except PaymentNotSent as e:
+        # Rejected before reaching the provider: safe to retry
+        update_payment_status([payment['id']], PAYMENT_FAILED, None, str(e))
         return False, f"Payment processing error: {str(e)}", None
+    except Exception as e:
+        # The provider may have charged the patron; keep the key until reconciled
+        update_payment_status([payment['id']], PAYMENT_UNKNOWN, None, str(e))
+        return False, f"Payment processing error: {str(e)}. {UNKNOWN_OUTCOME_NOTE}", None
+    
+    if not success:
+        update_payment_status([payment['id']], PAYMENT_FAILED, None, message)
+        return False, f"Payment failed: {message}", None
+    try:
+        update_payment_status([payment['id']], PAYMENT_SUCCEEDED, transaction_id, message)
+    except sqlite3.Error:
+        # The patron was charged; the entry stays pending and goes to reconciliation
+        payment_logger.exception(f"Charge {transaction_id} succeeded but could not be recorded "
+                                 f"(payment {payment['id']})")
+    return True, f"Payment successful! {message}", transaction_id
 
 
 def refund_late_fee_payment(transaction_id: str, amount: float, payment_gateway: PaymentGateway = None) -> Tuple[bool, str]:
@@ -465,19 +454,39 @@ def refund_late_fee_payment(transaction_id: str, amount: float, payment_gateway:
     if amount > 15.00:  # Maximum late fee per book
         return False, "Refund amount exceeds maximum late fee."
     
+    # A transaction is refunded at most once; repeats are answered from the ledger
+    refund, created = claim_refund(transaction_id, amount)
+    if not created:
+        if round(refund['amount'], 2) != round(amount, 2):
+            return False, (f"A refund of ${refund['amount']:.2f} is already recorded for this transaction; "
+                           f"it cannot be refunded again with a different amount.")
+        if refund['status'] == PAYMENT_SUCCEEDED:
+            return True, refund['message']
+        if refund['status'] == PAYMENT_UNKNOWN:
+            return False, "A refund for this transaction is awaiting reconciliation with the payment provider."
+        return False, "A refund for this transaction is already being processed."
+    
     # Use provided gateway or create new one
     if payment_gateway is None:
-        payment_gateway = PaymentGateway()
+        payment_gateway = _default_payment_gateway()
     
     # Process refund through external gateway
     # THIS IS WHAT YOU SHOULD MOCK IN YOUR TESTS!
     try:
         success, message = payment_gateway.refund_payment(transaction_id, amount)
-        
-        if success:
-            return True, message
-        else:
-            return False, f"Refund failed: {message}"
-            
-    except Exception as e:
+    except PaymentNotSent as e:
+        update_payment_status([refund['id']], PAYMENT_FAILED, transaction_id, str(e))
         return False, f"Refund processing error: {str(e)}"
+    except Exception as e:
+        update_payment_status([refund['id']], PAYMENT_UNKNOWN, transaction_id, str(e))
+        return False, f"Refund processing error: {str(e)}. {UNKNOWN_OUTCOME_NOTE}"
+    
+    if not success:
+        update_payment_status([refund['id']], PAYMENT_FAILED, transaction_id, message)
+        return False, f"Refund failed: {message}"
+    try:
+        update_payment_status([refund['id']], PAYMENT_SUCCEEDED, transaction_id, message)
+    except sqlite3.Error:
+        payment_logger.exception(f"Refund of {transaction_id} succeeded but could not be recorded "
+                                 f"(payment {refund['id']})")
+    return True, message
@@ -4,8 +4,32 @@ This module defines the PaymentGateway class that serves as an interface
 for external payment processing services.
 """
 
-from typing import Tuple
+from typing import Dict, Iterable, Iterator, Tuple
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Default number of status checks in flight at once in verify_payment_statuses
+VERIFY_CONCURRENCY = 16
+
+
+class PaymentGatewayError(Exception):
+    """The payment provider could not be reached or returned a server error."""
+
+
+class PaymentGatewayTimeout(PaymentGatewayError):
+    """The payment provider did not answer within the allowed time."""
+
+
+class PaymentOutcomeUnknown(PaymentGatewayTimeout):
+    """A charge or refund ran past its deadline and may still complete at the provider."""
+
+
+class PaymentNotSent(PaymentGatewayError):
+    """The call was rejected before it reached the provider, so nothing was charged."""
+
+
+class CircuitOpenError(PaymentNotSent):
+    """The circuit breaker is open: the call was rejected without contacting the provider."""
 
 
 class PaymentGateway(ABC):
@@ -42,6 +66,51 @@ class PaymentGateway(ABC):
             tuple: (success: bool, message: str)
         """
         pass
+    
+    @abstractmethod
+    def verify_payment_status(self, transaction_id: str) -> Dict:
+        """
+        Check the status of a payment transaction.
+        
+        Args:
+            transaction_id: Transaction ID to check
+            
+        Returns:
+            dict: Payment status information ('status' is "not_found" for unknown IDs)
+        """
+        pass
+    
+    def verify_payment_statuses(self, transaction_ids: Iterable[str],
+                                max_concurrency: int = VERIFY_CONCURRENCY) -> Iterator[Tuple[str, Dict]]:
+        """
+        Check the status of many transactions at once.
+        
+        The default implementation fans verify_payment_status out over a
+        bounded thread pool. Gateways whose provider has a batch endpoint
+        override this to use it.
+        
+        Args:
+            transaction_ids: Transaction IDs to check
+            max_concurrency: Maximum checks in flight at once
+            
+        Yields:
+            tuple: (transaction_id, status dict) in completion order. A check
+                   that raises yields {'status': 'error', 'message': ...}
+        """
+        executor = ThreadPoolExecutor(max_workers=max(1, max_concurrency),
+                                      thread_name_prefix='payment-verify')
+        try:
+            futures = {executor.submit(self.verify_payment_status, transaction_id): transaction_id
+                       for transaction_id in transaction_ids}
+            for future in as_completed(futures):
+                try:
+                    status = future.result()
+                except Exception as e:
+                    status = {"status": "error", "message": str(e)}
+                yield futures[future], status
+        finally:
+            # Abandoned early: don't start the checks that are still queued
+            executor.shutdown(wait=False, cancel_futures=True)
 
 
 class PaymentServiceGateway(PaymentGateway):
@@ -62,4 +131,7 @@ class PaymentServiceGateway(PaymentGateway):
     def refund_payment(self, transaction_id: str, amount: float) -> Tuple[bool, str]:
         """Process refund using the payment_service PaymentGateway."""
         return self._gateway.refund_payment(transaction_id, amount)
-
+    
+    def verify_payment_status(self, transaction_id: str) -> Dict:
+        """Check a transaction using the payment_service PaymentGateway."""
+        return self._gateway.verify_payment_status(transaction_id)
@@ -0,0 +1,166 @@
+"""
+Payment Stub Server - Local stand-in for the external payment provider
+
+Implements the HTTP API that AsyncPaymentGateway talks to, with the same
+business rules as the simulated payment_service.PaymentGateway and a
+configurable response delay. Used by the tests and for local development:
+
+    python -m services.payment_stub_server --port 8099 --latency 0.3
+"""
+
+import argparse
+import asyncio
+import itertools
+import threading
+import time
+from typing import Dict, Optional
+
+from aiohttp import web
+
+
+class PaymentStubServer:
+    """
+    In-process payment provider stub.
+
+    Endpoints:
+        POST /charges          {"customer_id", "amount", "currency", "description"}
+        POST /refunds          {"transaction_id", "amount"}
+        GET  /charges/{id}     charge status
+        POST /charges/lookup   {"transaction_ids": [...]} statuses of many charges
+                               (not served when batch_lookup is False)
+    """
+
+    def __init__(self, latency: float = 0.0, api_key: Optional[str] = None, batch_lookup: bool = True):
+        self.latency = latency
+        self.api_key = api_key
+        self.batch_lookup = batch_lookup
+        self.charges: Dict[str, Dict] = {}
+        self.requests = 0
+        self.max_in_flight = 0
+        self._in_flight = 0
+        self._ids = itertools.count(1)
+        self._runner = None
+        self._thread = None
+        self._loop = None
+        self.port = None
+
+    def make_app(self) -> web.Application:
+        app = web.Application(middlewares=[self._middleware])
+        app.router.add_post('/charges', self._create_charge)
+        app.router.add_post('/refunds', self._create_refund)
+        if self.batch_lookup:
+            app.router.add_post('/charges/lookup', self._lookup_charges)
+        app.router.add_get('/charges/{transaction_id}', self._get_charge)
+        return app
+
+    @web.middleware
+    async def _middleware(self, request, handler):
+        self.requests += 1
+        self._in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self._in_flight)
+        try:
+            if self.api_key and request.headers.get('Authorization') != f'Bearer {self.api_key}':
+                return web.json_response({'error': 'Invalid API key'}, status=401)
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            return await handler(request)
+        finally:
+            self._in_flight -= 1
+
+    async def _create_charge(self, request):
+        body = await request.json()
+        amount = body.get('amount', 0)
+        customer_id = str(body.get('customer_id', ''))
+
+        if amount <= 0:
+            return web.json_response({'error': 'Invalid amount: must be greater than 0'}, status=400)
+        if amount > 1000:
+            return web.json_response({'error': 'Payment declined: amount exceeds limit'}, status=402)
+        if len(customer_id) != 6:
+            return web.json_response({'error': 'Invalid patron ID format'}, status=400)
+
+        transaction_id = f'txn_{customer_id}_{next(self._ids)}'
+        self.charges[transaction_id] = {
+            'transaction_id': transaction_id,
+            'status': 'completed',
+            'amount': amount,
+            'timestamp': time.time(),
+        }
+        return web.json_response({
+            'id': transaction_id,
+            'message': f'Payment of ${amount:.2f} processed successfully',
+        })
+
+    async def _create_refund(self, request):
+        body = await request.json()
+        transaction_id = body.get('transaction_id', '')
+        amount = body.get('amount', 0)
+
+        if transaction_id not in self.charges:
+            return web.json_response({'error': 'Invalid transaction ID'}, status=404)
+        if amount <= 0:
+            return web.json_response({'error': 'Invalid refund amount'}, status=400)
+
+        self.charges[transaction_id]['status'] = 'refunded'
+        refund_id = f'refund_{transaction_id}_{next(self._ids)}'
+        return web.json_response({
+            'id': refund_id,
+            'message': f'Refund of ${amount:.2f} processed successfully. Refund ID: {refund_id}',
+        })
+
+    async def _get_charge(self, request):
+        charge = self.charges.get(request.match_info['transaction_id'])
+        if charge is None:
+            return web.json_response({'status': 'not_found', 'message': 'Transaction not found'}, status=404)
+        return web.json_response(charge)
+
+    async def _lookup_charges(self, request):
+        body = await request.json()
+        return web.json_response({'charges': [
+            self.charges.get(transaction_id) or {
+                'transaction_id': transaction_id, 'status': 'not_found', 'message': 'Transaction not found'
+            }
+            for transaction_id in body.get('transaction_ids', [])
+        ]})
+
+    def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        """Serve on a background thread; returns the base URL."""
+        started = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            self._runner = web.AppRunner(self.make_app())
+            self._loop.run_until_complete(self._runner.setup())
+            site = web.TCPSite(self._runner, host, port)
+            self._loop.run_until_complete(site.start())
+            self.port = self._runner.addresses[0][1]
+            started.set()
+            self._loop.run_forever()
+            self._loop.run_until_complete(self._runner.cleanup())
+            self._loop.close()
+
+        self._thread = threading.Thread(target=run, name='payment-stub-server', daemon=True)
+        self._thread.start()
+        started.wait()
+        return f'http://{host}:{self.port}'
+
+    def stop(self):
+        """Stop a server started with start()."""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the payment provider stub.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds to delay every response')
+    args = parser.parse_args()
+    web.run_app(PaymentStubServer(latency=args.latency).make_app(), host=args.host, port=args.port)
+
+
+if __name__ == '__main__':
+    main()
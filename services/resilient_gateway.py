@@ -0,0 +1,249 @@
+"""
+Resilient Gateway Module - Circuit breaker and deadlines for payment calls
+
+ResilientPaymentGateway wraps any PaymentGateway implementation:
+
+- every call gets a deadline; a call that runs past it raises
+  PaymentGatewayTimeout to the caller while the provider call finishes
+  on a worker thread. For charges and refunds this is
+  PaymentOutcomeUnknown: the provider may still complete the call, so
+  callers must not treat it as failed (nor retry it) until reconciled,
+- a bounded number of calls may be in flight at once, so a hung provider
+  cannot tie up every request thread; calls beyond it are rejected with
+  PaymentNotSent,
+- a CircuitBreaker counts consecutive failures and, once open, rejects
+  calls immediately with CircuitOpenError. After recovery_timeout it lets
+  a probe call through (half-open) and closes again if the probe succeeds.
+
+Declined payments are answers from a healthy provider and do not count
+as failures; exceptions and timeouts do. The breaker also keeps latency
+histograms per gateway method, exposed with its state by stats().
+"""
+
+import os
+import threading
+import time
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+from services.payment_gateway import (
+    PaymentGateway, PaymentGatewayTimeout, PaymentOutcomeUnknown, PaymentNotSent, CircuitOpenError
+)
+
+# Per-call deadline in seconds
+PAYMENT_TIMEOUT = float(os.environ.get('LIBRARY_PAYMENT_TIMEOUT', '2.0'))
+
+# Provider calls allowed in flight at once (including calls past their deadline)
+PAYMENT_MAX_IN_FLIGHT = int(os.environ.get('LIBRARY_PAYMENT_MAX_IN_FLIGHT', '32'))
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Gateway methods whose calls may move money even when they miss the deadline
+MONEY_MOVING_METHODS = ('process_payment', 'refund_payment')
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class LatencyHistogram:
+    """
+    Fixed-bucket latency histogram (cumulative counts, Prometheus style).
+    """
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        """Record one duration."""
+        with self._lock:
+            self._counts[bisect_left(self.buckets, seconds)] += 1
+            self.count += 1
+            self.sum += seconds
+
+    def snapshot(self) -> Dict:
+        """Return cumulative bucket counts keyed by upper bound ('+Inf' last), count and sum."""
+        with self._lock:
+            cumulative, total = {}, 0
+            for bound, count in zip(self.buckets + (float('inf'),), self._counts):
+                total += count
+                cumulative['+Inf' if bound == float('inf') else str(bound)] = total
+            return {'buckets': cumulative, 'count': self.count, 'sum': round(self.sum, 6)}
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker with half-open probing.
+
+    Shared by every wrapper of the same provider so its state survives
+    across requests.
+    """
+
+    def __init__(self, failure_threshold: int = 5, recovery_timeout: float = 30.0,
+                 half_open_max_calls: int = 1, clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            failure_threshold: Consecutive failures that open the circuit
+            recovery_timeout: Seconds the circuit stays open before probing
+            half_open_max_calls: Probe calls allowed at once while half-open
+            clock: Time source (injectable for testing)
+        """
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.clock = clock
+        self.latency: Dict[str, LatencyHistogram] = {}
+        self.errors: Dict[str, int] = {}
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self._lock = threading.Lock()
+        self.rejected = 0
+        self.opened = 0
+
+    @property
+    def state(self) -> str:
+        """Current state: 'closed', 'open' or 'half_open'."""
+        with self._lock:
+            self._update()
+            return self._state
+
+    def _update(self):
+        if self._state == OPEN and self.clock() - self._opened_at >= self.recovery_timeout:
+            self._state = HALF_OPEN
+            self._probes = 0
+
+    def _open(self):
+        self._state = OPEN
+        self._opened_at = self.clock()
+        self.opened += 1
+
+    def allow(self) -> bool:
+        """Ask to make a call; False means reject it without contacting the provider."""
+        with self._lock:
+            self._update()
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and self._probes < self.half_open_max_calls:
+                self._probes += 1
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        """Report a call that got an answer from the provider."""
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._probes = 0
+
+    def record_failure(self, method: Optional[str] = None):
+        """Report a call (to gateway `method`, if given) that raised or timed out."""
+        with self._lock:
+            if method is not None:
+                self.errors[method] = self.errors.get(method, 0) + 1
+            self._failures += 1
+            if self._state == HALF_OPEN or (self._state == CLOSED and self._failures >= self.failure_threshold):
+                self._open()
+            self._probes = 0
+
+    def observe(self, method: str, seconds: float):
+        """Record the latency of one call to a gateway method."""
+        histogram = self.latency.get(method)
+        if histogram is None:
+            histogram = self.latency.setdefault(method, LatencyHistogram())
+        histogram.observe(seconds)
+
+    def stats(self) -> Dict:
+        """Return breaker state, counters and per-method latency histograms."""
+        with self._lock:
+            self._update()
+            stats = {
+                'state': self._state,
+                'consecutive_failures': self._failures,
+                'times_opened': self.opened,
+                'rejected': self.rejected,
+                'errors': dict(self.errors),
+            }
+        stats['latency'] = {method: histogram.snapshot() for method, histogram in self.latency.items()}
+        return stats
+
+
+# Worker threads running provider calls under a deadline
+_executor = ThreadPoolExecutor(max_workers=PAYMENT_MAX_IN_FLIGHT, thread_name_prefix='payment-call')
+_in_flight = threading.BoundedSemaphore(PAYMENT_MAX_IN_FLIGHT)
+
+
+class ResilientPaymentGateway(PaymentGateway):
+    """
+    PaymentGateway decorator adding deadlines and a circuit breaker.
+    """
+
+    def __init__(self, gateway: PaymentGateway, timeout: float = PAYMENT_TIMEOUT,
+                 breaker: Optional[CircuitBreaker] = None):
+        """
+        Args:
+            gateway: Gateway to wrap (any object with the PaymentGateway methods)
+            timeout: Per-call deadline in seconds
+            breaker: Circuit breaker to use; share one per provider
+        """
+        self.gateway = gateway
+        self.timeout = timeout
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+
+    def _call(self, method: str, *args):
+        if not self.breaker.allow():
+            raise CircuitOpenError("Payment provider unavailable (circuit open)")
+        if not _in_flight.acquire(blocking=False):
+            self.breaker.record_failure(method)
+            raise PaymentNotSent("Payment provider busy: too many calls in flight")
+
+        started = time.perf_counter()
+
+        def run():
+            try:
+                return getattr(self.gateway, method)(*args)
+            finally:
+                _in_flight.release()
+
+        try:
+            future = _executor.submit(run)
+        except BaseException:
+            _in_flight.release()
+            raise
+        try:
+            result = future.result(timeout=self.timeout)
+        except FutureTimeout:
+            self.breaker.record_failure(method)
+            error = PaymentOutcomeUnknown if method in MONEY_MOVING_METHODS else PaymentGatewayTimeout
+            raise error(f"Payment provider did not answer within {self.timeout:.1f}s")
+        except Exception:
+            self.breaker.record_failure(method)
+            raise
+        finally:
+            self.breaker.observe(method, time.perf_counter() - started)
+        self.breaker.record_success()
+        return result
+
+    def process_payment(self, patron_id: str, amount: float, description: str = "") -> Tuple[bool, str, str]:
+        """Process a payment within the deadline, unless the circuit is open."""
+        return self._call('process_payment', patron_id, amount, description)
+
+    def refund_payment(self, transaction_id: str, amount: float) -> Tuple[bool, str]:
+        """Refund a payment within the deadline, unless the circuit is open."""
+        return self._call('refund_payment', transaction_id, amount)
+
+    def verify_payment_status(self, transaction_id: str) -> Dict:
+        """Check a transaction within the deadline, unless the circuit is open."""
+        # A wrapped gateway without status checks is not a provider failure,
+        # so don't let it trip the breaker shared with charges
+        if not callable(getattr(self.gateway, 'verify_payment_status', None)):
+            raise NotImplementedError(f"{type(self.gateway).__name__} does not support status checks")
+        return self._call('verify_payment_status', transaction_id)
@@ -13,40 +13,73 @@ import requests
 # Add parent directory to path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from database import init_database, add_sample_data, DATABASE
+import database
+from database import init_database, add_sample_data, close_pool, book_cache, set_database, copy_database
 from app import create_app
+from routes.catalog_routes import row_cache
+
+# Built once per test process (so once per pytest-xdist worker); in-memory
+# databases are private to their process, so workers never share one
+TEMPLATE_DATABASE = 'file:library-template?mode=memory&cache=shared'
+TEST_DATABASE = 'file:library-test?mode=memory&cache=shared'
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        "markers",
+        "file_database: run the test against a database file instead of the in-memory "
+        "database (needed for WAL, concurrent writers or fork)"
+    )
+
+
+def _uses_file_database(request) -> bool:
+    return (os.environ.get('LIBRARY_TEST_DATABASE') == 'file'
+            or request.node.get_closest_marker('file_database') is not None
+            or 'flask_app_server' in request.fixturenames)
+
+
+@pytest.fixture(scope="session")
+def template_database():
+    """
+    Migrated database with the sample data, built once and cloned for every test.
+    """
+    previous = database.DATABASE
+    set_database(TEMPLATE_DATABASE)
+    init_database()
+    add_sample_data()
+    set_database(previous)
+    return TEMPLATE_DATABASE
+
 
 @pytest.fixture(scope="function", autouse=True)
-def setup_test_database():
+def setup_test_database(request, template_database, tmp_path_factory):
     """
     Setup a fresh database for each test function.
     This ensures test isolation and prevents tests from interfering with each other.
-    """
-    # Remove existing database if it exists
-    try:
-        if os.path.exists(DATABASE):
-            os.remove(DATABASE)
-    except (OSError, PermissionError):
-        # If file is locked, wait a moment and try again
-        time.sleep(0.1)
-        if os.path.exists(DATABASE):
-            os.remove(DATABASE)
     
-    # Initialize fresh database with schema
-    init_database()
+    The template is copied with SQLite's backup API into a shared in-memory
+    database, or into a file in this worker's temporary directory for tests
+    marked file_database (LIBRARY_TEST_DATABASE=file: every test).
+    """
+    # Drop cached book rows / rendered rows from the previous test's database
+    book_cache.clear()
+    row_cache.clear()
     
-    # Add sample data
-    add_sample_data()
+    if _uses_file_database(request):
+        path = str(tmp_path_factory.getbasetemp() / 'library.db')
+        set_database(path)
+        for stale in (path, path + '-wal', path + '-shm'):
+            if os.path.exists(stale):
+                os.remove(stale)
+    else:
+        path = TEST_DATABASE
+        set_database(path)
+    copy_database(template_database, path)
     
     yield
     
     # Cleanup after test
-    try:
-        if os.path.exists(DATABASE):
-            os.remove(DATABASE)
-    except (OSError, PermissionError):
-        # File might be locked, ignore cleanup errors
-        pass
+    close_pool()
 
 
 @pytest.fixture(scope="function")
@@ -99,4 +132,18 @@ def flask_app_server():
     
     yield base_url
     
-    # Server will be killed when thread exits (daemon thread)
\ No newline at end of file
+    # Server will be killed when thread exits (daemon thread)
+
+
+@pytest.fixture(scope="function")
+def payment_stub_server():
+    """
+    Start the local payment provider stub on a free port.
+    Yields the PaymentStubServer; its base URL is stub.base_url.
+    """
+    from services.payment_stub_server import PaymentStubServer
+    
+    stub = PaymentStubServer()
+    stub.base_url = stub.start()
+    yield stub
+    stub.stop()
@@ -0,0 +1,119 @@
+"""
+Tests for AsyncPaymentGateway against the local payment provider stub.
+"""
+
+import pytest
+import sys
+import os
+import asyncio
+import gc
+import warnings
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.async_payment_gateway import AsyncPaymentGateway
+from services.payment_gateway import PaymentGateway, PaymentGatewayError, PaymentGatewayTimeout
+from services.library_service import pay_late_fees, refund_late_fee_payment
+
+
+@pytest.fixture
+def gateway(payment_stub_server):
+    gateway = AsyncPaymentGateway(base_url=payment_stub_server.base_url, timeout=2.0)
+    yield gateway
+    gateway.close()
+
+
+class TestAsyncPaymentGateway:
+    """Blocking interface and async API of AsyncPaymentGateway."""
+
+    def test_implements_payment_gateway_interface(self, gateway):
+        """The client is a drop-in PaymentGateway."""
+        assert isinstance(gateway, PaymentGateway)
+
+    def test_process_refund_and_verify(self, gateway):
+        """A charge can be made, looked up and refunded through the sync interface."""
+        success, transaction_id, message = gateway.process_payment("123456", 6.50, "Late fees")
+        assert success is True
+        assert transaction_id.startswith("txn_123456_")
+        assert "$6.50" in message
+
+        assert gateway.verify_payment_status(transaction_id)["status"] == "completed"
+
+        success, message = gateway.refund_payment(transaction_id, 6.50)
+        assert success is True
+        assert "Refund ID" in message
+        assert gateway.verify_payment_status(transaction_id)["status"] == "refunded"
+
+    def test_declined_payment_returns_failure(self, gateway):
+        """Business declines come back as (False, '', message), not exceptions."""
+        success, transaction_id, message = gateway.process_payment("123456", 5000.00, "Too much")
+
+        assert success is False
+        assert transaction_id == ""
+        assert "exceeds limit" in message
+
+    def test_unknown_transaction(self, gateway):
+        """Verifying an unknown transaction reports not_found."""
+        assert gateway.verify_payment_status("txn_missing")["status"] == "not_found"
+
+    def test_timeout_raises(self, payment_stub_server):
+        """A provider slower than the timeout raises PaymentGatewayTimeout."""
+        payment_stub_server.latency = 0.5
+        with AsyncPaymentGateway(base_url=payment_stub_server.base_url, timeout=0.05) as gateway:
+            with pytest.raises(PaymentGatewayTimeout):
+                gateway.process_payment("123456", 5.00, "Late fees")
+
+    def test_unreachable_provider_raises(self):
+        """Connection failures raise PaymentGatewayError."""
+        with AsyncPaymentGateway(base_url="http://127.0.0.1:9", timeout=1.0) as gateway:
+            with pytest.raises(PaymentGatewayError):
+                gateway.process_payment("123456", 5.00, "Late fees")
+
+    def test_concurrency_is_bounded(self, payment_stub_server):
+        """No more than max_concurrency calls reach the provider at once."""
+        payment_stub_server.latency = 0.05
+        gateway = AsyncPaymentGateway(base_url=payment_stub_server.base_url, max_concurrency=3)
+
+        async def pay_many():
+            async with gateway:
+                return await asyncio.gather(*[
+                    gateway.process_payment_async(f"{100000 + i}", 1.00, "Late fees")
+                    for i in range(12)
+                ])
+
+        results = asyncio.run(pay_many())
+
+        assert all(success for success, _, _ in results)
+        assert payment_stub_server.max_in_flight == 3
+
+    def test_sessions_are_kept_and_closed_per_event_loop(self, payment_stub_server):
+        """Using the gateway from another event loop neither replaces nor leaks the background session."""
+        gateway = AsyncPaymentGateway(base_url=payment_stub_server.base_url)
+
+        async def pay():
+            async with gateway:
+                return await gateway.process_payment_async("654321", 1.00, "Late fees")
+
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            assert gateway.process_payment("123456", 1.00, "Late fees")[0] is True
+            assert asyncio.run(pay())[0] is True
+            assert gateway.process_payment("123456", 1.00, "Late fees")[0] is True
+            gateway.close()
+            gc.collect()
+
+        assert [str(w.message) for w in caught if 'Unclosed' in str(w.message)] == []
+
+    def test_pay_and_refund_late_fees_end_to_end(self, gateway, mocker):
+        """pay_late_fees and refund_late_fee_payment work with the async client."""
+        mocker.patch(
+            'services.library_service.calculate_late_fee_for_book',
+            return_value={'fee_amount': 3.50, 'days_overdue': 7, 'status': 'Overdue'}
+        )
+
+        success, message, transaction_id = pay_late_fees("123456", 3, gateway)
+        assert success is True
+        assert transaction_id.startswith("txn_")
+
+        success, message = refund_late_fee_payment(transaction_id, 3.50, gateway)
+        assert success is True
@@ -0,0 +1,84 @@
+import pytest
+import sys
+import os
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from cache import LRUCache
+from services.library_service import borrow_book_by_patron, return_book_by_patron
+from database import (
+    get_book_by_id, get_book_by_isbn, insert_book, update_book_availability,
+    get_book_cache_stats, configure_book_cache, get_pool_stats
+)
+
+def test_lru_evicts_least_recently_used():
+    """Test that the oldest untouched entry is evicted when full."""
+    cache = LRUCache(max_size=2, ttl=None)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.stats()['evictions'] == 1
+
+def test_lru_entries_expire():
+    """Test that entries older than the TTL are misses."""
+    cache = LRUCache(max_size=10, ttl=0.01)
+    cache.set('a', 1)
+    time.sleep(0.02)
+
+    assert cache.get('a') is None
+    assert cache.stats()['expirations'] == 1
+
+def test_repeated_lookups_hit_cache():
+    """Test that repeated book lookups by id and ISBN skip the database."""
+    book = get_book_by_id(1)
+    connections = get_pool_stats()['hits'] + get_pool_stats()['misses']
+    hits = get_book_cache_stats()['hits']
+
+    assert get_book_by_id(1) == book
+    assert get_book_by_isbn(book['isbn']) == book
+    assert get_pool_stats()['hits'] + get_pool_stats()['misses'] == connections
+    assert get_book_cache_stats()['hits'] == hits + 2
+
+def test_cached_rows_are_copies():
+    """Test that modifying a returned book does not change the cache."""
+    get_book_by_id(1)['title'] = 'Changed'
+
+    assert get_book_by_id(1)['title'] == 'The Great Gatsby'
+
+def test_borrow_and_return_invalidate_book():
+    """Test that availability seen through the cache follows borrows and returns."""
+    copies = get_book_by_id(2)['available_copies']
+
+    borrow_book_by_patron("777777", 2)
+    assert get_book_by_id(2)['available_copies'] == copies - 1
+
+    return_book_by_patron("777777", 2)
+    assert get_book_by_id(2)['available_copies'] == copies
+
+def test_update_availability_invalidates_book():
+    """Test that update_book_availability invalidates the id and ISBN entries."""
+    isbn = get_book_by_id(1)['isbn']
+    update_book_availability(1, 1)
+
+    assert get_book_by_isbn(isbn)['available_copies'] == get_book_by_id(1)['available_copies']
+    assert get_book_by_id(1)['available_copies'] == 2
+
+def test_insert_after_miss_is_visible():
+    """Test that a book inserted after a failed lookup is found."""
+    assert get_book_by_isbn("8888888888888") is None
+    insert_book("Cached Later", "Author", "8888888888888", 1, 1)
+
+    assert get_book_by_isbn("8888888888888")['title'] == "Cached Later"
+
+def test_cache_can_be_disabled():
+    """Test the switch that turns the cache off."""
+    configure_book_cache(enabled=False)
+    try:
+        get_book_by_id(1)
+        get_book_by_id(1)
+        assert get_book_cache_stats()['size'] == 0
+    finally:
+        configure_book_cache(enabled=True)
@@ -0,0 +1,52 @@
+import pytest
+import sys
+import os
+import csv
+import gzip
+import io
+import json
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app import create_app
+from database import get_all_books, get_pool_stats
+from services.catalog_export import iter_catalog_export
+
+@pytest.fixture
+def client():
+    return create_app().test_client()
+
+def test_ndjson_export_contains_every_book(client):
+    """Test that the default NDJSON export has one JSON object per book."""
+    response = client.get('/api/catalog/export')
+
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert sorted(row['isbn'] for row in rows) == sorted(book['isbn'] for book in get_all_books())
+
+def test_csv_export_has_header_and_rows(client):
+    """Test that the CSV export parses back to the catalog."""
+    response = client.get('/api/catalog/export?format=csv')
+
+    assert response.status_code == 200
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert len(rows) == len(get_all_books())
+    assert rows[0]['title'] == 'The Great Gatsby'
+
+def test_gzip_export_when_requested(client):
+    """Test that the export is gzip-compressed for clients that accept it."""
+    response = client.get('/api/catalog/export', headers={'Accept-Encoding': 'gzip'})
+
+    assert response.headers['Content-Encoding'] == 'gzip'
+    lines = gzip.decompress(response.get_data()).decode('utf-8').splitlines()
+    assert len(lines) == len(get_all_books())
+
+def test_unknown_format_rejected(client):
+    """Test that an unsupported format returns 400."""
+    assert client.get('/api/catalog/export?format=xml').status_code == 400
+
+def test_export_streams_in_batches():
+    """Test that the export yields one chunk per batch and releases its connection."""
+    chunks = list(iter_catalog_export('ndjson', batch_size=1))
+
+    assert len(chunks) == len(get_all_books())
+    assert get_pool_stats()['in_use'] == 0
@@ -0,0 +1,58 @@
+import pytest
+import sys
+import os
+import io
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app import create_app
+from database import get_book_by_isbn, get_all_books
+from services.catalog_import import import_books
+
+FEED = """title,author,isbn,total_copies
+Bulk Book One,Bulk Author,1000000000001,2
+Bulk Book Two,Bulk Author,1000000000002,1
+,Missing Title,1000000000003,1
+Bad Copies,Bulk Author,1000000000004,many
+Repeat,Bulk Author,1000000000001,1
+Existing Gatsby,F. Scott Fitzgerald,9780743273565,1
+Bulk Book Three,Bulk Author,1000000000005,3
+"""
+
+def test_import_inserts_valid_rows_and_reports_errors():
+    """Test that valid rows are inserted and every bad row is reported with its line."""
+    before = len(get_all_books())
+    report = import_books(io.StringIO(FEED), chunk_size=3)
+
+    assert report['rows'] == 7
+    assert report['inserted'] == 3
+    assert report['invalid'] == 2
+    assert report['duplicates'] == 2
+    assert [error['line'] for error in report['errors']] == [4, 5, 6, 7]
+    assert len(get_all_books()) == before + 3
+
+    book = get_book_by_isbn("1000000000001")
+    assert book['title'] == "Bulk Book One"
+    assert book['available_copies'] == 2
+
+def test_import_is_idempotent():
+    """Test that re-importing the same feed only reports duplicates."""
+    import_books(io.StringIO(FEED))
+    report = import_books(io.StringIO(FEED))
+
+    assert report['inserted'] == 0
+    assert report['duplicates'] == 5
+
+def test_import_requires_columns():
+    """Test that a feed without the required header is rejected."""
+    with pytest.raises(ValueError):
+        import_books(io.StringIO("name,isbn\nx,1\n"))
+
+def test_import_books_cli(tmp_path):
+    """Test the import-books CLI command."""
+    feed = tmp_path / "feed.csv"
+    feed.write_text(FEED)
+
+    result = create_app().test_cli_runner().invoke(args=['import-books', str(feed)])
+
+    assert result.exit_code == 0
+    assert "3 inserted" in result.output
+    assert get_book_by_isbn("1000000000005") is not None
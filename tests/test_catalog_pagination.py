@@ -0,0 +1,59 @@
+import pytest
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app import create_app
+from database import get_all_books, get_books_page, insert_book
+from routes.catalog_routes import encode_cursor, decode_cursor
+
+@pytest.fixture
+def many_books():
+    """Add books, several sharing a title, on top of the sample data."""
+    for i in range(12):
+        insert_book(f"Paged Title {i // 3}", "Paged Author", f"{5000000000000 + i}", 1, 1)
+    return get_all_books()
+
+def test_forward_pages_cover_catalog_once(many_books):
+    """Test that following next cursors visits every book exactly once, in order."""
+    seen = []
+    page = get_books_page(4)
+    while True:
+        seen.extend(book['id'] for book in page['books'])
+        if page['next_cursor'] is None:
+            break
+        page = get_books_page(4, after=page['next_cursor'])
+
+    assert seen == [book['id'] for book in many_books]
+
+def test_backward_pages_mirror_forward_pages(many_books):
+    """Test that a previous cursor returns the page before."""
+    first = get_books_page(4)
+    second = get_books_page(4, after=first['next_cursor'])
+    back = get_books_page(4, before=second['prev_cursor'])
+
+    assert first['prev_cursor'] is None
+    assert back['books'] == first['books']
+    assert back['prev_cursor'] is None
+    assert back['next_cursor'] == first['next_cursor']
+
+def test_cursor_round_trip():
+    """Test that cursors survive encoding and bad tokens are ignored."""
+    assert decode_cursor(encode_cursor(("Title, with \"quotes\"", 42))) == ("Title, with \"quotes\"", 42)
+    assert decode_cursor("not-a-cursor") is None
+    assert decode_cursor(None) is None
+
+def test_catalog_route_links_pages(many_books):
+    """Test that /catalog renders one page with a working Next link."""
+    client = create_app().test_client()
+
+    response = client.get('/catalog?per_page=5')
+    html = response.get_data(as_text=True)
+    assert response.status_code == 200
+    assert html.count('<tr>') == 6  # header + 5 rows
+    assert 'Next' in html and 'Previous' not in html
+
+    last = many_books[4]
+    response = client.get(f"/catalog?per_page=5&after={encode_cursor((last['title'], last['id']))}")
+    html = response.get_data(as_text=True)
+    assert many_books[5]['isbn'] in html
+    assert 'Previous' in html
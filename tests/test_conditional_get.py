@@ -0,0 +1,138 @@
+import pytest
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import database
+from app import create_app
+from database import (
+    get_catalog_version, insert_book, update_book_availability, insert_books_bulk, database_path,
+    copy_database, set_database, get_db_connection
+)
+
+@pytest.fixture
+def client():
+    app = create_app()
+    app.config['TESTING'] = True
+    return app.test_client()
+
+@pytest.mark.parametrize('url', ['/catalog', '/search?q=gatsby&type=title', '/api/search?q=gatsby'])
+def test_unchanged_page_returns_304(client, url, mocker):
+    """Test that a matching If-None-Match is answered with 304 without running the view."""
+    first = client.get(url)
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+    assert etag.startswith('W/')
+    assert first.headers['Cache-Control'] == 'no-cache'
+
+    get_connection = mocker.patch('database.get_db_connection')
+    render = mocker.patch('flask.templating._render')
+    second = client.get(url, headers={'If-None-Match': etag})
+
+    assert second.status_code == 304
+    assert second.data == b''
+    assert second.headers['ETag'] == etag
+    get_connection.assert_not_called()
+    render.assert_not_called()
+
+@pytest.mark.parametrize('write', [
+    lambda: insert_book("Conditional Book", "Author", "7000000000001", 1, 1),
+    lambda: update_book_availability(1, -1),
+    lambda: insert_books_bulk([("Bulk Conditional", "Author", "7000000000002", 1, 1)]),
+])
+def test_catalog_write_changes_etag(client, write):
+    """Test that writes to books change the ETag so the next request gets a fresh page."""
+    etag = client.get('/catalog').headers['ETag']
+
+    write()
+    response = client.get('/catalog', headers={'If-None-Match': etag})
+
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+def test_borrow_changes_catalog_version(client):
+    """Test that borrowing through the web interface changes the catalog version."""
+    before = get_catalog_version()
+    client.post('/borrow', data={'patron_id': '654321', 'book_id': '2'})
+    assert get_catalog_version() != before
+
+def test_flash_messages_bypass_304(client):
+    """Test that a page carrying a flash message is rendered even if the ETag matches."""
+    etag = client.get('/catalog').headers['ETag']
+    with client.session_transaction() as session:
+        session['_flashes'] = [('success', 'Book added')]
+
+    response = client.get('/catalog', headers={'If-None-Match': etag})
+
+    assert response.status_code == 200
+    assert b'Book added' in response.data
+    assert 'ETag' not in response.headers
+
+def test_error_responses_are_not_tagged(client):
+    """Test that error responses carry no ETag."""
+    response = client.get('/api/search')
+    assert response.status_code == 400
+    assert 'ETag' not in response.headers
+
+def test_etag_starts_with_configured_build_id():
+    """Test that the deploy's build id, not a per-process value, prefixes the ETag."""
+    client = create_app({'BUILD_ID': 'deploy42'}).test_client()
+
+    assert client.get('/catalog').headers['ETag'].startswith('W/"deploy42-')
+
+def test_database_path_resolves_uris():
+    """Test that file: URIs are resolved to the file whose stat() versions the catalog."""
+    assert database_path('library.db') == 'library.db'
+    assert database_path('file:/srv/my%20library.db?mode=rw') == '/srv/my library.db'
+    assert database_path('file:library.db?cache=shared') == 'library.db'
+    assert database_path(':memory:') is None
+
+@pytest.mark.file_database
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason="requires os.fork")
+def test_catalog_version_shared_across_processes(tmp_path, monkeypatch):
+    """Test that worker processes agree on the version and see each other's writes."""
+    monkeypatch.setattr(database, 'DATABASE', database.DATABASE)
+    path = str(tmp_path / 'shared.db')
+    copy_database(database.DATABASE, path)
+    set_database(f'file:{path}?mode=rw')
+    before = get_catalog_version()
+    assert not before.startswith('m')
+
+    read_end, write_end = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os.write(write_end, get_catalog_version().encode())
+            insert_book("Written By Another Worker", "Author", "7000000000003", 1, 1)
+        finally:
+            os._exit(0)
+    os.waitpid(pid, 0)
+    os.close(write_end)
+    seen_by_child = os.read(read_end, 1024).decode()
+    os.close(read_end)
+
+    assert seen_by_child == before
+    assert get_catalog_version() != before
+
+@pytest.mark.file_database
+def test_catalog_version_changes_when_file_stats_do_not(tmp_path, monkeypatch):
+    """Test that a write changes the version even if the database and WAL files look unchanged."""
+    monkeypatch.setattr(database, 'DATABASE', database.DATABASE)
+    path = str(tmp_path / 'stats.db')
+    copy_database(database.DATABASE, path)
+    set_database(path)
+    update_book_availability(1, -1)
+    conn = get_db_connection()
+    conn.execute('PRAGMA wal_checkpoint(RESTART)')
+    conn.close()
+
+    def file_stats():
+        return [(os.stat(f).st_mtime_ns, os.stat(f).st_size) for f in (path, path + '-wal')]
+
+    stats = file_stats()
+    before = get_catalog_version()
+    update_book_availability(1, 1)  # Rewrites the same WAL frames after the restart
+    for file, (mtime_ns, _) in zip((path, path + '-wal'), stats):
+        os.utime(file, ns=(mtime_ns, mtime_ns))
+
+    assert file_stats() == stats
+    assert get_catalog_version() != before
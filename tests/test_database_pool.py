@@ -0,0 +1,240 @@
+import pytest
+import sys
+import os
+import threading
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import database
+from database import (
+    get_db_connection, get_pool_stats, close_pool, get_book_by_id,
+    set_db_profile, ConnectionPool, set_database, copy_database, release_memory_database,
+    is_memory_database, MEMORY_DATABASE
+)
+
+def test_released_connection_is_reused():
+    """Test that a closed connection goes back to the pool and is handed out again."""
+    conn = get_db_connection()
+    conn.close()
+    before = get_pool_stats()
+
+    again = get_db_connection()
+    again.close()
+    after = get_pool_stats()
+
+    assert again is conn
+    assert after['hits'] == before['hits'] + 1
+    assert after['misses'] == before['misses']
+
+def test_helpers_reuse_pooled_connection():
+    """Test that repeated helper calls do not open new connections."""
+    get_book_by_id(1)
+    misses = get_pool_stats()['misses']
+
+    for _ in range(10):
+        get_book_by_id(1)
+
+    assert get_pool_stats()['misses'] == misses
+
+def test_nested_acquire_returns_same_connection():
+    """Test that a thread holding a connection gets the same one back."""
+    outer = get_db_connection()
+    inner = get_db_connection()
+    assert inner is outer
+    inner.close()
+
+    # Outer connection must still be usable after the inner close
+    assert outer.execute('SELECT 1').fetchone()[0] == 1
+    outer.close()
+    assert get_pool_stats()['in_use'] == 0
+
+def test_threads_get_distinct_connections():
+    """Test that concurrent threads never share a connection."""
+    held = []
+    barrier = threading.Barrier(3)
+
+    def worker():
+        conn = get_db_connection()
+        held.append(conn)
+        barrier.wait()
+        conn.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(set(id(c) for c in held)) == 3
+
+def test_uncommitted_work_is_rolled_back_on_release():
+    """Test that releasing a connection discards an open transaction."""
+    conn = get_db_connection()
+    conn.execute('UPDATE books SET available_copies = 99 WHERE id = 1')
+    conn.close()
+
+    assert get_book_by_id(1)['available_copies'] != 99
+
+def test_unhealthy_idle_connection_is_replaced(tmp_path):
+    """Test that a broken idle connection fails the health check and is discarded."""
+    pool = ConnectionPool(str(tmp_path / 'pool.db'), size=2)
+    conn = pool.acquire()
+    pool.release(conn)
+    conn.close_for_real()  # Simulate a dead handle sitting in the pool
+
+    fresh = pool.acquire()
+    pool.release(fresh)
+
+    assert fresh is not conn
+    assert pool.stats()['health_check_failures'] == 1
+    pool.close_all()
+
+def test_pool_keeps_at_most_size_idle_connections(tmp_path):
+    """Test that overflow connections are closed when released."""
+    pool = ConnectionPool(str(tmp_path / 'pool.db'), size=1)
+    conns = []
+    barrier = threading.Barrier(3)
+
+    def worker():
+        conn = pool.acquire()
+        conns.append(conn)
+        barrier.wait()
+        pool.release(conn)
+
+    threads = [threading.Thread(target=worker) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    stats = pool.stats()
+    assert stats['idle'] == 1
+    assert stats['discarded'] == 2
+    pool.close_all()
+
+def test_close_pool_starts_fresh_pool():
+    """Test that close_pool drops idle connections."""
+    conn = get_db_connection()
+    conn.close()
+    close_pool()
+
+    assert get_pool_stats()['idle'] == 0
+
+@pytest.mark.file_database
+def test_default_profile_enables_wal():
+    """Test that new connections run in WAL mode with the durable profile."""
+    conn = get_db_connection()
+    journal_mode = conn.execute('PRAGMA journal_mode').fetchone()[0]
+    synchronous = conn.execute('PRAGMA synchronous').fetchone()[0]
+    conn.close()
+
+    assert journal_mode == 'wal'
+    assert synchronous == 2  # FULL
+
+def test_throughput_profile_is_applied_to_new_connections(monkeypatch):
+    """Test that switching profiles reconfigures pooled connections."""
+    monkeypatch.setattr(database, 'DB_PROFILE', database.DB_PROFILE)
+    set_db_profile('throughput')
+
+    conn = get_db_connection()
+    synchronous = conn.execute('PRAGMA synchronous').fetchone()[0]
+    temp_store = conn.execute('PRAGMA temp_store').fetchone()[0]
+    conn.close()
+    close_pool()
+
+    assert synchronous == 1  # NORMAL
+    assert temp_store == 2  # MEMORY
+
+def test_unknown_profile_is_rejected():
+    """Test that an unknown profile name raises ValueError."""
+    with pytest.raises(ValueError):
+        set_db_profile('turbo')
+
+@pytest.mark.file_database
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason="requires os.fork")
+def test_forked_worker_opens_its_own_connections():
+    """Test that a child process never reuses or closes the parent's pooled connections."""
+    conn = get_db_connection()
+    conn.close()
+    parent_pool = database.get_pool()
+    read_end, write_end = os.pipe()
+
+    pid = os.fork()
+    if pid == 0:
+        try:
+            child = get_db_connection()
+            ok = database.get_pool() is not parent_pool and child is not conn
+            ok = ok and child.execute('SELECT COUNT(*) FROM books').fetchone()[0] == 3
+            child.close()
+            close_pool()
+            os.write(write_end, b'1' if ok else b'0')
+        finally:
+            os._exit(0)
+
+    os.close(write_end)
+    os.waitpid(pid, 0)
+    assert os.read(read_end, 1) == b'1'
+    os.close(read_end)
+
+    # The parent's pool and connection are untouched
+    assert database.get_pool() is parent_pool
+    again = get_db_connection()
+    assert again is conn
+    assert again.execute('SELECT COUNT(*) FROM books').fetchone()[0] == 3
+    again.close()
+
+def test_memory_database_survives_closing_the_pool(monkeypatch):
+    """Test that a shared in-memory database keeps its data while connections come and go."""
+    monkeypatch.setattr(database, 'DATABASE', database.DATABASE)
+    memory = 'file:survives-closing?mode=memory&cache=shared'
+    copy_database(database.DATABASE, memory)
+    set_database(memory)
+    try:
+        assert is_memory_database(database.DATABASE)
+        conn = get_db_connection()
+        conn.execute("UPDATE books SET total_copies = 7 WHERE id = 1")
+        conn.commit()
+        conn.close()
+
+        close_pool()
+
+        assert get_book_by_id(1)['total_copies'] == 7
+    finally:
+        close_pool()
+        release_memory_database(memory)
+
+def test_memory_shorthand_selects_shared_memory_database(monkeypatch):
+    """Test that ':memory:' is shared by all pooled connections, unlike plain sqlite3."""
+    monkeypatch.setattr(database, 'DATABASE', database.DATABASE)
+    set_database(':memory:')
+    try:
+        assert database.DATABASE == MEMORY_DATABASE
+        first = get_db_connection()
+        first.execute('CREATE TABLE t (x)')
+        first.commit()
+
+        seen = []
+
+        def worker():
+            other = get_db_connection()
+            seen.append(other.execute("SELECT name FROM sqlite_master WHERE name = 't'").fetchone())
+            other.close()
+
+        thread = threading.Thread(target=worker)
+        thread.start()
+        thread.join()
+        first.close()
+    finally:
+        close_pool()
+        release_memory_database(MEMORY_DATABASE)
+
+    assert seen[0] is not None
+
+def test_copy_database_clones_into_a_file(tmp_path, monkeypatch):
+    """Test that the backup API copies the current database into a file."""
+    monkeypatch.setattr(database, 'DATABASE', database.DATABASE)
+    path = str(tmp_path / 'copy.db')
+
+    copy_database(database.DATABASE, path)
+    set_database(path)
+
+    assert get_book_by_id(2)['title'] == "To Kill a Mockingbird"
+    assert os.path.getsize(path) > 0
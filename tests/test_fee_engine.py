@@ -0,0 +1,50 @@
+import pytest
+import sys
+import os
+from datetime import datetime, timedelta
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from services import fee_engine
+
+AS_OF = datetime(2025, 3, 1, 12, 0, 0)
+
+@pytest.mark.parametrize("days, expected", [
+    (0, 0.0), (1, 0.50), (7, 3.50), (8, 4.50), (18, 14.50), (19, 15.00), (365, 15.00)
+])
+def test_late_fee_tiers(days, expected):
+    """Test the $0.50 / $1.00 tiers and the $15.00 cap."""
+    assert fee_engine.late_fee_for_days(days) == expected
+
+def test_scalar_late_fee_counts_whole_days():
+    """Test that partial days are not charged and early returns are free."""
+    assert fee_engine.late_fee(AS_OF - timedelta(days=3, hours=5), AS_OF) == (3, 1.50)
+    assert fee_engine.late_fee(AS_OF - timedelta(hours=5), AS_OF) == (0, 0.0)
+    assert fee_engine.late_fee(AS_OF + timedelta(days=2), AS_OF) == (0, 0.0)
+
+def test_vectorized_matches_scalar():
+    """Test that the batch engine agrees with the scalar path loan for loan."""
+    pytest.importorskip("numpy")
+    due_dates = [AS_OF + timedelta(days=offset, hours=offset % 5) for offset in range(-40, 5)]
+
+    days, fees = fee_engine.assess_late_fees(due_dates, AS_OF)
+
+    expected = [fee_engine.late_fee(due, AS_OF) for due in due_dates]
+    assert list(zip(days.tolist(), fees.tolist())) == expected
+
+def test_vectorized_accepts_iso_strings():
+    """Test that due dates stored as ISO text can be assessed directly."""
+    pytest.importorskip("numpy")
+    due_dates = [(AS_OF - timedelta(days=10)).isoformat(), (AS_OF + timedelta(days=1)).isoformat()]
+
+    days, fees = fee_engine.assess_late_fees(due_dates, AS_OF)
+
+    assert days.tolist() == [10, 0]
+    assert fees.tolist() == [6.50, 0.0]
+
+def test_sql_expression_matches_scalar():
+    """Test that the SQL fee expression follows the same schedule."""
+    import sqlite3
+    conn = sqlite3.connect(':memory:')
+    for days in range(-3, 40):
+        fee = conn.execute(f"SELECT {fee_engine.late_fee_sql('?')}", (days,) * 4).fetchone()[0]
+        assert fee == fee_engine.late_fee_for_days(days), days
+    conn.close()
@@ -0,0 +1,197 @@
+import pytest
+import sys
+import os
+from datetime import datetime, timedelta
+from unittest.mock import Mock
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from services.fine_collection import collect_fines, RateLimiter
+from services.payment_gateway import CircuitOpenError
+from services.payment_service import PaymentGateway
+from services.library_service import pay_late_fees
+from database import get_db_connection, get_outstanding_overdue_fees, plan_collection_run
+
+# collect_fines writes from its worker threads, which the shared-cache
+# in-memory database serializes with "database table is locked" errors
+pytestmark = pytest.mark.file_database
+
+def _add_overdue_loans(patron_ids, days_overdue=10):
+    due = datetime.now() - timedelta(days=days_overdue)
+    conn = get_db_connection()
+    conn.executemany('''
+        INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
+        VALUES (?, 2, ?, ?)
+    ''', [(patron_id, (due - timedelta(days=14)).isoformat(), due.isoformat()) for patron_id in patron_ids])
+    conn.commit()
+    conn.close()
+
+def _ledger(run_id):
+    conn = get_db_connection()
+    rows = conn.execute('SELECT * FROM payments WHERE run_id = ? ORDER BY id', (run_id,)).fetchall()
+    conn.close()
+    return [dict(row) for row in rows]
+
+def _gateway(fail_patrons=()):
+    gateway = Mock(spec=PaymentGateway)
+    def process_payment(patron_id, amount, description=""):
+        if patron_id in fail_patrons:
+            return False, "", "Payment declined"
+        return True, f"txn_{patron_id}", f"Payment of ${amount:.2f} processed successfully"
+    gateway.process_payment.side_effect = process_payment
+    return gateway
+
+def test_outstanding_fees_selects_overdue_open_loans():
+    """Test that only overdue open loans are selected, with fees from the fee engine."""
+    loans = get_outstanding_overdue_fees(datetime.now())
+
+    assert [(loan['patron_id'], loan['book_id']) for loan in loans] == [("123456", 2), ("123456", 3)]
+    assert [loan['outstanding'] for loan in loans] == [0.50, 3.50]
+
+def test_collect_charges_one_payment_per_patron():
+    """Test that a patron's overdue loans are combined into a single charge."""
+    _add_overdue_loans(["222222", "222222", "333333"])
+    gateway = _gateway()
+
+    report = collect_fines(gateway, run_id="run-1", workers=4, rate_limit=None)
+
+    assert report['patrons'] == 3
+    assert report['loans'] == 5
+    assert report['succeeded'] == 3 and report['failed'] == 0
+    assert report['amount_collected'] == pytest.approx(4.00 + 13.00 + 6.50)
+    charged = {call.kwargs['patron_id']: call.kwargs['amount'] for call in gateway.process_payment.call_args_list}
+    assert charged == {"123456": 4.00, "222222": 13.00, "333333": 6.50}
+    assert all(row['status'] == 'succeeded' for row in _ledger("run-1"))
+
+def test_collected_fees_are_not_charged_again():
+    """Test that a new run skips fees already collected by an earlier run."""
+    collect_fines(_gateway(), run_id="run-1", rate_limit=None)
+    gateway = _gateway()
+
+    report = collect_fines(gateway, run_id="run-2", rate_limit=None)
+
+    assert report['patrons'] == 0
+    gateway.process_payment.assert_not_called()
+
+def test_failures_are_recorded_and_retried_on_resume():
+    """Test that failed charges stay outstanding and can be retried in the same run."""
+    _add_overdue_loans(["222222"])
+    report = collect_fines(_gateway(fail_patrons={"222222"}), run_id="run-1", rate_limit=None)
+    assert report['failed'] == 1
+    assert {row['status'] for row in _ledger("run-1") if row['patron_id'] == "222222"} == {'failed'}
+
+    gateway = _gateway()
+    assert collect_fines(gateway, run_id="run-1", rate_limit=None)['patrons'] == 0
+    report = collect_fines(gateway, run_id="run-1", rate_limit=None, retry_failed=True)
+
+    assert report['resumed'] is True
+    assert report['succeeded'] == 1
+    gateway.process_payment.assert_called_once()
+    assert all(row['status'] == 'succeeded' for row in _ledger("run-1"))
+
+def test_resume_charges_only_planned_rows():
+    """Test that resuming a crashed run charges the patrons still planned and plans nothing new."""
+    _add_overdue_loans(["222222"])
+    collect_fines(_gateway(), run_id="run-1", rate_limit=None)
+    conn = get_db_connection()
+    conn.execute("UPDATE payments SET status = 'planned', transaction_id = NULL WHERE patron_id = '222222'")
+    conn.commit()
+    conn.close()
+    _add_overdue_loans(["444444"])
+    gateway = _gateway()
+
+    report = collect_fines(gateway, run_id="run-1", rate_limit=None)
+
+    assert report['resumed'] is True
+    assert [call.kwargs['patron_id'] for call in gateway.process_payment.call_args_list] == ["222222"]
+
+def test_resume_reports_in_flight_rows_without_charging():
+    """Test that rows a crashed run left pending are reported for reconciliation, not resubmitted."""
+    _add_overdue_loans(["222222"])
+    collect_fines(_gateway(), run_id="run-1", rate_limit=None)
+    conn = get_db_connection()
+    conn.execute("UPDATE payments SET status = 'pending', transaction_id = NULL WHERE patron_id = '222222'")
+    conn.commit()
+    conn.close()
+    gateway = _gateway()
+
+    report = collect_fines(gateway, run_id="run-1", rate_limit=None, retry_failed=True)
+
+    assert report['in_flight'] == 1
+    assert report['patrons'] == 0
+    gateway.process_payment.assert_not_called()
+
+def test_planning_a_run_twice_plans_it_once():
+    """Test that the existence check and the inserts of a run share one transaction."""
+    assert plan_collection_run("run-1", datetime.now()) is True
+    assert plan_collection_run("run-1", datetime.now()) is False
+    assert len(_ledger("run-1")) == 2
+
+def test_rows_stay_planned_while_waiting_for_rate_limit(mocker):
+    """Test that rows are only marked pending once the rate limiter lets the charge through."""
+    mocker.patch.object(RateLimiter, 'acquire', side_effect=RuntimeError("terminated"))
+
+    with pytest.raises(RuntimeError):
+        collect_fines(_gateway(), run_id="run-1", rate_limit=1)
+
+    assert {row['status'] for row in _ledger("run-1")} == {'planned'}
+
+def test_abandoned_run_releases_its_fees():
+    """Test that fees planned by a run that never charged them are collected by a later run."""
+    plan_collection_run("fines-2026-10-16", datetime.now())
+    conn = get_db_connection()
+    conn.execute("UPDATE payments SET updated_at = ?", ((datetime.now() - timedelta(days=1)).isoformat(),))
+    conn.commit()
+    conn.close()
+    gateway = _gateway()
+
+    report = collect_fines(gateway, run_id="fines-2026-10-17", rate_limit=None)
+    resumed = collect_fines(gateway, run_id="fines-2026-10-16", rate_limit=None)
+
+    assert report['loans'] == 2
+    assert resumed['patrons'] == 0
+    gateway.process_payment.assert_called_once()
+    assert {row['status'] for row in _ledger("fines-2026-10-16")} == {'released'}
+
+def test_pay_late_fees_reports_scheduled_run():
+    """Test that a fee planned by a collection run is not charged separately."""
+    plan_collection_run("run-1", datetime.now())
+    gateway = _gateway()
+
+    success, message, _ = pay_late_fees("123456", 3, gateway)
+
+    assert success is False
+    assert "scheduled to be charged in collection run run-1" in message
+    gateway.process_payment.assert_not_called()
+
+def test_gateway_exceptions_leave_outcome_unknown():
+    """Test that a gateway error leaves that patron's charge for reconciliation without aborting the run."""
+    gateway = Mock(spec=PaymentGateway)
+    gateway.process_payment.side_effect = ConnectionError("Network timeout")
+
+    report = collect_fines(gateway, run_id="run-1", rate_limit=None)
+
+    assert report['unknown'] == 1
+    assert report['failed'] == 0
+    assert all(row['status'] == 'unknown' for row in _ledger("run-1"))
+    assert all("Network timeout" in row['message'] for row in _ledger("run-1"))
+
+    report = collect_fines(gateway, run_id="run-1", rate_limit=None, retry_failed=True)
+    assert report['in_flight'] == 2
+    gateway.process_payment.assert_called_once()
+
+def test_rejected_charges_are_marked_failed():
+    """Test that a charge rejected before reaching the provider can be retried."""
+    gateway = Mock(spec=PaymentGateway)
+    gateway.process_payment.side_effect = CircuitOpenError("circuit open")
+
+    report = collect_fines(gateway, run_id="run-1", rate_limit=None)
+
+    assert report['failed'] == 1
+    assert all(row['status'] == 'failed' for row in _ledger("run-1"))
+
+def test_rate_limiter_spaces_calls():
+    """Test that the token bucket allows about `rate` acquisitions per second."""
+    limiter = RateLimiter(rate=50, burst=1)
+    start = datetime.now()
+    for _ in range(6):
+        limiter.acquire()
+    assert (datetime.now() - start).total_seconds() >= 0.09
@@ -0,0 +1,160 @@
+import json
+import pytest
+import sys
+import os
+from unittest.mock import Mock
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import metrics
+from app import create_app
+from services.library_service import payment_breaker
+from services.payment_gateway import PaymentGateway
+from services.resilient_gateway import ResilientPaymentGateway
+
+@pytest.fixture(autouse=True)
+def fresh_metrics(monkeypatch):
+    """Start every test with no recorded requests and a single-process setup."""
+    monkeypatch.setattr(metrics, 'METRICS_DIR', None)
+    metrics.reset()
+    yield
+    metrics.reset()
+
+@pytest.fixture
+def client():
+    app = create_app({'TESTING': True})
+    return app.test_client()
+
+def _samples(text):
+    """Parse exposition text into {sample: value}, skipping comments."""
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith('#'):
+            sample, value = line.rsplit(' ', 1)
+            samples[sample] = float(value)
+    return samples
+
+def test_metrics_endpoint_uses_text_exposition_format(client):
+    """Test that /metrics declares every family with HELP and TYPE lines."""
+    response = client.get('/metrics')
+
+    assert response.status_code == 200
+    assert response.content_type == metrics.CONTENT_TYPE
+    text = response.get_data(as_text=True)
+    for family, (kind, _) in metrics.FAMILIES.items():
+        assert f'# TYPE {family} {kind}' in text
+
+def test_requests_counted_per_blueprint_endpoint(client):
+    """Test request counters and latency histograms for each blueprint."""
+    client.get('/catalog')
+    client.get('/catalog')
+    client.get('/search?q=gatsby&type=title')
+    client.post('/borrow', data={'patron_id': '654321', 'book_id': '2'})
+    client.get('/api/late_fee/123456/3')
+
+    samples = _samples(client.get('/metrics').get_data(as_text=True))
+
+    assert samples['library_http_requests_total{blueprint="catalog",endpoint="catalog.catalog",'
+                   'method="GET",status="200"}'] == 2
+    assert samples['library_http_requests_total{blueprint="search",endpoint="search.search_books",'
+                   'method="GET",status="200"}'] == 1
+    assert samples['library_http_requests_total{blueprint="borrowing",endpoint="borrowing.borrow_book",'
+                   'method="POST",status="302"}'] == 1
+    assert samples['library_http_requests_total{blueprint="api",endpoint="api.get_late_fee",'
+                   'method="GET",status="200"}'] == 1
+    assert samples['library_http_request_duration_seconds_count{blueprint="catalog",'
+                   'endpoint="catalog.catalog"}'] == 2
+    assert samples['library_http_request_duration_seconds_bucket{blueprint="catalog",'
+                   'endpoint="catalog.catalog",le="+Inf"}'] == 2
+
+def test_db_queries_per_request_recorded_with_query_stats():
+    """Test that per-request query counts are recorded while query statistics are on."""
+    from database import configure_query_stats
+    client = create_app({'TESTING': True, 'QUERY_STATS': True}).test_client()
+    try:
+        client.get('/catalog')
+        samples = _samples(client.get('/metrics').get_data(as_text=True))
+    finally:
+        configure_query_stats(enabled=False)
+
+    assert samples['library_db_queries_per_request_count{blueprint="catalog",endpoint="catalog.catalog"}'] == 1
+    assert samples['library_db_queries_per_request_sum{blueprint="catalog",endpoint="catalog.catalog"}'] >= 1
+
+def test_cache_and_payment_gateway_metrics(client):
+    """Test that cache counters and payment provider errors are exported."""
+    failing = Mock(spec=PaymentGateway)
+    failing.process_payment.side_effect = ConnectionError("Network timeout")
+    errors_before = payment_breaker.stats()['errors'].get('process_payment', 0)
+    with pytest.raises(ConnectionError):
+        ResilientPaymentGateway(failing, breaker=payment_breaker).process_payment("123456", 1.0)
+    payment_breaker.record_success()  # Leave the shared breaker closed
+
+    samples = _samples(client.get('/metrics').get_data(as_text=True))
+
+    assert samples['library_payment_gateway_errors_total{method="process_payment"}'] == errors_before + 1
+    assert samples['library_payment_gateway_call_duration_seconds_count{method="process_payment"}'] >= 1
+    assert 'library_cache_hits_total{cache="books"}' in samples
+    assert 'library_cache_misses_total{cache="catalog_rows"}' in samples
+
+def test_metrics_summed_across_worker_processes(client, tmp_path, monkeypatch):
+    """Test that /metrics adds up the snapshots written by other processes."""
+    monkeypatch.setattr(metrics, 'METRICS_DIR', str(tmp_path))
+    metrics.observe_request('catalog', 'catalog.catalog', 'GET', 200, 0.02)
+    other_worker = metrics.collect()
+    (tmp_path / 'metrics-1.json').write_text(json.dumps(other_worker))
+    (tmp_path / 'metrics-2.json').write_text('{"truncated')
+
+    samples = _samples(client.get('/metrics').get_data(as_text=True))
+
+    key = 'library_http_requests_total{blueprint="catalog",endpoint="catalog.catalog",method="GET",status="200"}'
+    assert samples[key] == 2
+    assert (tmp_path / f'metrics-{os.getpid()}.json').exists()
+
+    metrics.clear_metrics_dir()
+    assert list(tmp_path.iterdir()) == []
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason="requires os.fork")
+def test_forked_worker_writes_its_own_snapshot(tmp_path, monkeypatch):
+    """Test that a forked process's requests reach the parent's exposition."""
+    monkeypatch.setattr(metrics, 'METRICS_DIR', str(tmp_path))
+
+    pid = os.fork()
+    if pid == 0:
+        try:
+            metrics.reset()
+            metrics.observe_request('api', 'api.search_books_api', 'GET', 200, 0.01)
+            metrics.write_snapshot()
+        finally:
+            os._exit(0)
+    os.waitpid(pid, 0)
+
+    samples = _samples(metrics.render_metrics())
+
+    assert samples['library_http_requests_total{blueprint="api",endpoint="api.search_books_api",'
+                   'method="GET",status="200"}'] == 1
+    assert (tmp_path / f'metrics-{pid}.json').exists()
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason="requires os.fork")
+def test_exiting_worker_folds_exited_snapshots(tmp_path, monkeypatch):
+    """Test that a retiring worker leaves one aggregate file instead of per-pid snapshots."""
+    monkeypatch.setattr(metrics, 'METRICS_DIR', str(tmp_path))
+    monkeypatch.setattr(metrics, '_retired', False)
+    key = 'library_http_requests_total{blueprint="api",endpoint="api.search_books_api",method="GET",status="200"}'
+
+    pid = os.fork()
+    if pid == 0:
+        try:
+            metrics.reset()
+            metrics.observe_request('api', 'api.search_books_api', 'GET', 200, 0.01)
+            metrics.write_snapshot()
+        finally:
+            os._exit(0)
+    os.waitpid(pid, 0)  # Died without retiring, like a worker killed on timeout
+    live_worker = tmp_path / f'metrics-{os.getppid()}.json'
+    live_worker.write_text(json.dumps(metrics.collect()))
+    metrics.observe_request('api', 'api.search_books_api', 'GET', 200, 0.01)
+    metrics.write_snapshot()
+
+    metrics.retire_snapshot()
+    metrics.write_snapshot()
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == [live_worker.name, metrics.EXITED_SNAPSHOT]
+    assert _samples(metrics.render(metrics.read_snapshots()))[key] == 2
@@ -0,0 +1,131 @@
+import pytest
+import sys
+import os
+import sqlite3
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import database
+from database import (
+    init_database, run_migrations, get_schema_version, get_db_connection,
+    check_schema_version, SchemaVersionError, SCHEMA_VERSION
+)
+from app import create_app
+
+def _create_legacy_database(path):
+    """Create a database the way init_database did before migrations existed."""
+    conn = sqlite3.connect(path)
+    conn.execute('''
+        CREATE TABLE books (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            author TEXT NOT NULL,
+            isbn TEXT UNIQUE NOT NULL,
+            total_copies INTEGER NOT NULL,
+            available_copies INTEGER NOT NULL
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE borrow_records (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            patron_id TEXT NOT NULL,
+            book_id INTEGER NOT NULL,
+            borrow_date TEXT NOT NULL,
+            due_date TEXT NOT NULL,
+            return_date TEXT,
+            FOREIGN KEY (book_id) REFERENCES books (id)
+        )
+    ''')
+    conn.execute('''
+        INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
+        VALUES ('123456', 1, '2024-01-01T00:00:00', '2024-01-15T00:00:00')
+    ''')
+    conn.commit()
+    conn.close()
+
+def test_fresh_database_is_at_current_version():
+    """Test that init_database leaves the database at SCHEMA_VERSION."""
+    assert get_schema_version() == SCHEMA_VERSION
+
+def test_migrations_are_idempotent():
+    """Test that running migrations again applies nothing."""
+    assert run_migrations() == []
+    assert get_schema_version() == SCHEMA_VERSION
+
+def test_legacy_database_is_upgraded_in_place(tmp_path, monkeypatch):
+    """Test that an existing unversioned database is upgraded and keeps its rows."""
+    path = str(tmp_path / 'legacy.db')
+    _create_legacy_database(path)
+    monkeypatch.setattr(database, 'DATABASE', path)
+
+    assert get_schema_version() == 0
+    init_database()
+
+    assert get_schema_version() == SCHEMA_VERSION
+    conn = get_db_connection()
+    count = conn.execute('SELECT COUNT(*) FROM borrow_records').fetchone()[0]
+    conn.close()
+    assert count == 1
+
+def test_open_loan_lookups_use_indexes():
+    """Test that patron and (book, patron) lookups no longer scan borrow_records."""
+    conn = get_db_connection()
+    queries = [
+        ("SELECT COUNT(*) FROM borrow_records WHERE patron_id = ? AND return_date IS NULL", ('123456',)),
+        ("UPDATE borrow_records SET return_date = 'x' WHERE patron_id = ? AND book_id = ? AND return_date IS NULL", ('123456', 1)),
+    ]
+    for sql, params in queries:
+        plan = ' '.join(row['detail'] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql, params))
+        assert 'USING INDEX idx_borrow_records' in plan, plan
+    conn.close()
+
+def _table_count(name):
+    conn = get_db_connection()
+    count = conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)).fetchone()[0]
+    conn.close()
+    return count
+
+def test_app_boot_does_not_touch_schema_or_data(tmp_path, monkeypatch):
+    """Test that create_app neither creates tables nor seeds data on an empty database."""
+    monkeypatch.setattr(database, 'DATABASE', str(tmp_path / 'empty.db'))
+
+    create_app()
+
+    assert get_schema_version() == 0
+    assert _table_count('books') == 0
+
+def test_app_boot_requires_current_schema_when_asked(tmp_path, monkeypatch):
+    """Test that REQUIRE_CURRENT_SCHEMA refuses to start on an unmigrated database."""
+    monkeypatch.setattr(database, 'DATABASE', str(tmp_path / 'empty.db'))
+
+    with pytest.raises(SchemaVersionError, match="flask --app app migrate"):
+        create_app({'REQUIRE_CURRENT_SCHEMA': True})
+    with pytest.raises(SchemaVersionError):
+        check_schema_version()
+
+def test_app_boot_on_migrated_database():
+    """Test that booting on a migrated database passes the schema check."""
+    create_app({'REQUIRE_CURRENT_SCHEMA': True})
+    assert check_schema_version() == SCHEMA_VERSION
+
+def test_auto_migrate_option(tmp_path, monkeypatch):
+    """Test that AUTO_MIGRATE brings an empty database to the current schema."""
+    monkeypatch.setattr(database, 'DATABASE', str(tmp_path / 'empty.db'))
+
+    create_app({'AUTO_MIGRATE': True})
+
+    assert get_schema_version() == SCHEMA_VERSION
+
+def test_migrate_command(tmp_path, monkeypatch):
+    """Test that `flask migrate --seed` migrates and seeds once, and is a no-op afterwards."""
+    monkeypatch.setattr(database, 'DATABASE', str(tmp_path / 'empty.db'))
+    runner = create_app().test_cli_runner()
+
+    result = runner.invoke(args=['migrate', '--seed'])
+    assert result.exit_code == 0
+    assert f"from schema version 0 to {SCHEMA_VERSION}" in result.output
+    conn = get_db_connection()
+    assert conn.execute('SELECT COUNT(*) FROM books').fetchone()[0] == 3
+    conn.close()
+
+    result = runner.invoke(args=['migrate'])
+    assert result.exit_code == 0
+    assert f"already at schema version {SCHEMA_VERSION}" in result.output
@@ -0,0 +1,59 @@
+import pytest
+import sys
+import os
+from datetime import datetime, timedelta
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from services.library_service import get_patron_status_report
+from services import fee_engine
+from database import get_db_connection, get_patron_loan_summary
+
+def _add_loans(patron_id, due_dates, returned=False):
+    conn = get_db_connection()
+    conn.executemany('''
+        INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date, return_date)
+        VALUES (?, 1, ?, ?, ?)
+    ''', [
+        (patron_id, (due - timedelta(days=14)).isoformat(), due.isoformat(),
+         due.isoformat() if returned else None)
+        for due in due_dates
+    ])
+    conn.commit()
+    conn.close()
+
+def test_summary_matches_fee_engine():
+    """Test that SQL-computed days and fees agree with the scalar fee engine."""
+    as_of = datetime.now()
+    due_dates = [as_of - timedelta(days=d, hours=3, microseconds=417) for d in range(-3, 30)]
+    _add_loans("654321", due_dates)
+
+    loans = get_patron_loan_summary("654321", as_of)
+
+    assert len(loans) == len(due_dates)
+    for loan, due in zip(loans, sorted(due_dates)):
+        days, fee = fee_engine.late_fee(due, as_of)
+        assert bool(loan['is_overdue']) == (as_of > due)
+        assert loan['days_overdue'] == days
+        assert loan['late_fee'] == fee
+    expected_total = round(sum(fee_engine.late_fee(due, as_of)[1] for due in due_dates), 2)
+    assert loans[0]['total_fines'] == expected_total
+
+def test_report_ignores_returned_history():
+    """Test that returned loans do not count towards the report."""
+    now = datetime.now()
+    _add_loans("654322", [now - timedelta(days=d) for d in range(1, 200)], returned=True)
+    _add_loans("654322", [now - timedelta(days=10)])
+
+    report = get_patron_status_report("654322")
+
+    assert report['total_books_borrowed'] == 1
+    assert report['total_overdue'] == 1
+    assert report['books_overdue'][0]['days_overdue'] == 10
+    assert report['total_fines'] == 6.50
+
+def test_report_for_patron_without_loans():
+    """Test the empty report."""
+    report = get_patron_status_report("999999")
+
+    assert report['success'] is True
+    assert report['total_fines'] == 0.0
+    assert report['books_borrowed'] == [] and report['books_overdue'] == []
@@ -0,0 +1,154 @@
+"""
+Tests for bulk transaction status verification (verify_payment_statuses).
+"""
+
+import pytest
+import sys
+import os
+import time
+import threading
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.payment_gateway import PaymentGateway, PaymentServiceGateway
+from services.async_payment_gateway import AsyncPaymentGateway
+from services.payment_stub_server import PaymentStubServer
+
+
+class SlowGateway(PaymentGateway):
+    """Gateway whose status checks take a fixed time and track concurrency."""
+
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def process_payment(self, patron_id, amount, description=""):
+        return True, f"txn_{patron_id}", "ok"
+
+    def refund_payment(self, transaction_id, amount):
+        return True, "ok"
+
+    def verify_payment_status(self, transaction_id):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if transaction_id == "txn_broken":
+                raise ConnectionError("Network error")
+            # Later IDs finish first, so completion order differs from input order
+            time.sleep(self.delay / (1 + int(transaction_id.rsplit("_", 1)[-1] or 0) % 3))
+            return {"transaction_id": transaction_id, "status": "completed"}
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+class TestDefaultBulkVerification:
+    """Thread-pool fan-out provided by the PaymentGateway interface."""
+
+    def test_checks_run_concurrently_with_a_bound(self):
+        """All transactions are checked, at most max_concurrency at a time."""
+        gateway = SlowGateway(delay=0.05)
+        ids = [f"txn_{i}" for i in range(40)]
+
+        start = time.perf_counter()
+        results = dict(gateway.verify_payment_statuses(ids, max_concurrency=8))
+        elapsed = time.perf_counter() - start
+
+        assert set(results) == set(ids)
+        assert all(status["status"] == "completed" for status in results.values())
+        assert gateway.max_in_flight == 8
+        assert elapsed < 40 * 0.05 / 2
+
+    def test_results_arrive_in_completion_order(self):
+        """Fast checks are yielded before slow ones."""
+        gateway = SlowGateway(delay=0.2)
+        ids = ["txn_0", "txn_1", "txn_2"]
+
+        order = [transaction_id for transaction_id, _ in gateway.verify_payment_statuses(ids)]
+
+        assert order == ["txn_2", "txn_1", "txn_0"]
+
+    def test_failed_check_yields_error_status(self):
+        """An exception from one check does not abort the batch."""
+        gateway = SlowGateway(delay=0.0)
+
+        results = dict(gateway.verify_payment_statuses(["txn_1", "txn_broken"]))
+
+        assert results["txn_1"]["status"] == "completed"
+        assert results["txn_broken"] == {"status": "error", "message": "Network error"}
+
+    def test_status_check_is_required(self):
+        """Gateways must implement verify_payment_status rather than fail every bulk check."""
+        class ChargeOnlyGateway(PaymentGateway):
+            def process_payment(self, patron_id, amount, description=""):
+                return True, f"txn_{patron_id}", "ok"
+
+            def refund_payment(self, transaction_id, amount):
+                return True, "ok"
+
+        with pytest.raises(TypeError):
+            ChargeOnlyGateway()
+
+    def test_payment_service_gateway(self, mocker):
+        """PaymentServiceGateway supports single and bulk status checks."""
+        mocker.patch('services.payment_service.time.sleep')
+        gateway = PaymentServiceGateway()
+
+        assert gateway.verify_payment_status("txn_123456_1")["status"] == "completed"
+        results = dict(gateway.verify_payment_statuses(["txn_123456_1", "bogus"]))
+        assert results["bogus"]["status"] == "not_found"
+
+
+class TestAsyncBulkVerification:
+    """Batch endpoint and concurrent fallback of AsyncPaymentGateway."""
+
+    def _charge(self, gateway, count):
+        return [gateway.process_payment(f"{100000 + i}", 1.00, "Late fees")[1] for i in range(count)]
+
+    def test_uses_batch_endpoint(self, payment_stub_server):
+        """With a batch endpoint, 250 transactions take 3 lookups."""
+        with AsyncPaymentGateway(base_url=payment_stub_server.base_url, lookup_batch_size=100) as gateway:
+            ids = self._charge(gateway, 250) + ["txn_missing"]
+            before = payment_stub_server.requests
+
+            results = dict(gateway.verify_payment_statuses(ids))
+
+        assert payment_stub_server.requests - before == 3
+        assert len(results) == 251
+        assert all(results[transaction_id]["status"] == "completed" for transaction_id in ids[:-1])
+        assert results["txn_missing"]["status"] == "not_found"
+
+    def test_falls_back_without_batch_endpoint(self):
+        """Without a batch endpoint, transactions are checked one request each, concurrently."""
+        stub = PaymentStubServer(batch_lookup=False)
+        base_url = stub.start()
+        try:
+            with AsyncPaymentGateway(base_url=base_url, max_concurrency=4) as gateway:
+                ids = self._charge(gateway, 12)
+                stub.latency = 0.05
+
+                results = dict(gateway.verify_payment_statuses(ids))
+
+                assert all(status["status"] == "completed" for status in results.values())
+                assert stub.max_in_flight == 4
+                # The missing endpoint is remembered
+                before = stub.requests
+                dict(gateway.verify_payment_statuses(ids[:2]))
+                assert stub.requests - before == 2
+        finally:
+            stub.stop()
+
+    def test_per_call_concurrency_bound(self, payment_stub_server):
+        """max_concurrency on the call narrows the gateway-wide bound."""
+        with AsyncPaymentGateway(base_url=payment_stub_server.base_url, lookup_batch_size=0) as gateway:
+            ids = self._charge(gateway, 10)
+            payment_stub_server.latency = 0.05
+            payment_stub_server.max_in_flight = 0
+
+            results = dict(gateway.verify_payment_statuses(ids, max_concurrency=2))
+
+        assert len(results) == 10
+        assert payment_stub_server.max_in_flight == 2
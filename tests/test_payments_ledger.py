@@ -0,0 +1,192 @@
+import pytest
+import sys
+import os
+from datetime import datetime, timedelta
+from unittest.mock import Mock
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import sqlite3
+import database
+from app import create_app
+from services.library_service import pay_late_fees, refund_late_fee_payment
+from services.payment_gateway import CircuitOpenError
+from services.payment_service import PaymentGateway
+from database import get_db_connection, get_payments_for_reconciliation, get_payments_to_reconcile
+
+def _gateway():
+    gateway = Mock(spec=PaymentGateway)
+    gateway.process_payment.return_value = (True, "txn_123456_001", "Payment of $3.50 processed successfully")
+    gateway.refund_payment.return_value = (True, "Refund of $3.50 processed successfully")
+    return gateway
+
+def _ledger():
+    conn = get_db_connection()
+    rows = conn.execute('SELECT * FROM payments ORDER BY id').fetchall()
+    conn.close()
+    return [dict(row) for row in rows]
+
+def test_payment_is_recorded_in_ledger():
+    """Test that a successful charge is written to the ledger with its idempotency key."""
+    success, message, transaction_id = pay_late_fees("123456", 3, _gateway())
+
+    assert success is True
+    [payment] = _ledger()
+    assert payment['kind'] == 'charge'
+    assert payment['status'] == 'succeeded'
+    assert payment['transaction_id'] == "txn_123456_001"
+    assert payment['amount'] == 3.50
+    assert payment['idempotency_key'].startswith("late-fee:123456:3:")
+
+def test_duplicate_payment_answered_from_ledger():
+    """Test that resubmitting the same fee does not call the gateway again."""
+    gateway = _gateway()
+    first = pay_late_fees("123456", 3, gateway)
+    second = pay_late_fees("123456", 3, gateway)
+
+    assert second == first
+    gateway.process_payment.assert_called_once()
+    assert len(_ledger()) == 1
+
+def test_failed_payment_can_be_retried():
+    """Test that a declined charge does not block a retry under the same key."""
+    gateway = _gateway()
+    gateway.process_payment.return_value = (False, "", "Payment declined")
+    assert pay_late_fees("123456", 3, gateway)[0] is False
+    assert _ledger()[0]['status'] == 'failed'
+
+    gateway.process_payment.return_value = (True, "txn_123456_002", "Payment processed")
+    success, _, transaction_id = pay_late_fees("123456", 3, gateway)
+
+    assert success is True
+    assert transaction_id == "txn_123456_002"
+    assert [row['status'] for row in _ledger()] == ['succeeded']
+
+def test_pending_payment_is_not_resubmitted():
+    """Test that a charge still in flight is not submitted a second time."""
+    gateway = _gateway()
+    pay_late_fees("123456", 3, gateway)
+    conn = get_db_connection()
+    conn.execute("UPDATE payments SET status = 'pending'")
+    conn.commit()
+    conn.close()
+
+    success, message, transaction_id = pay_late_fees("123456", 3, gateway)
+
+    assert success is False
+    assert "already being processed" in message
+    gateway.process_payment.assert_called_once()
+
+def test_transport_error_leaves_outcome_unknown():
+    """Test that a charge whose outcome is unknown is not submitted again."""
+    gateway = _gateway()
+    gateway.process_payment.side_effect = ConnectionError("Connection reset")
+
+    success, message, _ = pay_late_fees("123456", 3, gateway)
+    retry = pay_late_fees("123456", 3, gateway)
+
+    assert success is False
+    assert "Payment processing error: Connection reset" in message
+    assert _ledger()[0]['status'] == 'unknown'
+    assert retry[0] is False
+    assert "awaiting reconciliation" in retry[1]
+    gateway.process_payment.assert_called_once()
+
+def test_rejected_call_can_be_retried():
+    """Test that a call rejected before reaching the provider frees the key."""
+    gateway = _gateway()
+    gateway.process_payment.side_effect = CircuitOpenError("circuit open")
+    assert pay_late_fees("123456", 3, gateway)[0] is False
+    assert _ledger()[0]['status'] == 'failed'
+
+    gateway.process_payment.side_effect = None
+    assert pay_late_fees("123456", 3, gateway)[0] is True
+
+def test_charge_reported_when_ledger_update_fails(mocker):
+    """Test that a database error after a real charge is not reported as a provider failure."""
+    mocker.patch('services.library_service.update_payment_status',
+                 side_effect=sqlite3.OperationalError("database is locked"))
+
+    success, _, transaction_id = pay_late_fees("123456", 3, _gateway())
+
+    assert success is True
+    assert transaction_id == "txn_123456_001"
+    assert _ledger()[0]['status'] == 'pending'
+
+def test_stale_pending_payment_goes_to_reconciliation(monkeypatch):
+    """Test that a pending entry left by a crash is listed for reconciliation and settled there."""
+    gateway = _gateway()
+    pay_late_fees("123456", 3, gateway)
+    conn = get_db_connection()
+    conn.execute("UPDATE payments SET status = 'pending', updated_at = ?",
+                 ((datetime.now() - timedelta(hours=1)).isoformat(),))
+    conn.commit()
+    conn.close()
+    monkeypatch.setattr(database, 'PAYMENT_PENDING_TIMEOUT', 60)
+
+    [payment] = get_payments_to_reconcile()
+    assert payment['status'] == 'unknown'
+
+    result = create_app().test_cli_runner().invoke(args=['reconcile-payments', '--failed', str(payment['id'])])
+    assert result.exit_code == 0
+    assert get_payments_to_reconcile() == []
+    assert pay_late_fees("123456", 3, gateway)[0] is True
+    assert gateway.process_payment.call_count == 2
+
+def test_grown_fee_charges_only_the_difference(mocker):
+    """Test that a later fee period only charges what was not collected before."""
+    gateway = _gateway()
+    pay_late_fees("123456", 3, gateway)
+    mocker.patch(
+        'services.library_service.calculate_late_fee_for_book',
+        return_value={'fee_amount': 4.50, 'days_overdue': 8, 'status': 'Overdue'}
+    )
+
+    pay_late_fees("123456", 3, gateway)
+
+    assert gateway.process_payment.call_args.kwargs['amount'] == 1.00
+    assert [row['amount'] for row in _ledger()] == [3.50, 1.00]
+
+def test_duplicate_refund_answered_from_ledger():
+    """Test that a transaction is refunded through the gateway only once."""
+    gateway = _gateway()
+    pay_late_fees("123456", 3, gateway)
+
+    first = refund_late_fee_payment("txn_123456_001", 3.50, gateway)
+    second = refund_late_fee_payment("txn_123456_001", 3.50, gateway)
+
+    assert first == second == (True, "Refund of $3.50 processed successfully")
+    gateway.refund_payment.assert_called_once()
+    refund = _ledger()[1]
+    assert refund['kind'] == 'refund'
+    assert refund['patron_id'] == "123456"
+
+def test_refund_with_different_amount_is_rejected():
+    """Test that a second refund of a transaction with another amount is not reported as done."""
+    gateway = _gateway()
+    pay_late_fees("123456", 3, gateway)
+    refund_late_fee_payment("txn_123456_001", 3.50, gateway)
+    other = _gateway()
+
+    success, message = refund_late_fee_payment("txn_123456_001", 2.00, other)
+
+    assert success is False
+    assert "already recorded" in message and "$3.50" in message
+    other.refund_payment.assert_not_called()
+
+def test_reconciliation_window_uses_index():
+    """Test that reconciliation reads the ledger window with one indexed range scan."""
+    gateway = _gateway()
+    pay_late_fees("123456", 3, gateway)
+    refund_late_fee_payment("txn_123456_001", 3.50, gateway)
+
+    rows = get_payments_for_reconciliation(datetime.now() - timedelta(hours=1))
+    assert [row['kind'] for row in rows] == ['charge', 'refund']
+    assert get_payments_for_reconciliation(datetime.now() + timedelta(hours=1)) == []
+
+    conn = get_db_connection()
+    plan = conn.execute('''
+        EXPLAIN QUERY PLAN SELECT * FROM payments
+        WHERE created_at >= ? AND created_at < COALESCE(?, '9999')
+        ORDER BY created_at, id
+    ''', ('2026-01-01', None)).fetchall()
+    conn.close()
+    assert any('idx_payments_created' in row['detail'] for row in plan)
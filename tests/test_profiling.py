@@ -0,0 +1,115 @@
+import pstats
+import pytest
+import sys
+import os
+import threading
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app import create_app
+from profiling import StackSampler, list_profiles
+
+TOKEN = "test-admin-token"
+
+def _client(tmp_path, **config):
+    app = create_app(dict({'TESTING': True, 'ADMIN_TOKEN': TOKEN, 'PROFILE_DIR': str(tmp_path)}, **config))
+    return app.test_client()
+
+def _admin(client, path):
+    return client.get(path, headers={'Authorization': f'Bearer {TOKEN}'})
+
+def test_requests_are_not_profiled_by_default(tmp_path):
+    """Test that requests without the header are not profiled."""
+    client = _client(tmp_path)
+
+    response = client.get('/catalog')
+
+    assert 'X-Profile-Id' not in response.headers
+    assert list_profiles(str(tmp_path)) == []
+
+def test_header_with_wrong_token_is_ignored(tmp_path):
+    """Test that only the admin token can trigger profiling."""
+    client = _client(tmp_path)
+
+    response = client.get('/catalog', headers={'X-Profile': 'guess'})
+
+    assert 'X-Profile-Id' not in response.headers
+
+def test_header_triggers_cprofile_and_saves_pstats(tmp_path):
+    """Test that X-Profile saves a loadable pstats profile with request metadata."""
+    client = _client(tmp_path)
+
+    response = client.get('/api/late_fee/123456/3', headers={'X-Profile': TOKEN, 'X-Profile-Mode': 'cprofile'})
+
+    profile_id = response.headers['X-Profile-Id']
+    [profile] = list_profiles(str(tmp_path))
+    assert profile['id'] == profile_id
+    assert profile['path'] == '/api/late_fee/123456/3'
+    assert profile['endpoint'] == 'api.get_late_fee'
+    assert profile['trigger'] == 'header'
+    stats = pstats.Stats(str(tmp_path / profile['file']))
+    assert any(func[2] == 'calculate_late_fee_for_book' for func in stats.stats)
+
+def test_sample_rate_saves_collapsed_stacks(tmp_path):
+    """Test that sampled requests are profiled with the stack sampler."""
+    client = _client(tmp_path, ADMIN_TOKEN=None, PROFILE_SAMPLE_RATE=1.0, PROFILE_MODE='sample')
+
+    response = client.get('/catalog')
+
+    [profile] = list_profiles(str(tmp_path))
+    assert response.headers['X-Profile-Id'] == profile['id']
+    assert profile['trigger'] == 'sample_rate'
+    assert profile['file'].endswith('.collapsed')
+
+def test_stack_sampler_collapses_stacks():
+    """Test the collapsed format: root-first frames joined by ';' and a count."""
+    sampler = StackSampler(threading.get_ident(), interval=0.001)
+    sampler.start()
+    deadline = time.perf_counter() + 0.05
+    while time.perf_counter() < deadline:
+        pass
+    sampler.stop()
+
+    lines = sampler.collapsed().splitlines()
+    assert lines
+    stack, count = lines[0].rsplit(' ', 1)
+    assert int(count) >= 1
+    assert 'test_stack_sampler_collapses_stacks (test_profiling.py:' in stack.split(';')[-1]
+
+def test_old_profiles_are_pruned(tmp_path):
+    """Test that only the newest PROFILE_KEEP profiles are kept."""
+    client = _client(tmp_path, PROFILE_KEEP=2)
+
+    for _ in range(4):
+        client.get('/catalog', headers={'X-Profile': TOKEN})
+
+    assert len(list_profiles(str(tmp_path))) == 2
+    assert len(os.listdir(tmp_path)) == 4
+
+def test_admin_profiles_endpoint_lists_and_downloads(tmp_path):
+    """Test that admins can list profiles and download their files."""
+    client = _client(tmp_path)
+    # cProfile always records the request; a fast request may finish before the first stack sample
+    profile_id = client.get('/catalog', headers={'X-Profile': TOKEN, 'X-Profile-Mode': 'cprofile'}).headers['X-Profile-Id']
+
+    listing = _admin(client, '/admin/profiles').get_json()
+    download = _admin(client, f'/admin/profiles/{profile_id}')
+
+    assert [profile['id'] for profile in listing['profiles']] == [profile_id]
+    assert download.status_code == 200
+    assert download.data
+    assert _admin(client, '/admin/profiles/../../etc/passwd').status_code == 404
+
+@pytest.mark.parametrize("headers", [{}, {'Authorization': 'Bearer wrong'}, {'Authorization': TOKEN}])
+def test_admin_profiles_endpoint_requires_token(tmp_path, headers):
+    """Test that the profile listing rejects requests without the admin token."""
+    client = _client(tmp_path)
+
+    response = client.get('/admin/profiles', headers=headers)
+
+    assert response.status_code == 401
+
+def test_admin_endpoints_disabled_without_token(tmp_path):
+    """Test that /admin is not served when no admin token is configured."""
+    client = _client(tmp_path, ADMIN_TOKEN=None)
+
+    assert client.get('/admin/profiles', headers={'Authorization': 'Bearer '}).status_code == 404
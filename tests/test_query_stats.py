@@ -0,0 +1,89 @@
+import logging
+import pytest
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import query_stats
+from app import create_app
+from database import (
+    get_db_connection, get_book_by_isbn, configure_query_stats, InstrumentedConnection, PooledConnection
+)
+
+@pytest.fixture(autouse=True)
+def query_stats_settings():
+    """Restore the default (disabled) settings after each test."""
+    yield
+    configure_query_stats(enabled=False, slow_query_ms=100, explain=False)
+    query_stats.reset_statement_totals()
+
+@pytest.fixture
+def client():
+    app = create_app({'TESTING': True, 'QUERY_STATS': True, 'ADMIN_TOKEN': 'test-admin-token'})
+    return app.test_client()
+
+def test_normalize_sql_replaces_literals_and_collapses_whitespace():
+    """Test that statements differing only in literals normalize to the same text."""
+    sql = """SELECT * FROM books
+             WHERE id IN (?, ?, ?) AND title = 'It''s' AND total_copies > 3"""
+
+    assert query_stats.normalize_sql(sql) == \
+        "SELECT * FROM books WHERE id IN (?...) AND title = ? AND total_copies > ?"
+
+def test_disabled_uses_plain_connections():
+    """Test that no instrumentation is installed unless enabled."""
+    conn = get_db_connection()
+    assert type(conn) is PooledConnection
+    conn.close()
+
+def test_collects_duration_and_rows_per_statement():
+    """Test that each statement is recorded with its fetched row count."""
+    configure_query_stats(enabled=True)
+    stats = query_stats.start_collecting()
+
+    conn = get_db_connection()
+    assert isinstance(conn, InstrumentedConnection)
+    conn.execute('SELECT * FROM books').fetchall()
+    for _ in conn.execute('SELECT id FROM books WHERE id <= ?', (2,)):
+        pass
+    conn.execute('UPDATE books SET total_copies = total_copies WHERE id > 1')
+    conn.close()
+    query_stats.stop_collecting()
+
+    assert stats.queries >= 3
+    rows = {sql: entry[2] for sql, entry in stats.statements.items()}
+    assert rows['SELECT * FROM books'] == 3
+    assert rows['SELECT id FROM books WHERE id <= ?'] == 2
+    assert rows['UPDATE books SET total_copies = total_copies WHERE id > ?'] == 2
+    assert all(entry[1] > 0 for entry in stats.statements.values())
+
+def test_request_reports_queries_in_server_timing_header(client):
+    """Test that each request's database time is returned in Server-Timing."""
+    response = client.get('/catalog')
+
+    header = response.headers['Server-Timing']
+    assert header.startswith('db;dur=')
+    assert 'queries"' in header
+    assert query_stats.current_stats() is None
+
+def test_statement_totals_endpoint(client):
+    """Test that the process-wide totals list the statements run by requests."""
+    query_stats.reset_statement_totals()
+    client.get('/api/search?q=gatsby&type=title')
+
+    totals = client.get('/admin/db/queries', headers={'Authorization': 'Bearer test-admin-token'}).get_json()
+
+    assert totals['queries'] > 0
+    assert any('books_fts' in statement['sql'] for statement in totals['statements'])
+
+def test_slow_queries_are_logged_with_plan(caplog):
+    """Test that statements over the threshold go to the slow-query log with EXPLAIN output."""
+    configure_query_stats(enabled=True, slow_query_ms=0, explain=True)
+
+    with caplog.at_level(logging.WARNING, logger='library.slow_query'):
+        get_book_by_isbn('9780743273565')
+
+    messages = [record.getMessage() for record in caplog.records if record.name == 'library.slow_query']
+    lookup = [message for message in messages if 'WHERE isbn = ?' in message]
+    assert lookup
+    assert 'rows' in lookup[0]
+    assert 'USING INDEX' in lookup[0] or 'SEARCH' in lookup[0]
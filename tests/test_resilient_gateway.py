@@ -0,0 +1,218 @@
+"""
+Tests for the circuit breaker and deadline wrapper around payment gateways.
+"""
+
+import pytest
+import sys
+import os
+import time
+from unittest.mock import Mock
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.resilient_gateway import (
+    CircuitBreaker, LatencyHistogram, ResilientPaymentGateway, CLOSED, OPEN, HALF_OPEN
+)
+from services.payment_gateway import CircuitOpenError, PaymentGatewayTimeout, PaymentOutcomeUnknown
+from services.payment_service import PaymentGateway
+from services.library_service import pay_late_fees
+from app import create_app
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def breaker(clock):
+    return CircuitBreaker(failure_threshold=3, recovery_timeout=10.0, clock=clock)
+
+
+def _failing_gateway():
+    gateway = Mock(spec=PaymentGateway)
+    gateway.process_payment.side_effect = ConnectionError("Network error")
+    return gateway
+
+
+class TestCircuitBreaker:
+    """State transitions of CircuitBreaker."""
+
+    def test_opens_after_consecutive_failures(self, breaker):
+        """The circuit opens once failure_threshold failures happen in a row."""
+        for _ in range(2):
+            assert breaker.allow()
+            breaker.record_failure()
+        assert breaker.state == CLOSED
+        breaker.record_success()
+        for _ in range(3):
+            breaker.record_failure()
+
+        assert breaker.state == OPEN
+        assert breaker.allow() is False
+
+    def test_half_open_probe_closes_on_success(self, breaker, clock):
+        """After recovery_timeout one probe is allowed; its success closes the circuit."""
+        for _ in range(3):
+            breaker.record_failure()
+        clock.now = 10.0
+
+        assert breaker.state == HALF_OPEN
+        assert breaker.allow() is True
+        assert breaker.allow() is False
+        breaker.record_success()
+        assert breaker.state == CLOSED
+
+    def test_half_open_probe_failure_reopens(self, breaker, clock):
+        """A failed probe opens the circuit for another recovery_timeout."""
+        for _ in range(3):
+            breaker.record_failure()
+        clock.now = 10.0
+        assert breaker.allow()
+        breaker.record_failure()
+
+        assert breaker.state == OPEN
+        clock.now = 15.0
+        assert breaker.state == OPEN
+        clock.now = 20.0
+        assert breaker.state == HALF_OPEN
+
+    def test_latency_histogram(self):
+        """Observations land in cumulative buckets."""
+        histogram = LatencyHistogram(buckets=(0.1, 1.0))
+        for seconds in (0.05, 0.1, 0.5, 3.0):
+            histogram.observe(seconds)
+
+        snapshot = histogram.snapshot()
+        assert snapshot['buckets'] == {'0.1': 2, '1.0': 3, '+Inf': 4}
+        assert snapshot['count'] == 4
+        assert snapshot['sum'] == pytest.approx(3.65)
+
+
+class TestResilientPaymentGateway:
+    """Deadlines and fail-fast behaviour of ResilientPaymentGateway."""
+
+    def test_passes_calls_through(self, breaker):
+        """Answers from the wrapped gateway are returned unchanged; declines are not failures."""
+        inner = Mock(spec=PaymentGateway)
+        inner.process_payment.return_value = (False, "", "Payment declined")
+        gateway = ResilientPaymentGateway(inner, breaker=breaker)
+
+        for _ in range(5):
+            assert gateway.process_payment("123456", 5.00, "Late fees") == (False, "", "Payment declined")
+
+        assert breaker.state == CLOSED
+        assert breaker.stats()['latency']['process_payment']['count'] == 5
+
+    def test_slow_provider_hits_deadline(self, breaker):
+        """A charge running past the deadline promptly raises PaymentOutcomeUnknown."""
+        inner = Mock(spec=PaymentGateway)
+        inner.process_payment.side_effect = lambda *args: time.sleep(0.5)
+        gateway = ResilientPaymentGateway(inner, timeout=0.05, breaker=breaker)
+
+        start = time.perf_counter()
+        with pytest.raises(PaymentOutcomeUnknown):
+            gateway.process_payment("123456", 5.00, "Late fees")
+
+        assert time.perf_counter() - start < 0.3
+        assert breaker.stats()['consecutive_failures'] == 1
+
+    def test_status_check_timeout_is_not_outcome_unknown(self, breaker):
+        """Only calls that move money report an unknown outcome on timeout."""
+        inner = Mock(spec=PaymentGateway)
+        inner.verify_payment_status.side_effect = lambda *args: time.sleep(0.2)
+        gateway = ResilientPaymentGateway(inner, timeout=0.05, breaker=breaker)
+
+        with pytest.raises(PaymentGatewayTimeout) as raised:
+            gateway.verify_payment_status("txn_123456_001")
+
+        assert not isinstance(raised.value, PaymentOutcomeUnknown)
+
+    def test_missing_status_check_does_not_trip_breaker(self, breaker):
+        """A wrapped gateway without verify_payment_status is rejected before the breaker."""
+        class ChargeOnlyGateway:
+            def process_payment(self, patron_id, amount, description=""):
+                return True, "txn_123456_001", "Payment processed"
+
+            def refund_payment(self, transaction_id, amount):
+                return True, "Refund processed"
+
+        gateway = ResilientPaymentGateway(ChargeOnlyGateway(), breaker=breaker)
+        for _ in range(5):
+            with pytest.raises(NotImplementedError):
+                gateway.verify_payment_status("txn_123456_001")
+
+        stats = breaker.stats()
+        assert stats['state'] == CLOSED
+        assert stats['consecutive_failures'] == 0
+        assert stats['errors'] == {}
+        assert gateway.process_payment("123456", 5.00, "Late fees")[0] is True
+
+    def test_charge_completing_after_deadline_is_not_repeated(self, breaker):
+        """A charge the provider completes after the deadline is not submitted again on retry."""
+        charges = []
+
+        def slow_charge(patron_id, amount, description):
+            time.sleep(0.3)
+            charges.append(amount)
+            return True, "txn_123456_001", "Payment processed"
+
+        inner = Mock(spec=PaymentGateway)
+        inner.process_payment.side_effect = slow_charge
+        gateway = ResilientPaymentGateway(inner, timeout=0.1, breaker=breaker)
+
+        first = pay_late_fees("123456", 3, gateway)
+        time.sleep(0.4)  # The provider completes the charge meanwhile
+        retry = pay_late_fees("123456", 3, gateway)
+
+        assert first[0] is False
+        assert "did not answer" in first[1]
+        assert retry[0] is False
+        assert "awaiting reconciliation" in retry[1]
+        assert charges == [3.50]
+
+    def test_open_circuit_fails_fast(self, breaker):
+        """Once open, calls are rejected without reaching the provider."""
+        inner = _failing_gateway()
+        gateway = ResilientPaymentGateway(inner, breaker=breaker)
+        for _ in range(3):
+            with pytest.raises(ConnectionError):
+                gateway.process_payment("123456", 5.00, "Late fees")
+
+        with pytest.raises(CircuitOpenError):
+            gateway.process_payment("123456", 5.00, "Late fees")
+
+        assert inner.process_payment.call_count == 3
+        assert breaker.stats()['rejected'] == 1
+
+    def test_pay_late_fees_reports_open_circuit(self, breaker):
+        """pay_late_fees turns a rejected call into a payment error without waiting."""
+        gateway = ResilientPaymentGateway(_failing_gateway(), breaker=breaker)
+        for _ in range(3):
+            breaker.record_failure()
+
+        success, message, transaction_id = pay_late_fees("123456", 3, gateway)
+
+        assert success is False
+        assert "circuit open" in message
+        assert transaction_id is None
+
+
+def test_gateway_status_endpoint():
+    """The admin API exposes the default breaker's state and latency histograms."""
+    client = create_app({'ADMIN_TOKEN': 'test-admin-token'}).test_client()
+
+    assert client.get('/admin/payments/gateway').status_code == 401
+    response = client.get('/admin/payments/gateway', headers={'Authorization': 'Bearer test-admin-token'})
+
+    assert response.status_code == 200
+    assert response.get_json()['state'] in (CLOSED, OPEN, HALF_OPEN)
+    assert 'latency' in response.get_json()
@@ -0,0 +1,63 @@
+import pytest
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app import create_app
+from database import insert_book
+from routes.catalog_routes import row_cache, get_row_cache_stats
+
+@pytest.fixture
+def client():
+    app = create_app()
+    app.config['TESTING'] = True
+    app.config['ADMIN_TOKEN'] = 'test-admin-token'
+    return app.test_client()
+
+def test_rows_rendered_once_then_served_from_cache(client):
+    """Test that a second catalog render reuses every row fragment."""
+    first = client.get('/catalog').data
+    before = get_row_cache_stats()
+
+    second = client.get('/catalog').data
+
+    after = get_row_cache_stats()
+    assert second == first
+    assert after['hits'] - before['hits'] == 3
+    assert after['misses'] == before['misses']
+
+def test_only_changed_row_is_rerendered(client):
+    """Test that borrowing a book re-renders just that book's row."""
+    client.get('/catalog')
+    before = get_row_cache_stats()
+
+    client.post('/borrow', data={'patron_id': '654321', 'book_id': '2'})
+    html = client.get('/catalog').data.decode()
+
+    after = get_row_cache_stats()
+    assert after['misses'] - before['misses'] == 1
+    assert after['hits'] - before['hits'] == 2
+    assert '1/2 Available' in html
+
+def test_cached_page_matches_uncached_render(client):
+    """Test that pages assembled from fragments equal a fresh render."""
+    insert_book("Fragment <Test> & Co", "Author", "7100000000001", 2, 0)
+    cached = client.get('/catalog').data
+
+    row_cache.enabled = False
+    try:
+        uncached = client.get('/catalog').data
+    finally:
+        row_cache.enabled = True
+
+    assert cached == uncached
+    assert b'Fragment &lt;Test&gt; &amp; Co' in cached
+
+def test_cache_stats_endpoint(client):
+    """Test that the admin API reports book and row cache statistics."""
+    client.get('/catalog')
+
+    stats = client.get('/admin/cache/stats', headers={'Authorization': 'Bearer test-admin-token'}).get_json()
+
+    assert stats['catalog_rows']['size'] == 3
+    assert 'hit_rate' in stats['catalog_rows']
+    assert 'hit_rate' in stats['books']
@@ -0,0 +1,93 @@
+import pytest
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app import create_app
+from services.library_service import search_books_in_catalog
+from database import insert_book, get_db_connection, search_books
+
+def test_search_matches_substring_inside_word():
+    """Test that title search still matches partial words, case-insensitively."""
+    result = search_books_in_catalog("ATSB", "title")
+
+    assert [book['title'] for book in result] == ["The Great Gatsby"]
+
+def test_search_sees_newly_inserted_book():
+    """Test that the full-text index is kept in sync on insert."""
+    insert_book("Gatsby Revisited", "Some Author", "1111111111111", 1, 1)
+
+    titles = [book['title'] for book in search_books_in_catalog("gatsby", "title")]
+    assert "Gatsby Revisited" in titles
+
+def test_search_sees_title_update_and_delete():
+    """Test that the full-text index follows title changes and deletions."""
+    conn = get_db_connection()
+    conn.execute("UPDATE books SET title = 'Animal Farm' WHERE id = 3")
+    conn.execute("DELETE FROM books WHERE id = 2")
+    conn.commit()
+    conn.close()
+
+    assert search_books_in_catalog("1984", "title") == []
+    assert [b['id'] for b in search_books_in_catalog("animal", "title")] == [3]
+    assert search_books_in_catalog("mockingbird", "title") == []
+
+def test_search_ranks_prefix_matches_first():
+    """Test that titles starting with the term come before other matches."""
+    insert_book("A Tale of Gatsby", "Author A", "2222222222222", 1, 1)
+    insert_book("Gatsby Unbound", "Author B", "3333333333333", 1, 1)
+
+    result = search_books_in_catalog("gatsby", "title")
+    assert result[0]['title'] == "Gatsby Unbound"
+    assert len(result) == 3
+
+def test_search_ranks_prefix_matches_beyond_candidate_window():
+    """Test that a prefix match is ranked even when many other matches come first in the index."""
+    conn = get_db_connection()
+    conn.executemany('''
+        INSERT INTO books (title, author, isbn, total_copies, available_copies) VALUES (?, 'A', ?, 1, 1)
+    ''', [(f"Gathering of the Clans vol {i}", f"{5000000000000 + i}") for i in range(1500)])
+    conn.commit()
+    conn.close()
+    insert_book("The Hobbit", "J.R.R. Tolkien", "5555555555555", 1, 1)
+
+    titles = [book['title'] for book in search_books("the", "title", 50)]
+
+    assert titles[:2] == ["The Hobbit", "The Great Gatsby"]
+    assert len(titles) == 50
+
+def test_search_page_reports_truncated_results(monkeypatch):
+    """Test that /search and /api/search say when more books matched than are shown."""
+    for i in range(3):
+        insert_book(f"Limit Book {i}", "Limit Author", f"444444444444{i}", 1, 1)
+    client = create_app().test_client()
+
+    api = client.get('/api/search?q=limit&type=title&limit=2').get_json()
+    assert api['count'] == 2 and api['truncated'] is True
+    assert client.get('/api/search?q=limit&type=title&limit=3').get_json()['truncated'] is False
+    assert b'Showing the best' not in client.get('/search?q=limit&type=title').data
+    monkeypatch.setattr('routes.search_routes.SEARCH_RESULT_LIMIT', 2)
+    assert b'Showing the best 2 matches only' in client.get('/search?q=limit&type=title').data
+
+def test_search_respects_limit():
+    """Test that the result limit is applied."""
+    for i in range(5):
+        insert_book(f"Limit Book {i}", "Limit Author", f"444444444444{i}", 1, 1)
+
+    assert len(search_books_in_catalog("limit", "title", limit=2)) == 2
+    assert len(search_books_in_catalog("limit", "title", limit=None)) == 5
+
+def test_search_short_term_and_special_characters():
+    """Test the LIKE fallback for short terms and quoting of FTS syntax."""
+    assert any(book['id'] == 3 for book in search_books("84", "title"))
+    assert search_books('"gatsby" OR', "title") == []
+    assert search_books("%", "title") == []
+
+def test_api_search_limit_parameter():
+    """Test /api/search honours and validates the limit parameter."""
+    client = create_app().test_client()
+
+    response = client.get('/api/search?q=e&type=title&limit=1')
+    assert response.status_code == 200
+    assert response.get_json()['count'] == 1
+
+    assert client.get('/api/search?q=e&limit=0').status_code == 400
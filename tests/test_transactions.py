@@ -0,0 +1,77 @@
+import pytest
+import sys
+import os
+import threading
+from datetime import datetime, timedelta
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from services.library_service import borrow_book_by_patron
+from database import (
+    get_db_connection, get_book_by_id, get_patron_borrow_count, transaction,
+    borrow_book_atomic, return_book_atomic, BORROW_OK, BORROW_UNAVAILABLE,
+    BORROW_ALREADY_BORROWED, BORROW_BOOK_NOT_FOUND
+)
+
+def test_borrow_atomic_decrements_and_records():
+    """Test that a successful atomic borrow updates both tables."""
+    now = datetime.now()
+    outcome, book = borrow_book_atomic("222222", 2, now, now + timedelta(days=14))
+
+    assert outcome == BORROW_OK
+    assert book['title'] == "To Kill a Mockingbird"
+    assert get_book_by_id(2)['available_copies'] == 1
+    assert get_patron_borrow_count("222222") == 1
+
+def test_borrow_atomic_reports_failures_without_writing():
+    """Test that rejected borrows leave the database untouched."""
+    now = datetime.now()
+
+    assert borrow_book_atomic("222222", 999, now, now)[0] == BORROW_BOOK_NOT_FOUND
+    assert borrow_book_atomic("222222", 3, now, now)[0] == BORROW_UNAVAILABLE
+    assert borrow_book_atomic("123456", 1, now, now)[0] == BORROW_ALREADY_BORROWED
+    assert get_patron_borrow_count("222222") == 0
+
+def test_return_atomic_closes_loan_and_restores_copy():
+    """Test that an atomic return closes the loan and increments availability."""
+    due_date = return_book_atomic("123456", 3, datetime.now())
+
+    assert due_date is not None
+    assert due_date < datetime.now()
+    assert get_book_by_id(3)['available_copies'] == 1
+    assert return_book_atomic("123456", 3, datetime.now()) is None
+
+def test_transaction_rolls_back_on_error():
+    """Test that an exception inside transaction() discards all its writes."""
+    with pytest.raises(RuntimeError):
+        with transaction() as conn:
+            conn.execute('UPDATE books SET available_copies = 0 WHERE id = 2')
+            raise RuntimeError("boom")
+
+    assert get_book_by_id(2)['available_copies'] == 2
+
+@pytest.mark.file_database
+def test_concurrent_borrows_do_not_oversell():
+    """Test that concurrent borrowers cannot take more copies than exist."""
+    conn = get_db_connection()
+    conn.execute('''
+        INSERT INTO books (title, author, isbn, total_copies, available_copies)
+        VALUES ('Race Book', 'Race Author', '5555555555555', 1, 1)
+    ''')
+    book_id = conn.execute("SELECT id FROM books WHERE isbn = '5555555555555'").fetchone()['id']
+    conn.commit()
+    conn.close()
+
+    results = []
+    barrier = threading.Barrier(8)
+
+    def worker(patron_id):
+        barrier.wait()
+        results.append(borrow_book_by_patron(patron_id, book_id)[0])
+
+    threads = [threading.Thread(target=worker, args=(f"30000{i}",)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert results.count(True) == 1
+    assert get_book_by_id(book_id)['available_copies'] == 0
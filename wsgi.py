@@ -0,0 +1,19 @@
+"""
+Production WSGI entry point for the Library Management System.
+
+Serve with the pre-fork server configured in gunicorn.conf.py:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Worker count, threads per worker and timeouts come from the environment
+(see gunicorn.conf.py). `kill -HUP <master pid>` reloads gracefully: new
+workers are started and the old ones finish their in-flight requests.
+
+Run `flask --app app migrate` once per deploy before starting workers; the
+workers themselves only check the schema version and refuse to start on an
+unmigrated database.
+"""
+
+from app import create_app
+
+app = create_app({'REQUIRE_CURRENT_SCHEMA': True})